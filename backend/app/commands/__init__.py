@@ -0,0 +1,21 @@
+from .user_commands import import_users_command, export_users_command, generate_users_command
+from .book_commands import (
+    ingest_books_command, import_book_files_command, migrate_books_command, build_search_index_command,
+    generate_books_command, sync_books_command
+)
+from .llm_commands import hedge_report_command, prompt_cache_report_command
+
+
+def register_commands(app):
+    """Attach the maintenance commands to `flask --app main <command>`."""
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(export_users_command)
+    app.cli.add_command(generate_users_command)
+    app.cli.add_command(ingest_books_command)
+    app.cli.add_command(import_book_files_command)
+    app.cli.add_command(migrate_books_command)
+    app.cli.add_command(build_search_index_command)
+    app.cli.add_command(generate_books_command)
+    app.cli.add_command(sync_books_command)
+    app.cli.add_command(prompt_cache_report_command)
+    app.cli.add_command(hedge_report_command)
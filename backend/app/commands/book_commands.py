@@ -0,0 +1,134 @@
+import click
+
+from config.settings import BOOK_SYNC_INTERVAL, SEARCH_INDEX_PATH
+from mappers import (book_change_mapper, book_facet_mapper, book_overlay_mapper, book_similarity_mapper,
+                     llm_usage_mapper, rate_limit_mapper, token_quota_mapper)
+from services.book_ingest_service import ingest_books, iter_ndjson, open_upload, DEFAULT_BATCH_SIZE
+from services.book_import_service import import_book_files
+from services.book_sync_service import BookSyncRelay, book_sync_status
+from services.search_service import save_index
+from services.synthetic_data_service import (DEFAULT_MAX_WORDS, DEFAULT_MEDIAN_WORDS, DEFAULT_MIN_WORDS,
+                                             DEFAULT_SIZE_SPREAD, load_synthetic_books)
+
+
+@click.command('ingest-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+def ingest_books_command(path, batch_size):
+    """
+    Bulk-insert books from an NDJSON file (gzip if it ends with .gz).
+    Duplicates and invalid lines are printed to stderr and do not stop the run.
+    """
+    with open(path, 'rb') as file:
+        summary = ingest_books(iter_ndjson(open_upload(file, path.endswith('.gz'))), batch_size=batch_size)
+
+    for duplicate in summary["duplicates"]:
+        click.echo(f"line {duplicate['line']}: book_serial {duplicate['book_serial']} already exists", err=True)
+    for error in summary["errors"]:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Inserted {summary['inserted']} books, {len(summary['duplicates'])} duplicates, "
+               f"{len(summary['errors'])} invalid")
+
+
+@click.command('import-book-files')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--tags', default='', help='Tags stored on every imported book.')
+@click.option('--rating', default='', help='Rating stored on every imported book.')
+@click.option('--start-serial', type=int, help='First book_serial (defaults to the current maximum + 1).')
+@click.option('--workers', type=int, help='Parsing processes (defaults to all cores).')
+def import_book_files_command(paths, tags, rating, start_serial, workers):
+    """
+    Import .txt and .epub files, or directories of them, into the books collection.
+    Chapters, word counts and metadata are computed from the files themselves.
+    """
+    def on_progress(done, total):
+        if done == total or done % 100 == 0:
+            click.echo(f"Parsed {done}/{total} files", err=True)
+
+    summary = import_book_files(list(paths), tags=tags, rating=rating, start_serial=start_serial,
+                                workers=workers, on_progress=on_progress)
+
+    for duplicate in summary["duplicates"]:
+        click.echo(f"{duplicate['line']}: book_serial {duplicate['book_serial']} already exists", err=True)
+    for error in summary["errors"]:
+        click.echo(f"{error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {summary['inserted']} books, {len(summary['duplicates']) + len(summary['errors'])} failed")
+
+
+@click.command('migrate-books')
+def migrate_books_command():
+    """Create the books indexes and bring existing book documents up to date (idempotent)."""
+    book_change_mapper.ensure_indexes()
+    book_facet_mapper.ensure_indexes()
+    book_similarity_mapper.ensure_indexes()
+    book_overlay_mapper.ensure_indexes()
+    llm_usage_mapper.ensure_indexes()
+    rate_limit_mapper.ensure_indexes()
+    token_quota_mapper.ensure_indexes()
+    stamped = book_change_mapper.backfill_change_seq()
+    tagged = book_facet_mapper.backfill_tag_list()
+    fingerprinted = book_similarity_mapper.backfill_fingerprints()
+    book_facet_mapper.rebuild_facets()
+    click.echo(f"Indexes ensured; stamped {stamped} books with a change sequence, "
+               f"normalized tags on {tagged} books, fingerprinted {fingerprinted} books, recounted facets")
+
+
+@click.command('build-search-index')
+@click.option('--path', default=SEARCH_INDEX_PATH, show_default=True)
+def build_search_index_command(path):
+    """Build the full-text search index from MongoDB and save it for fast worker startup."""
+    count = save_index(path)
+    click.echo(f"Indexed {count} books into {path}")
+
+
+@click.command('generate-books')
+@click.argument('count', type=int)
+@click.option('--seed', default=42, show_default=True, help='The same seed always generates the same books.')
+@click.option('--median-words', default=DEFAULT_MEDIAN_WORDS, show_default=True)
+@click.option('--size-spread', default=DEFAULT_SIZE_SPREAD, show_default=True,
+              help='Sigma of the log-normal book length distribution.')
+@click.option('--min-words', default=DEFAULT_MIN_WORDS, show_default=True)
+@click.option('--max-words', default=DEFAULT_MAX_WORDS, show_default=True)
+@click.option('--start-serial', type=int, help='First book_serial (defaults to the current maximum + 1).')
+@click.option('--workers', type=int, help='Generating processes (defaults to all cores).')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+def generate_books_command(count, seed, median_words, size_spread, min_words, max_words, start_serial, workers,
+                           batch_size):
+    """
+    Generate COUNT synthetic books (chapters, tags, ratings, log-normal lengths
+    up to multi-megabyte novels) and bulk-insert them, for scale testing.
+    """
+    def on_progress(done, total):
+        if done == total or done % 100 == 0:
+            click.echo(f"Generated {done}/{total} books", err=True)
+
+    summary = load_synthetic_books(count, seed=seed, start_serial=start_serial, workers=workers,
+                                   batch_size=batch_size, on_progress=on_progress, median_words=median_words,
+                                   size_spread=size_spread, min_words=min_words, max_words=max_words)
+
+    for duplicate in summary["duplicates"]:
+        click.echo(f"book_serial {duplicate['book_serial']} already exists", err=True)
+    click.echo(f"Inserted {summary['inserted']} books, {len(summary['duplicates'])} duplicates, "
+               f"{len(summary['errors'])} invalid")
+
+
+@click.command('sync-books')
+@click.option('--once', is_flag=True, help='Apply the settled changes, then exit.')
+@click.option('--interval', default=BOOK_SYNC_INTERVAL, show_default=True,
+              help='Seconds between polls once caught up.')
+def sync_books_command(once, interval):
+    """
+    Copy book metadata changes from MongoDB into the MySQL books table.
+    Runs until interrupted unless --once is given; safe to restart at any time.
+    """
+    relay = BookSyncRelay()
+    if not once:
+        relay.run(interval)
+        return
+    applied, more = relay.run_once()
+    while more:
+        count, more = relay.run_once()
+        applied += count
+    status = book_sync_status()
+    click.echo(f"Applied {applied} changes; at change {status['position']} of {status['head']}, "
+               f"{status['pending_changes']} pending")
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import click
+
+from services.llm_usage_service import hedge_report, prompt_cache_report
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+@click.command('prompt-cache-report')
+@click.option('--days', default=7, show_default=True, help='Only count calls from the last N days (0 = all).')
+@click.option('--limit', default=20, show_default=True, help='Books to show, most prompt tokens first.')
+def prompt_cache_report_command(days, limit):
+    """Show the LLM prompt cache hit rate and estimated latency saved per book."""
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    report = prompt_cache_report(since)
+    if not report:
+        click.echo("No LLM calls recorded")
+        return
+
+    click.echo(f"{'book':>8} {'calls':>6} {'hit rate':>9} {'cached ms':>10} {'uncached ms':>12} {'saved s':>8}")
+    for book in report[:limit]:
+        saved = "-" if book["saved_ms"] is None else f"{book['saved_ms'] / 1000:.1f}"
+        click.echo(f"{str(book['book_serial']):>8} {book['calls']:>6} {book['hit_rate']:>9.1%} "
+                   f"{_format_ms(book['cached_latency_ms']):>10} {_format_ms(book['uncached_latency_ms']):>12} "
+                   f"{saved:>8}")
+
+    prompt_tokens = sum(book["prompt_tokens"] for book in report)
+    cached_tokens = sum(book["cached_tokens"] for book in report)
+    click.echo(f"Overall: {cached_tokens}/{prompt_tokens} prompt tokens cached "
+               f"({cached_tokens / prompt_tokens if prompt_tokens else 0:.1%})")
+
+
+@click.command('hedge-report')
+@click.option('--days', default=7, show_default=True, help='Only count calls from the last N days (0 = all).')
+def hedge_report_command(days):
+    """Show how often LLM requests were hedged and the latency the hedges saved."""
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    report = hedge_report(since)
+    if not report:
+        click.echo("No LLM calls recorded")
+        return
+
+    click.echo(f"{'model':>16} {'calls':>6} {'hedged':>7} {'won':>6} {'mean ms':>8} {'saved s':>8}")
+    for model in report:
+        click.echo(f"{str(model['model']):>16} {model['calls']:>6} {model['hedge_rate']:>7.1%} "
+                   f"{model['win_rate']:>6.1%} {model['mean_latency_ms']:>8.0f} {model['saved_ms'] / 1000:>8.1f}")
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import click
+
+from config.mysql_db import SessionLocal
+from services.user_import_service import import_users, export_users, read_rows, DEFAULT_BATCH_SIZE
+from services.synthetic_data_service import DEFAULT_PASSWORDS, DEFAULT_USER_BATCH_SIZE, load_synthetic_users
+
+
+def _guess_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'ndjson' if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl') else 'csv'
+
+
+@click.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+@click.option('--workers', type=int, help='Password hashing processes (defaults to all cores).')
+def import_users_command(path, fmt, batch_size, workers):
+    """
+    Bulk-create users from a CSV or NDJSON file using the /auth/register field names.
+    Per-row errors are printed to stderr and do not stop the import.
+    """
+    def on_error(line_number, message):
+        click.echo(f"line {line_number}: {message}", err=True)
+
+    db = SessionLocal()
+    try:
+        with open(path, newline='', encoding='utf-8') as file:
+            summary = import_users(db, read_rows(file, _guess_format(path, fmt)),
+                                   batch_size=batch_size, workers=workers, on_error=on_error)
+    finally:
+        db.close()
+    click.echo(f"Imported {summary['inserted']} users, {summary['failed']} rows failed")
+
+
+@click.command('export-users')
+@click.argument('path', required=False)
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+def export_users_command(path, fmt, batch_size):
+    """Stream all users to PATH (or stdout) without password hashes (so the file cannot be re-imported)."""
+    db = SessionLocal()
+    try:
+        if path:
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                count = export_users(db, file, _guess_format(path, fmt), batch_size)
+        else:
+            count = export_users(db, sys.stdout, fmt or 'ndjson', batch_size)
+    finally:
+        db.close()
+    click.echo(f"Exported {count} users", err=True)
+
+
+@click.command('generate-users')
+@click.argument('count', type=int)
+@click.option('--seed', default=42, show_default=True, help='The same seed always generates the same users.')
+@click.option('--start-index', default=0, show_default=True, help='Number of the first user (usernames embed it).')
+@click.option('--passwords', default=DEFAULT_PASSWORDS, show_default=True,
+              help='Distinct passwords shared by the users; each is hashed once.')
+@click.option('--batch-size', default=DEFAULT_USER_BATCH_SIZE, show_default=True)
+@click.option('--workers', type=int, help='Password hashing processes (defaults to all cores).')
+@click.option('--writers', default=4, show_default=True, help='Batches inserted in parallel.')
+def generate_users_command(count, seed, start_index, passwords, batch_size, workers, writers):
+    """
+    Generate COUNT synthetic users with valid password hashes and bulk-insert
+    them, for scale testing. User N's password is synthetic-<seed>-<N % passwords>.
+    """
+    def on_progress(done, total):
+        if done == total or done % (10 * batch_size) == 0:
+            click.echo(f"Inserted {done}/{total} users", err=True)
+
+    def on_error(first_index, message):
+        click.echo(f"users {first_index}+: {message}", err=True)
+
+    summary = load_synthetic_users(SessionLocal, count, seed=seed, start_index=start_index, passwords=passwords,
+                                   batch_size=batch_size, workers=workers, writers=writers,
+                                   on_progress=on_progress, on_error=on_error)
+    click.echo(f"Generated {summary['inserted']} users, {summary['failed']} failed")
@@ -0,0 +1,24 @@
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+# Hooks the database clients need for request tracing (services.tracing). They
+# live here so the config layer never imports the services layer.
+
+# The trace of the request being handled on this thread, or None if it is not sampled
+current_trace = ContextVar("trace", default=None)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Counts pymongo command time towards the "mongo" layer (pass to MongoClient(event_listeners=...))."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add("mongo", event.duration_micros / 1000)
+
+    def failed(self, event):
+        self.succeeded(event)
@@ -20,5 +20,106 @@ MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/bookloom")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 # print(OPENAI_API_KEY)
-# Rate Limiting (if needed)
+# Rate Limiting: API_RATE_LIMIT applies per client IP across all routes; the
+# login and rewrite routes have their own per-IP limits on top ("N per unit", several
+# separated by ";"). RATE_LIMIT_STORAGE is "memory" (per process) or "mongo"
+# (shared by every worker).
 API_RATE_LIMIT = os.getenv("API_RATE_LIMIT", "100 per hour")
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10 per minute")
+REWRITE_RATE_LIMIT = os.getenv("REWRITE_RATE_LIMIT", "30 per hour")
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory")
+
+# Full-text search index (rebuilt from MongoDB when the file is missing)
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.pkl")
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "5"))
+
+# Recommendation index (rebuilt in the background once it is older than this)
+RECOMMENDATION_REBUILD_SECONDS = float(os.getenv("RECOMMENDATION_REBUILD_SECONDS", "3600"))
+
+# Paragraph alignments kept in memory by GET /books/<serial>/compare
+COMPARE_CACHE_SIZE = int(os.getenv("COMPARE_CACHE_SIZE", "64"))
+
+# Preview rewrites (PUT /books/<serial> with "preview": true): the opening
+# paragraphs are rewritten within the request, the rest by background workers
+REWRITE_PREVIEW_PARAGRAPHS = int(os.getenv("REWRITE_PREVIEW_PARAGRAPHS", "3"))
+REWRITE_PREVIEW_TIMEOUT = float(os.getenv("REWRITE_PREVIEW_TIMEOUT", "8"))
+REWRITE_WORKERS = int(os.getenv("REWRITE_WORKERS", "4"))
+# Chapters of one PUT /books/<serial> in flight at once, so a long book does not
+# take every worker from other requests, and the seconds the request waits for
+# all of its chapters before answering 504
+REWRITE_REQUEST_WINDOW = int(os.getenv("REWRITE_REQUEST_WINDOW", "2"))
+REWRITE_REQUEST_TIMEOUT = float(os.getenv("REWRITE_REQUEST_TIMEOUT", "300"))
+# Workers of the background jobs, kept apart from REWRITE_WORKERS so queued
+# jobs never hold up a request's chapters. A job that finds no admission slot
+# is re-queued rather than waiting on a worker, and fails after finding none
+# for REWRITE_JOB_ADMISSION_TIMEOUT seconds.
+REWRITE_JOB_WORKERS = int(os.getenv("REWRITE_JOB_WORKERS", "2"))
+REWRITE_JOB_ADMISSION_TIMEOUT = float(os.getenv("REWRITE_JOB_ADMISSION_TIMEOUT", "600"))
+# Background rewrites queued or running at once; each holds its whole book in
+# memory, so previews beyond this are refused with 503
+REWRITE_MAX_JOBS = int(os.getenv("REWRITE_MAX_JOBS", "32"))
+
+# Hedged LLM requests: if a rewrite has no first token after the recent
+# LLM_HEDGE_PERCENTILE time-to-first-token (clamped to the min/max delay, in
+# seconds), a second request is sent, to LLM_FALLBACK_MODEL if set. At most
+# LLM_HEDGE_BUDGET of all requests are hedged.
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "5"))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+
+# Admission control for rewrite calls to the LLM: at most the (adaptive) limit
+# of calls run at once, up to ADMISSION_MAX_QUEUE more wait up to
+# ADMISSION_QUEUE_TIMEOUT seconds, and the rest get 503 + Retry-After. The
+# limit shrinks on upstream 429s and first tokens slower than
+# ADMISSION_TTFT_TARGET seconds, and grows back while the upstream is healthy.
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "8"))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "1"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_TTFT_TARGET = float(os.getenv("ADMISSION_TTFT_TARGET", "3"))
+
+# LLM usage ledger (llm_calls): calls are written in batches of
+# LLM_LEDGER_BATCH_SIZE, at least every LLM_LEDGER_FLUSH_SECONDS; failed writes
+# are retried, and past LLM_LEDGER_MAX_PENDING unwritten calls new ones are dropped
+LLM_LEDGER_BATCH_SIZE = int(os.getenv("LLM_LEDGER_BATCH_SIZE", "100"))
+LLM_LEDGER_FLUSH_SECONDS = float(os.getenv("LLM_LEDGER_FLUSH_SECONDS", "2"))
+LLM_LEDGER_MAX_PENDING = int(os.getenv("LLM_LEDGER_MAX_PENDING", "10000"))
+
+# Per-user LLM token quotas (prompt + completion tokens, UTC day and month;
+# 0 = unlimited). Rewrites without a userId share the anonymous user's quota.
+# Usage is synced between workers every QUOTA_FLUSH_SECONDS.
+USER_DAILY_TOKEN_QUOTA = int(os.getenv("USER_DAILY_TOKEN_QUOTA", "200000"))
+USER_MONTHLY_TOKEN_QUOTA = int(os.getenv("USER_MONTHLY_TOKEN_QUOTA", "2000000"))
+# The same per client IP, across every userId it sends: userId is not
+# authenticated, so the IP bounds what one client can spend by cycling ids
+CLIENT_DAILY_TOKEN_QUOTA = int(os.getenv("CLIENT_DAILY_TOKEN_QUOTA", "1000000"))
+CLIENT_MONTHLY_TOKEN_QUOTA = int(os.getenv("CLIENT_MONTHLY_TOKEN_QUOTA", "10000000"))
+QUOTA_FLUSH_SECONDS = float(os.getenv("QUOTA_FLUSH_SECONDS", "5"))
+
+# Share of requests traced per layer (Mongo, MySQL, password hashing, LLM, JSON)
+# and answered with a Server-Timing header; 0 turns tracing off. Every request
+# is still counted in the per-route latency histograms of GET /metrics.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+
+# Shared secret for admin-only endpoints (GET /debug/profile, GET /llm-usage),
+# sent as the X-Admin-Token header; while it is empty those endpoints are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Logging: JSON lines on stderr, written by a background thread. Up to
+# LOG_QUEUE_SIZE records wait for it; past that, records are dropped rather
+# than blocking requests. One request log line is kept per
+# LOG_REQUEST_SAMPLE_RATE of successful requests (errors are always logged).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REQUEST_SAMPLE_RATE = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "0.01"))
+
+# Book sync relay (flask sync-books): copies book metadata from MongoDB into
+# the MySQL books table in batches of BOOK_SYNC_BATCH_SIZE, polling every
+# BOOK_SYNC_INTERVAL seconds once caught up.
+# With CATALOG_SOURCE = "mysql", GET /books is answered from the MySQL copy.
+BOOK_SYNC_BATCH_SIZE = int(os.getenv("BOOK_SYNC_BATCH_SIZE", "500"))
+BOOK_SYNC_INTERVAL = float(os.getenv("BOOK_SYNC_INTERVAL", "1"))
+CATALOG_SOURCE = os.getenv("CATALOG_SOURCE", "mongo")
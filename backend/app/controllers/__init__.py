@@ -7,6 +7,10 @@ api_bp = Blueprint('api', __name__)
 from .user_controller import user_bp
 from .mongo_db_controller import mongo_bp
 from .edit_book_controller import book_bp
+from .search_controller import search_bp
+from .metrics_controller import metrics_bp
+from .llm_usage_controller import llm_usage_bp
+from .debug_controller import debug_bp
 # from .story_controller import story_bp
 #
 # api_bp.register_blueprint(user_bp, url_prefix='/users')
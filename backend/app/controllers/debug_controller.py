@@ -0,0 +1,49 @@
+import hmac
+
+from flask import Blueprint, Response, request, jsonify
+from config.settings import ADMIN_TOKEN
+from services.profiler import (DEFAULT_INTERVAL, MAX_SECONDS, MIN_INTERVAL, ProfilerBusy, allocation_profile,
+                               collapsed_output, sample_stacks)
+
+debug_bp = Blueprint('debug_bp', __name__)
+
+
+def is_admin():
+    """The request carries ADMIN_TOKEN in X-Admin-Token (never true while ADMIN_TOKEN is unset)."""
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+@debug_bp.route('/debug/profile', methods=['GET'])
+def profile():
+    """
+    Profile this worker process while it keeps serving requests (admin only)
+    Header: X-Admin-Token: <ADMIN_TOKEN>
+    Query: ?seconds=10&mode=cpu|alloc&interval_ms=10
+      cpu:   samples the stack of every thread each interval_ms; counts are samples
+      alloc: traces allocations for the window; counts are bytes still allocated at its end
+    Response (text/plain): collapsed stacks, one per line, heaviest first
+      MainThread;run (app/main.py:1);get_book_by_serial (app/mappers/edit_book_mapper.py:8) 412
+    Render with flamegraph.pl or open in speedscope. Each worker profiles only itself.
+    """
+    if not is_admin():
+        return jsonify({"message": "Forbidden"}), 403
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+        interval = float(request.args.get("interval_ms", DEFAULT_INTERVAL * 1000)) / 1000
+    except ValueError:
+        return jsonify({"message": "seconds and interval_ms must be numbers"}), 400
+    if not 0 < seconds <= MAX_SECONDS:
+        return jsonify({"message": f"seconds must be between 0 and {MAX_SECONDS}"}), 400
+    mode = request.args.get("mode", "cpu")
+    if mode not in ("cpu", "alloc"):
+        return jsonify({"message": "mode must be cpu or alloc"}), 400
+
+    try:
+        if mode == "cpu":
+            stacks = sample_stacks(seconds, max(MIN_INTERVAL, interval))
+        else:
+            stacks = allocation_profile(seconds)
+    except ProfilerBusy:
+        return jsonify({"message": "A profile is already running in this worker"}), 409
+    return Response(collapsed_output(stacks), mimetype="text/plain")
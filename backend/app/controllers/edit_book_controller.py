@@ -1,27 +1,305 @@
+import logging
+from datetime import datetime, timezone
+
 from flask import Blueprint, request, jsonify
-from services.edit_book_service import edit_book_service
+from config.mysql_db import SessionLocal
+from config.settings import REWRITE_PREVIEW_PARAGRAPHS, REWRITE_RATE_LIMIT
+from mappers.edit_book_mapper import get_book_by_serial
+from mappers.rewrite_job_mapper import get_job
+from services.admission_control import Overloaded
+from services.book_overlay_service import ANONYMOUS_USER_ID, get_book_view
+from services.compare_service import compare_texts
+from services.edit_book_service import edit_book_service, preview_book_service
+from services.rate_limiter import client_ip, rate_limit
+from services.style_presets import list_styles, resolve_style
+from services.token_quota import QuotaExceeded, QuotaTooSmall
+from services.user_service import UserService
+
+logger = logging.getLogger(__name__)
 
 book_bp = Blueprint('book_bp', __name__)
 
+# Aligned paragraph groups per page of GET /books/<serial>/compare
+DEFAULT_COMPARE_LIMIT = 50
+MAX_COMPARE_LIMIT = 200
+
+
+@book_bp.route('/styles', methods=['GET'])
+def get_styles():
+    """
+    List the rewrite style presets; send a preset id as editingOption
+    Response:
+    {
+        "styles": [{"id": "mystery", "name": "Mystery", "description": "...", "aliases": ["detective"],
+                    "model": "gpt-4o", "temperature": 0.8, "expansion": 1.1}]
+    }
+    """
+    return jsonify({"styles": list_styles()}), 200
+
+
+def parse_user_id(value):
+    """userId as sent by clients (login returns it as a string); anonymous if omitted."""
+    if value is None or value == "":
+        return ANONYMOUS_USER_ID
+    user_id = int(value)
+    if user_id < 0:
+        raise ValueError("negative userId")
+    return user_id
+
+
+def user_exists(user_id):
+    db = SessionLocal()
+    try:
+        return UserService.get_user_by_id(db, user_id) is not None
+    finally:
+        db.close()
+
 
 @book_bp.route('/books/<int:book_serial>', methods=['PUT'])
+# Per client IP: userId comes from the request body, so keying on it would let
+# a client pick a fresh limit for every request
+@rate_limit(REWRITE_RATE_LIMIT)
 def edit_book(book_serial):
+    """
+    Rewrite a book in a style for one user
+    Request Body:
+    {
+        "editingOption": "mystery",  (a preset id from GET /styles; free text is matched to a preset)
+        "userId": "7",              (optional, rewrites without it are shared by anonymous users)
+        "chapters": [0, 1],         (optional, defaults to every chapter)
+        "preview": true,            (optional)
+        "previewParagraphs": 3      (optional)
+    }
+    The rewrite is stored in the user's overlay; the shared book is not modified.
+    Response: { "message": "Chapter updated successfully", "style": "mystery", "text": "<the book as this user now sees it>" }
+
+    With "preview": true only the opening paragraphs are rewritten before responding,
+    and the rest is rewritten in the background (poll GET /rewrite-jobs/<jobId>):
+    Response (202): { "message": "Preview ready", "style": "mystery", "text": "<rewritten opening>", "jobId": "..." }
+
+    When the token quota of the user, or of the client IP across all its userIds, cannot cover the rewrite:
+    Response (429, Retry-After: <seconds>): { "message": "Token quota exceeded", "period": "day", "limit": 200000,
+                                             "used": 198000, "resetsAt": "2026-10-20T00:00:00+00:00" }
+    When the rewrite alone needs more tokens than the quota allows in a whole day or month:
+    Response (413): { "message": "Rewrite exceeds quota; select fewer chapters", "period": "day",
+                      "limit": 200000, "estimate": 250000 }
+
+    When too many rewrite calls are already running or queued (see GET /metrics), or a preview
+    would start a background job while REWRITE_MAX_JOBS are pending ("reason": "rewrite queue full"):
+    Response (503, Retry-After: <seconds>): { "message": "Too many rewrites in progress, retry later", "reason": "queue full" }
+    When the chapters are not all rewritten within REWRITE_REQUEST_TIMEOUT seconds:
+    Response (504): { "message": "Rewrite timed out; select fewer chapters or use a preview" }
+    """
     data = request.get_json()
     editing_option = data.get('editingOption')
 
     if not editing_option:
         return jsonify({"message": "Missing editing option"}), 400
+    preset = resolve_style(editing_option)
+    if not preset:
+        return jsonify({"message": "Failure"}), 404
+    editing_option = preset["id"]
+
+    chapters = data.get('chapters')
+    try:
+        user_id = parse_user_id(data.get('userId'))
+    except (TypeError, ValueError):
+        return jsonify({"message": "Invalid userId"}), 400
+    # userId is not authenticated, but it must at least name a registered user
+    if user_id != ANONYMOUS_USER_ID:
+        try:
+            if not user_exists(user_id):
+                return jsonify({"message": "User not found"}), 404
+        except Exception:
+            logger.exception("Database Error")
+            return jsonify({"message": "Internal Server Error"}), 500
+    if chapters is not None and not (isinstance(chapters, list) and
+                                     all(isinstance(chapter, int) for chapter in chapters)):
+        return jsonify({"message": "chapters must be a list of chapter numbers"}), 400
+
+    paragraphs = None
+    if data.get('preview'):
+        paragraphs = data.get('previewParagraphs', REWRITE_PREVIEW_PARAGRAPHS)
+        if not isinstance(paragraphs, int) or paragraphs < 1:
+            return jsonify({"message": "previewParagraphs must be a positive integer"}), 400
 
+    try:
+        if paragraphs:
+            return _preview_book(book_serial, editing_option, user_id, chapters, paragraphs)
+        return _rewrite_book(book_serial, editing_option, user_id, chapters)
+    except Overloaded as e:
+        response = jsonify({"message": "Too many rewrites in progress, retry later", "reason": e.reason})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
+
+
+def quota_exceeded_response(e):
+    response = jsonify({
+        "message": "Token quota exceeded",
+        "period": e.period,
+        "limit": e.limit,
+        "used": e.used,
+        "resetsAt": e.reset_at.isoformat()
+    })
+    response.headers["Retry-After"] = str(max(1, int((e.reset_at - datetime.now(timezone.utc)).total_seconds())))
+    return response, 429
+
+
+def quota_too_small_response(e):
+    return jsonify({
+        "message": "Rewrite exceeds quota; select fewer chapters",
+        "period": e.period,
+        "limit": e.limit,
+        "estimate": e.estimate
+    }), 413
+
+
+def _preview_book(book_serial, editing_option, user_id, chapters, paragraphs):
+    try:
+        preview = preview_book_service(book_serial, editing_option, user_id, chapters, paragraphs, client=client_ip())
+    except QuotaExceeded as e:
+        return quota_exceeded_response(e)
+    except QuotaTooSmall as e:
+        return quota_too_small_response(e)
+    except Overloaded:
+        # Answered with 503 by edit_book
+        raise
+    except Exception:
+        logger.exception("Error in edit_book")
+        return jsonify({"message": "Internal Server Error"}), 500
+    if not preview:
+        return jsonify({"message": "Failure"}), 404
+    return jsonify({
+        "message": "Preview ready",
+        "style": editing_option,
+        "text": preview["text"],
+        "jobId": preview["job_id"]
+    }), 202 if preview["job_id"] else 201
+
+
+def _rewrite_book(book_serial, editing_option, user_id, chapters):
     try:
         # Call the service layer to process the book edit request
-        updated_text = edit_book_service(book_serial, editing_option)
+        updated_text = edit_book_service(book_serial, editing_option, user_id, chapters, client=client_ip())
         if updated_text:
             return jsonify({
                 "message": "Chapter updated successfully",
+                "style": editing_option,
                 "text": updated_text
             }), 201
         else:
             return jsonify({"message": "Failure"}), 404
-    except Exception as e:
-        print(f"Error in edit_book: {str(e)}")
+    except QuotaExceeded as e:
+        return quota_exceeded_response(e)
+    except QuotaTooSmall as e:
+        return quota_too_small_response(e)
+    except Overloaded:
+        # Answered with 503 by edit_book
+        raise
+    except TimeoutError:
+        return jsonify({"message": "Rewrite timed out; select fewer chapters or use a preview"}), 504
+    except Exception:
+        logger.exception("Error in edit_book")
         return jsonify({"message": "Internal Server Error"}), 500
+
+
+@book_bp.route('/books/<int:book_serial>/rewrite', methods=['GET'])
+def get_rewrite(book_serial):
+    """
+    Read a book as one user sees it in one rewrite style: the user's rewritten
+    chapters, and the shared original everywhere else
+    Query: ?style=mystery&userId=7&chapter=3   (userId and chapter optional)
+    Response:
+    {
+        "book_serial": 12256, "style": "mystery", "user_id": 7,
+        "chapters": 12, "rewritten_chapters": [0, 3],
+        "chapter": 3, "text": "..."
+    }
+    """
+    preset = resolve_style(request.args.get("style"))
+    if not preset:
+        return jsonify({"message": "Missing style"}), 400
+    style = preset["id"]
+    try:
+        user_id = parse_user_id(request.args.get("userId"))
+        chapter = request.args.get("chapter", type=int)
+    except ValueError:
+        return jsonify({"message": "Invalid userId"}), 400
+
+    view = get_book_view(book_serial, style, user_id, chapter)
+    if not view:
+        return jsonify({"message": "Failure"}), 404
+    return jsonify(view), 200
+
+
+@book_bp.route('/books/<int:book_serial>/compare', methods=['GET'])
+def compare_book(book_serial):
+    """
+    Compare the original text of a book with one user's rewrite of it, aligned by paragraph
+    Query: ?style=mystery&userId=7&offset=0&limit=50&format=pairs|diff   (style required)
+      pairs: every aligned group with the text of both sides
+      diff:  runs of unchanged paragraphs collapsed to {"op": "equal", ..., "count"}
+    Response:
+    {
+      "original_hash": "...", "rewrite_hash": "...",
+      "stats": {"equal": 12, "changed": 30, "inserted": 1, "deleted": 0},
+      "total": 43, "offset": 0, "has_more": false,
+      "entries": [{"op": "changed", "original_index": 0, "rewrite_index": 0,
+                   "original": ["..."], "rewrite": ["..."]}]
+    }
+    The response carries an ETag derived from both text hashes.
+    """
+    try:
+        offset = int(request.args.get("offset", "0"))
+        limit = int(request.args.get("limit", DEFAULT_COMPARE_LIMIT))
+    except ValueError:
+        return jsonify({"message": "offset and limit must be integers"}), 400
+    if offset < 0 or limit < 1:
+        return jsonify({"message": "offset and limit must be positive"}), 400
+    output_format = request.args.get("format", "pairs")
+    if output_format not in ("pairs", "diff"):
+        return jsonify({"message": "format must be pairs or diff"}), 400
+
+    preset = resolve_style(request.args.get("style"))
+    if not preset:
+        return jsonify({"message": "Missing style"}), 400
+    style = preset["id"]
+    try:
+        user_id = parse_user_id(request.args.get("userId"))
+    except ValueError:
+        return jsonify({"message": "Invalid userId"}), 400
+
+    book = get_book_by_serial(book_serial)
+    view = get_book_view(book_serial, style, user_id, book=book) if book else None
+    if not view or not view["rewritten_chapters"]:
+        return jsonify({"message": "No rewrite of this book to compare"}), 404
+
+    try:
+        comparison = compare_texts(book["text"], view["text"], offset, min(limit, MAX_COMPARE_LIMIT),
+                                   compact=output_format == "diff")
+    except Exception:
+        logger.exception("Error in compare_book")
+        return jsonify({"message": "Internal Server Error"}), 500
+
+    response = jsonify({"book_serial": book_serial, **comparison})
+    response.set_etag(f"{comparison['original_hash'][:16]}-{comparison['rewrite_hash'][:16]}"
+                      f"-{output_format}-{offset}-{limit}")
+    return response.make_conditional(request)
+
+
+@book_bp.route('/rewrite-jobs/<job_id>', methods=['GET'])
+def get_rewrite_job(job_id):
+    """
+    Poll a background rewrite started by a preview
+    Response:
+    {
+        "job_id": "...", "book_serial": 12256, "user_id": 7, "style": "mystery",
+        "status": "pending" | "running" | "done" | "failed",
+        "completed": 3, "total": 12, "error": null
+    }
+    Finished pieces can already be read from GET /books/<serial>/rewrite.
+    """
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify(job), 200
@@ -0,0 +1,58 @@
+import logging
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify
+from controllers.debug_controller import is_admin
+from services.llm_usage_service import usage_report
+
+logger = logging.getLogger(__name__)
+
+llm_usage_bp = Blueprint('llm_usage_bp', __name__)
+
+MAX_USAGE_ROWS = 500
+
+
+def parse_date(value):
+    """An ISO date or datetime query parameter as an aware UTC datetime (None if omitted)."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@llm_usage_bp.route('/llm-usage', methods=['GET'])
+def get_llm_usage():
+    """
+    LLM token usage, latency and estimated cost from the usage ledger (admin only)
+    Header: X-Admin-Token: <ADMIN_TOKEN>
+    Query: ?group_by=book|style|user|model|day&since=2026-10-01&until=2026-10-08&limit=50
+           (group_by required; since inclusive, until exclusive)
+    Response:
+    {
+        "group_by": "style",
+        "rows": [{"key": "mystery", "calls": 812, "errors": 3, "prompt_tokens": 1630000,
+                  "cached_tokens": 1020000, "completion_tokens": 410000, "cost_usd": 6.94,
+                  "cache_hit_rate": 0.6258, "mean_latency_ms": 8120.4, "mean_first_token_ms": 640.2}]
+    }
+    Rows are most expensive first, except for group_by=day (oldest day first).
+    """
+    if not is_admin():
+        return jsonify({"message": "Forbidden"}), 403
+    group_by = request.args.get("group_by")
+    try:
+        since = parse_date(request.args.get("since"))
+        until = parse_date(request.args.get("until"))
+    except ValueError:
+        return jsonify({"message": "since and until must be ISO dates"}), 400
+    limit = request.args.get("limit", MAX_USAGE_ROWS, type=int)
+    if limit < 1:
+        return jsonify({"message": "limit must be positive"}), 400
+
+    try:
+        rows = usage_report(group_by, since, until, min(limit, MAX_USAGE_ROWS))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception:
+        logger.exception("Error in get_llm_usage")
+        return jsonify({"message": "Internal Server Error"}), 500
+    return jsonify({"group_by": group_by, "rows": rows}), 200
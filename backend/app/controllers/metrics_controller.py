@@ -0,0 +1,45 @@
+import logging
+
+from flask import Blueprint, jsonify
+from services.admission_control import rewrite_admission
+from services.book_sync_service import book_sync_status
+from services.tracing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Counters and gauges of this worker process
+    Response:
+    {
+        "rewrite_admission": {
+            "limit": 7.5, "in_flight": 7, "queue_depth": 3, "max_queue": 32, "mean_service_seconds": 41.2,
+            "admitted": 1204, "shed_busy": 3, "shed_queue_full": 12, "shed_timeout": 40,
+            "upstream_calls": 5120, "upstream_throttled": 9, "upstream_slow": 31
+        },
+        "latency": {
+            "sample_rate": 0.05,
+            "routes": {"GET /books/<int:book_serial>": {"count": 310, "mean_ms": 41.3, "p50_ms": 50,
+                                                        "p95_ms": 100, "p99_ms": 200, "buckets": {"1": 0, ...}}},
+            "layers": {"GET /books/<int:book_serial>": {"mongo": {...}, "json": {...}}}
+        },
+        "book_sync": {
+            "position": 10412, "head": 10498, "pending_changes": 86, "lag_seconds": 3.2,
+            "applied_through": "2025-03-01T12:00:04", "last_run_at": "2025-03-01T12:00:07"
+        }
+    }
+    Percentiles are bucket upper bounds in milliseconds (null past the last bucket).
+    Every request counts towards "routes"; only sampled ones towards "layers".
+    "book_sync" is how far the MySQL books table lags MongoDB (null if unavailable).
+    """
+    try:
+        sync = book_sync_status()
+    except Exception:
+        logger.exception("Error in book_sync_status")
+        sync = None
+    return jsonify({"rewrite_admission": rewrite_admission.metrics(), "latency": latency_stats.metrics(),
+                    "book_sync": sync}), 200
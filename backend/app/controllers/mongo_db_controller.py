@@ -1,8 +1,20 @@
 # backend/app/controllers/mongo_db_controller.py
+import zlib
+
 from flask import Blueprint, request, jsonify
 from pymongo.errors import DuplicateKeyError
 
 from config.mongodb_db import mongo_db
+from config.mysql_db import SessionLocal
+from config.settings import CATALOG_SOURCE
+from mappers.book_catalog_mapper import BookCatalogMapper, SORT_FIELDS
+from mappers.book_change_mapper import book_change, get_changes_since
+from mappers.book_facet_mapper import record_added_books, get_facets
+from mappers.book_similarity_mapper import find_similar, get_fingerprint
+from mappers.mongo_db_mapper import HIDDEN_FIELDS
+from models.book_schema import validate_book, normalize_tags, FINGERPRINT_FIELDS
+from services.book_ingest_service import ingest_books, iter_ndjson, open_upload
+from services.minhash import fingerprint
 # from config.mongodb_db import mongo_db
 
 # Collections
@@ -12,6 +24,21 @@ authors_collection = mongo_db["authors"]
 # Blueprint for MongoDB routes
 mongo_bp = Blueprint('mongo', __name__)
 
+# Upper bound on serials per POST /books/batch request
+MAX_BATCH_SERIALS = 100
+
+# Page size of GET /books/changes
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+
+# POST /books treats books at least this similar as the same work
+DUPLICATE_SIMILARITY = 0.8
+DUPLICATE_MODES = ("link", "reject", "allow")
+
+# GET /books/<serial>/similar
+DEFAULT_SIMILAR_LIMIT = 10
+MAX_SIMILAR_LIMIT = 50
+
 @mongo_bp.route('/books', methods=['POST'])
 def create_book():
   """
@@ -28,29 +55,46 @@ def create_book():
     "total_word_count": 100000,
     "text": "Once.."
   }
+  Query (optional): ?duplicates=link|reject|allow   (default link)
+    link:   store the book with "duplicate_of" set to the closest near-duplicate
+    reject: refuse the book with 409 if a near-duplicate exists
+    allow:  skip the near-duplicate check
   Response: { "message": "Book created"}
+  When near-duplicates are found the response also lists them:
+  { "message": "Successful", "near_duplicates": [{"book_serial": 12001, "title": "...", "author": "...", "similarity": 0.94}] }
   """
-  data = request.get_json()
-  required_fields = ["book_serial", "title", "author", "publication_date",
-                     "tags", "rating", "total_chapters", "total_word_count", "text"]
+  duplicates = request.args.get("duplicates", "link")
+  if duplicates not in DUPLICATE_MODES:
+    return jsonify({"message": "Failure", "error": f"duplicates must be one of: {', '.join(DUPLICATE_MODES)}"}), 400
 
-  if not all(field in data for field in required_fields):
+  data = request.get_json()
+  missing, invalid = validate_book(data)
+  if missing:
     return jsonify({"message": "Failure", "error": "Missing required fields"}), 404
 
   # Validate data types
-  if not (isinstance(data["book_serial"], int) and
-          isinstance(data["title"], str) and
-          isinstance(data["author"], str) and
-          isinstance(data["publication_date"], str) and
-          isinstance(data["tags"], str) and
-          isinstance(data["rating"], str) and
-          isinstance(data["total_chapters"], int) and
-          isinstance(data["total_word_count"], int) and
-          isinstance(data["text"], str)):
+  if invalid:
     return jsonify({"message": "Failure", "error": "Invalid data types"}), 404
 
+  data["tag_list"] = normalize_tags(data["tags"])
+  data.update(fingerprint(data["text"]))
+
   try:
-    result = books_collection.insert_one(data)
+    near_duplicates = []
+    if duplicates != "allow":
+      near_duplicates = find_similar(data, DUPLICATE_SIMILARITY, exclude_serial=data["book_serial"])
+    if near_duplicates and duplicates == "reject":
+      return jsonify({"message": "Failure", "error": "Near-duplicate of an existing book",
+                      "near_duplicates": near_duplicates}), 409
+    if near_duplicates:
+      data["duplicate_of"] = near_duplicates[0]["book_serial"]
+
+    with book_change() as stamp:
+      data.update(stamp)
+      books_collection.insert_one(data)
+    record_added_books([data])
+    if near_duplicates:
+      return jsonify({"message": "Successful", "near_duplicates": near_duplicates}), 200
     return jsonify({"message": "Successful"}), 200
   except DuplicateKeyError:
     return jsonify({"message": "Failure", "error": "Book with this book_serial already exists"}), 404
@@ -58,10 +102,47 @@ def create_book():
     return jsonify({"message": "Failure", "error": str(e)}), 500
 
 
+@mongo_bp.route('/books/bulk', methods=['POST'])
+def bulk_create_books():
+  """
+  Create many books from NDJSON (one book object per line)
+  Body: application/x-ndjson, optionally gzip-compressed (Content-Encoding: gzip
+        or Content-Type: application/gzip), or a multipart upload in field "file"
+        (gzip if the filename ends with .gz).
+  total_word_count is computed server-side and may be omitted.
+  Response:
+  {
+    "message": "Successful",
+    "inserted": 2,
+    "duplicates": [{"line": 3, "book_serial": 12256}],
+    "errors": [{"line": 4, "error": "Missing required fields: title"}]
+  }
+  """
+  upload = request.files.get("file")
+  if upload:
+    stream = open_upload(upload.stream, upload.filename.endswith(".gz"))
+  else:
+    gzipped = (request.content_encoding == "gzip" or
+               request.mimetype in ("application/gzip", "application/x-gzip"))
+    stream = open_upload(request.stream, gzipped)
+
+  try:
+    summary = ingest_books(iter_ndjson(stream))
+  except (OSError, EOFError, zlib.error) as e:
+    # Corrupt or truncated gzip data
+    return jsonify({"message": "Failure", "error": str(e)}), 400
+  except Exception as e:
+    return jsonify({"message": "Failure", "error": str(e)}), 500
+  return jsonify({"message": "Successful", **summary}), 200
+
+
 @mongo_bp.route('/books', methods=['GET'])
 def get_books():
   """
   Get all books
+  Query (optional): ?tag=fantasy&rating=PG-13&author=John%20Doe&sort=-publication_date&limit=50&offset=100
+    sort: title, author, publication_date, total_word_count or book_serial (the default); "-" sorts
+          descending, and ties are ordered by book_serial, so pages are stable on either catalog source
   Response:
   {
     "book_serial": 12256,
@@ -73,12 +154,67 @@ def get_books():
     "total_chapters": 20,
     "total_word_count": 100000
   }
+  With CATALOG_SOURCE=mysql the list comes from the MySQL copy kept by `flask sync-books`.
   """
-  books = list(books_collection.find({}, {"text": 0}))  # Exclude text field from listing
+  sort = request.args.get("sort") or "book_serial"
+  if sort.lstrip("-") not in SORT_FIELDS:
+    return jsonify({"error": f"sort must be one of: {', '.join(SORT_FIELDS)}"}), 400
+  try:
+    limit = int(request.args["limit"]) if request.args.get("limit") else None
+    offset = int(request.args.get("offset") or 0)
+  except ValueError:
+    return jsonify({"error": "limit and offset must be integers"}), 400
+  if (limit is not None and limit < 1) or offset < 0:
+    return jsonify({"error": "limit and offset must be positive"}), 400
+
+  tag = " ".join(request.args["tag"].split()).lower() if request.args.get("tag") else None
+  if CATALOG_SOURCE == "mysql":
+    db = SessionLocal()
+    try:
+      books = BookCatalogMapper.search_catalog(db, tag=tag, rating=request.args.get("rating"),
+                                               author=request.args.get("author"), sort=sort,
+                                               limit=limit, offset=offset)
+    finally:
+      db.close()
+    return jsonify(books), 200
+
+  query = {}
+  if tag:
+    # Matches one element of the indexed tag_list array
+    query["tag_list"] = tag
+  if request.args.get("rating"):
+    query["rating"] = request.args["rating"]
+  if request.args.get("author"):
+    query["author"] = request.args["author"]
+  cursor = books_collection.find(query, {"text": 0, **HIDDEN_FIELDS})  # Exclude text field from listing
+  # Always sorted: Mongo's natural order is not stable, so limit/offset pages could skip or repeat books
+  field = sort.lstrip("-")
+  keys = [(field, -1 if sort.startswith("-") else 1)]
+  if field != "book_serial":
+    keys.append(("book_serial", 1))
+  cursor = cursor.sort(keys)
+  if offset:
+    cursor = cursor.skip(offset)
+  if limit:
+    cursor = cursor.limit(limit)
+  books = list(cursor)
   for book in books:
     book["_id"] = str(book["_id"])
   return jsonify(books), 200
 
+@mongo_bp.route('/books/facets', methods=['GET'])
+def get_book_facets():
+  """
+  Get catalog facet counts (maintained incrementally on every book write)
+  Response:
+  {
+    "tags": {"fantasy": 12, "adventure": 7},
+    "ratings": {"PG-13": 9, "PG": 4}
+  }
+  """
+  return jsonify(get_facets()), 200
+
+
 @mongo_bp.route('/books/<int:book_serial>', methods=['GET'])
 def get_book_by_serial(book_serial):
   """
@@ -96,8 +232,115 @@ def get_book_by_serial(book_serial):
     "text": "Once upon a time ..",
   }
   """
-  book = books_collection.find_one({"book_serial": book_serial})
+  book = books_collection.find_one({"book_serial": book_serial}, HIDDEN_FIELDS)
   if not book:
     return jsonify({"error": "Book not found"}), 404
   book["_id"] = str(book["_id"])
-  return jsonify(book), 200
\ No newline at end of file
+  return jsonify(book), 200
+
+
+@mongo_bp.route('/books/<int:book_serial>/similar', methods=['GET'])
+def get_similar_books(book_serial):
+  """
+  Get books whose text is similar to this one (other editions, near-copies)
+  Query (optional): ?min_similarity=0.5&limit=10
+  Similarity is the estimated Jaccard similarity of the texts' word 5-grams.
+  Response:
+  {
+    "book_serial": 12256,
+    "similar": [{"book_serial": 12001, "title": "...", "author": "...", "similarity": 0.94}]
+  }
+  """
+  try:
+    min_similarity = float(request.args.get("min_similarity", "0.5"))
+    limit = int(request.args.get("limit", DEFAULT_SIMILAR_LIMIT))
+  except ValueError:
+    return jsonify({"error": "min_similarity must be a number and limit an integer"}), 400
+  if not 0 <= min_similarity <= 1 or limit < 1:
+    return jsonify({"error": "min_similarity must be between 0 and 1 and limit positive"}), 400
+
+  book_fingerprint = get_fingerprint(book_serial)
+  if not book_fingerprint:
+    return jsonify({"error": "Book not found"}), 404
+  similar = find_similar(book_fingerprint, min_similarity, min(limit, MAX_SIMILAR_LIMIT),
+                         exclude_serial=book_serial)
+  return jsonify({"book_serial": book_serial, "similar": similar}), 200
+
+
+@mongo_bp.route('/books/batch', methods=['POST'])
+def get_books_batch():
+  """
+  Get several books in one request
+  Request Body:
+  {
+    "serials": [12256, 99999],
+    "fields": ["title", "author", "text"]   (optional, defaults to every field)
+  }
+  Response (in request order, one entry per serial):
+  {
+    "books": [
+      {"book_serial": 12256, "title": "The Great Adventure", ...},
+      {"book_serial": 99999, "error": "Book not found"}
+    ]
+  }
+  """
+  data = request.get_json(silent=True) or {}
+  serials = data.get("serials")
+  fields = data.get("fields")
+
+  if not isinstance(serials, list) or not serials or \
+      not all(isinstance(serial, int) and not isinstance(serial, bool) for serial in serials):
+    return jsonify({"error": "serials must be a non-empty list of integers"}), 400
+  if len(serials) > MAX_BATCH_SERIALS:
+    return jsonify({"error": f"At most {MAX_BATCH_SERIALS} serials per request"}), 400
+  if fields is not None and not (isinstance(fields, list) and
+                                 all(isinstance(field, str) and field and not field.startswith("$")
+                                     for field in fields)):
+    return jsonify({"error": "fields must be a list of field names"}), 400
+
+  projection = HIDDEN_FIELDS
+  fields = [field for field in fields or () if field not in FINGERPRINT_FIELDS]
+  if fields:
+    projection = {field: 1 for field in fields}
+    projection["book_serial"] = 1
+
+  found = {}
+  for book in books_collection.find({"book_serial": {"$in": list(set(serials))}}, projection):
+    book["_id"] = str(book["_id"])
+    found[book["book_serial"]] = book
+
+  books = [found.get(serial) or {"book_serial": serial, "error": "Book not found"} for serial in serials]
+  return jsonify({"books": books}), 200
+
+
+@mongo_bp.route('/books/changes', methods=['GET'])
+def get_book_changes():
+  """
+  Get book metadata changed since the client's last sync
+  Query: ?since=<token>&limit=<n>   (since=0, or omitted, returns every book)
+  Response:
+  {
+    "changes": [
+      {"book_serial": 12256, "title": "...", "change_seq": 41, "updated_at": "...", "deleted": false},
+      {"book_serial": 12257, "change_seq": 42, "updated_at": "...", "deleted": true}
+    ],
+    "next_token": "42",
+    "has_more": false
+  }
+  Apply changes in order, store next_token and pass it as `since` next time.
+  While has_more is true, request again immediately.
+  """
+  try:
+    since = int(request.args.get("since", "0"))
+    limit = int(request.args.get("limit", DEFAULT_CHANGES_LIMIT))
+  except ValueError:
+    return jsonify({"error": "since and limit must be integers"}), 400
+  if since < 0 or limit < 1:
+    return jsonify({"error": "since and limit must be positive"}), 400
+  limit = min(limit, MAX_CHANGES_LIMIT)
+
+  changes = get_changes_since(since, limit + 1)
+  has_more = len(changes) > limit
+  changes = changes[:limit]
+  next_token = changes[-1]["change_seq"] if changes else since
+  return jsonify({"changes": changes, "next_token": str(next_token), "has_more": has_more}), 200
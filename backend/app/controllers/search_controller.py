@@ -0,0 +1,40 @@
+import logging
+from flask import Blueprint, request, jsonify
+from services.search_service import search_books
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search_bp', __name__)
+
+MAX_SEARCH_RESULTS = 50
+
+
+@search_bp.route('/search', methods=['GET'])
+def search():
+    """
+    GET /search?q=<words>&limit=<n>
+    Full-text search over titles, authors, tags and book text, ranked with BM25.
+    Response:
+    {
+        "query": "white whale",
+        "results": [
+            {"book_serial": 12256, "title": "Moby Dick", "author": "Herman Melville", "score": 12.41}
+        ]
+    }
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"message": "Missing search query"}), 400
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"message": "limit must be positive"}), 400
+
+    try:
+        results = search_books(query, limit)
+        return jsonify({"query": query, "results": results}), 200
+    except Exception:
+        logger.exception("Error in search")
+        return jsonify({"message": "Internal Server Error"}), 500
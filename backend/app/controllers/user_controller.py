@@ -1,6 +1,12 @@
 from flask import Blueprint, request, jsonify
 from config.mysql_db import SessionLocal  # SQLAlchemy database connection
 from services.user_service import UserService
+from services.recommendation_service import recommend_books
+from mappers.book_overlay_mapper import get_user_book_serials
+from services.rate_limiter import rate_limit
+from services.token_quota import token_quotas
+from config.settings import LOGIN_RATE_LIMIT
+from controllers.debug_controller import is_admin
 
 user_bp = Blueprint('user_bp', __name__)
 
@@ -69,6 +75,7 @@ def register():
 
 
 @user_bp.route('/auth/login', methods=['POST'])
+@rate_limit(LOGIN_RATE_LIMIT)
 def login():
     """
     POST /auth/login
@@ -145,6 +152,60 @@ def get_user_profile(user_id):
         db.close()
 
 
+@user_bp.route('/users/<int:user_id>/recommendations', methods=['GET'])
+def get_recommendations(user_id):
+    """
+    GET /users/{userId}/recommendations?limit=10
+    Recommends books from the user's favorite book, favorite author and preferred genre, and the
+    books the user has rewritten, which are left out of the results.
+    Response:
+    {
+        "recommendations": [
+            {"book_serial": 12256, "title": "string", "author": "string", "score": 0.83}
+        ]
+    }
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    db = SessionLocal()
+    try:
+        user = UserService.get_user_by_id(db, user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        history = get_user_book_serials(user_id)
+        return jsonify({"recommendations": recommend_books(user, limit, history)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        db.close()
+
+
+@user_bp.route('/users/<int:user_id>/quota', methods=['GET'])
+def get_token_quota(user_id):
+    """
+    GET /users/{userId}/quota
+    Remaining LLM tokens for rewrites (user 0 is the quota shared by anonymous rewrites). Admin only,
+    as userIds are not authenticated.
+    Header: X-Admin-Token: <ADMIN_TOKEN>
+    Response:
+    {
+        "userId": 7,
+        "day": {"limit": 200000, "used": 48211, "remaining": 151789, "resets_at": "2026-10-20T00:00:00+00:00"},
+        "month": {"limit": 2000000, "used": 310402, "remaining": 1689598, "resets_at": "2026-11-01T00:00:00+00:00"}
+    }
+    Periods with an unlimited quota are omitted.
+    """
+    if not is_admin():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify({"userId": user_id, **token_quotas.usage(user_id)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @user_bp.route('/users/<int:user_id>/profile', methods=['PUT'])
 def update_profile(user_id):
     """
@@ -11,6 +11,14 @@ from controllers.user_controller import user_bp
 # from controllers.book_controller import book_bp
 # from app.controllers.story_controller import story_bp
 from controllers.edit_book_controller import book_bp
+from controllers.search_controller import search_bp
+from controllers.metrics_controller import metrics_bp
+from controllers.llm_usage_controller import llm_usage_bp
+from controllers.debug_controller import debug_bp
+from commands import register_commands
+from services.rate_limiter import init_rate_limiter
+from services.structured_logging import init_logging
+from services.tracing import init_tracing
 
 def create_app():
     app = Flask(__name__)
@@ -19,8 +27,24 @@ def create_app():
     app.register_blueprint(user_bp)
     app.register_blueprint(mongo_bp)
     app.register_blueprint(book_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(llm_usage_bp)
+    app.register_blueprint(debug_bp)
     # app.register_blueprint(story_bp, url_prefix='/api/stories')
 
+    # JSON logs written off the request threads, tagged with the request id
+    init_logging(app)
+
+    # Time requests per route and layer (so the other hooks are timed too)
+    init_tracing(app)
+
+    # Enforce API_RATE_LIMIT and the per-route limits
+    init_rate_limiter(app)
+
+    # Register CLI commands (flask --app main <command>)
+    register_commands(app)
+
     # Configure the app (add any configurations here)
     # app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
 
@@ -0,0 +1,152 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.orm import Session
+
+from models.book_model import Book, BookTag, SyncCheckpoint
+from models.book_schema import normalize_tags
+
+# Sort keys accepted by search_catalog; prefix with "-" for descending
+SORT_FIELDS = {
+    "title": Book.title,
+    "author": Book.author,
+    "publication_date": Book.publication_date,
+    "total_word_count": Book.total_word_count,
+    "book_serial": Book.book_serial,
+}
+
+CATALOG_COLUMNS = (Book.book_serial, Book.title, Book.author, Book.publication_date, Book.tags, Book.rating,
+                   Book.total_chapters, Book.total_word_count)
+
+
+def _truncate(value, length):
+    return value[:length] if isinstance(value, str) else None
+
+
+def _parse_date(value):
+    """ISO "YYYY-MM-DD" (or a datetime) as a date; anything else as None."""
+    if isinstance(value, datetime):
+        return value.date()
+    try:
+        return date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _naive_utc(value):
+    if isinstance(value, datetime) and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value if isinstance(value, datetime) else None
+
+
+def _int_or_none(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def book_row(change):
+    """Column values of a books row from a change feed entry."""
+    return {
+        "book_serial": change["book_serial"],
+        "title": _truncate(change.get("title"), 255) or "",
+        "author": _truncate(change.get("author"), 255),
+        "publication_date": _parse_date(change.get("publication_date")),
+        "tags": _truncate(change.get("tags"), 255),
+        "rating": _truncate(change.get("rating"), 10),
+        "total_chapters": _int_or_none(change.get("total_chapters")),
+        "total_word_count": _int_or_none(change.get("total_word_count")),
+        "change_seq": change["change_seq"],
+        "updated_at": _naive_utc(change.get("updated_at")),
+    }
+
+
+class BookCatalogMapper:
+    @staticmethod
+    def lock_checkpoint(db: Session, name: str):
+        """The sync checkpoint row, locked for the rest of the transaction (created at 0 if missing)."""
+        checkpoint = db.execute(
+            select(SyncCheckpoint).where(SyncCheckpoint.name == name).with_for_update()
+        ).scalar_one_or_none()
+        if checkpoint is None:
+            checkpoint = SyncCheckpoint(name=name, position=0)
+            db.add(checkpoint)
+            db.flush()
+        return checkpoint
+
+    @staticmethod
+    def get_checkpoint(db: Session, name: str):
+        return db.get(SyncCheckpoint, name)
+
+    @staticmethod
+    def apply_changes(db: Session, changes: list):
+        """
+        Apply change feed entries (books and tombstones) to the books and
+        book_tags tables with one statement per kind of write. Changes older
+        than the row's stored change_seq are skipped, so replaying a batch
+        is harmless. The caller commits.
+
+        :return: {"upserted": int, "deleted": int, "skipped": int}
+        """
+        latest = {}
+        for change in changes:
+            current = latest.get(change["book_serial"])
+            if current is None or change["change_seq"] > current["change_seq"]:
+                latest[change["book_serial"]] = change
+
+        stored = dict(db.execute(
+            select(Book.book_serial, Book.change_seq).where(Book.book_serial.in_(list(latest)))
+        ).all()) if latest else {}
+        fresh = [change for serial, change in latest.items() if change["change_seq"] > stored.get(serial, 0)]
+        summary = {"upserted": 0, "deleted": 0, "skipped": len(changes) - len(fresh)}
+        if not fresh:
+            return summary
+
+        serials = [change["book_serial"] for change in fresh]
+        db.execute(delete(BookTag).where(BookTag.book_serial.in_(serials)))
+        gone = [change["book_serial"] for change in fresh if change.get("deleted")]
+        if gone:
+            db.execute(delete(Book).where(Book.book_serial.in_(gone)))
+            summary["deleted"] = sum(1 for serial in gone if serial in stored)
+
+        new_rows, changed_rows, tag_rows = [], [], []
+        for change in fresh:
+            if change.get("deleted"):
+                continue
+            row = book_row(change)
+            (changed_rows if row["book_serial"] in stored else new_rows).append(row)
+            tags = change.get("tag_list") or normalize_tags(change.get("tags"))
+            tag_rows.extend({"tag": tag, "book_serial": row["book_serial"]}
+                            for tag in dict.fromkeys(tag[:100] for tag in tags))
+        if new_rows:
+            db.execute(insert(Book), new_rows)
+        if changed_rows:
+            # Bulk UPDATE by primary key
+            db.execute(update(Book), changed_rows)
+        if tag_rows:
+            db.execute(insert(BookTag), tag_rows)
+        summary["upserted"] = len(new_rows) + len(changed_rows)
+        return summary
+
+    @staticmethod
+    def search_catalog(db: Session, tag=None, rating=None, author=None, sort="book_serial", limit=None,
+                       offset=0):
+        """Catalog rows matching the filters, ordered by `sort` (ties broken by book_serial)."""
+        stmt = select(*CATALOG_COLUMNS)
+        if tag:
+            stmt = stmt.join(BookTag, BookTag.book_serial == Book.book_serial).where(BookTag.tag == tag)
+        if rating:
+            stmt = stmt.where(Book.rating == rating)
+        if author:
+            stmt = stmt.where(Book.author == author)
+        column = SORT_FIELDS[sort.lstrip("-")]
+        stmt = stmt.order_by(column.desc() if sort.startswith("-") else column.asc(), Book.book_serial.asc())
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        books = []
+        for row in db.execute(stmt):
+            book = dict(row._mapping)
+            if book["publication_date"]:
+                book["publication_date"] = book["publication_date"].isoformat()
+            books.append(book)
+        return books
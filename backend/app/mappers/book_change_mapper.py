@@ -0,0 +1,170 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from config.mongodb_db import mongo_db
+from models.book_schema import FINGERPRINT_FIELDS
+
+# Every write to the books collection stamps the document with the next value
+# of a single monotonic counter, so clients can ask for "everything after N".
+books_collection = mongo_db["books"]
+counters_collection = mongo_db["counters"]
+tombstones_collection = mongo_db["book_tombstones"]
+
+BOOKS_COUNTER_ID = "book_changes"
+# How long a reserved change may take to land (bulk inserts of large books
+# included) before the feed stops waiting for it
+RESERVATION_LEASE_SECONDS = 600
+
+
+def _release_reservation(token):
+    counter = counters_collection.find_one_and_update(
+        {"_id": BOOKS_COUNTER_ID},
+        {"$pull": {"pending": {"token": token}}},
+        return_document=ReturnDocument.AFTER,
+    )
+    now = time.time()
+    if counter and any(reservation["expires"] < now for reservation in counter.get("pending", ())):
+        # Left behind by writers that died mid-write
+        counters_collection.update_one({"_id": BOOKS_COUNTER_ID}, {"$pull": {"pending": {"expires": {"$lt": now}}}})
+
+
+@contextmanager
+def reserve_change_seqs(count=1):
+    """
+    Reserve `count` consecutive change sequence numbers for a write and yield
+    the last one; the reserved range is (last - count, last]. Do the write
+    inside the block.
+
+    Numbers are handed out before their writes land, so a higher one can
+    become visible first. Until the block exits, the feed stops short of the
+    reserved range (see get_stable_change_seq), so no reader skips past it.
+    """
+    token = uuid.uuid4().hex
+    # The counter only grows, so this is at most the first number reserved
+    floor = get_current_change_seq() + 1
+    counter = counters_collection.find_one_and_update(
+        {"_id": BOOKS_COUNTER_ID},
+        {"$inc": {"seq": count},
+         "$push": {"pending": {"token": token, "floor": floor, "expires": time.time() + RESERVATION_LEASE_SECONDS}}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    try:
+        yield counter["seq"]
+    finally:
+        _release_reservation(token)
+
+
+@contextmanager
+def book_change():
+    """Reserve one change and yield its stamp: `with book_change() as stamp:` then $set **stamp."""
+    with reserve_change_seqs() as seq:
+        yield change_stamp(seq)
+
+
+def get_current_change_seq():
+    """The last change sequence number handed out, without reserving a new one."""
+    counter = counters_collection.find_one({"_id": BOOKS_COUNTER_ID})
+    return counter["seq"] if counter else 0
+
+
+def get_stable_change_seq():
+    """
+    The highest change sequence number up to which every write has landed:
+    the feed never returns changes past it. Reservations older than
+    RESERVATION_LEASE_SECONDS are taken to belong to writers that died.
+    """
+    counter = counters_collection.find_one({"_id": BOOKS_COUNTER_ID})
+    if not counter:
+        return 0
+    now = time.time()
+    floors = [reservation["floor"] for reservation in counter.get("pending", ()) if reservation["expires"] >= now]
+    return min(floors) - 1 if floors else counter["seq"]
+
+
+def change_stamp(seq):
+    """Fields to $set on a book write: its reserved change_seq and updated_at."""
+    return {
+        "change_seq": seq,
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+
+def stamp_books(books, last):
+    """Stamp a batch of new book documents with the range reserved by reserve_change_seqs(len(books))."""
+    first = last - len(books) + 1
+    for offset, book in enumerate(books):
+        book.update(change_stamp(first + offset))
+    return books
+
+
+def record_tombstone(book_serial):
+    """Remember that a book was deleted so syncing clients can drop it."""
+    with book_change() as stamp:
+        tombstones_collection.update_one(
+            {"book_serial": book_serial},
+            {"$set": {"book_serial": book_serial, "deleted": True, **stamp}},
+            upsert=True,
+        )
+
+
+def get_changes_since(since, limit):
+    """
+    Return up to `limit` changes with change_seq > since, oldest first.
+    Updated books are returned without their text; deleted books as tombstones.
+    Changes past a write still in flight are held back, so the last change
+    returned is always safe to resume from.
+    """
+    query = {"change_seq": {"$gt": since, "$lte": get_stable_change_seq()}}
+    projection = {"text": 0, **{field: 0 for field in FINGERPRINT_FIELDS}}
+    books = books_collection.find(query, projection).sort("change_seq", ASCENDING).limit(limit)
+    tombstones = tombstones_collection.find(query, {"_id": 0}).sort("change_seq", ASCENDING).limit(limit)
+
+    changes = []
+    for book in books:
+        book["_id"] = str(book["_id"])
+        book["deleted"] = False
+        changes.append(book)
+    changes.extend(tombstones)
+    changes.sort(key=lambda change: change["change_seq"])
+    return changes[:limit]
+
+
+def ensure_indexes():
+    """Create the indexes that back the change feed (safe to call repeatedly)."""
+    books_collection.create_index([("change_seq", ASCENDING)])
+    tombstones_collection.create_index([("change_seq", ASCENDING)])
+    tombstones_collection.create_index([("book_serial", ASCENDING)], unique=True)
+
+
+def backfill_change_seq(batch_size=1000):
+    """Stamp books written before the change feed existed. Returns how many were stamped."""
+    stamped = 0
+    while True:
+        ids = [book["_id"] for book in
+               books_collection.find({"change_seq": {"$exists": False}}, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return stamped
+        with reserve_change_seqs(len(ids)) as last:
+            first = last - len(ids) + 1
+            books_collection.bulk_write([
+                UpdateOne({"_id": _id}, {"$set": change_stamp(first + offset)})
+                for offset, _id in enumerate(ids)
+            ], ordered=False)
+        stamped += len(ids)
+
+
+def get_pending_changes(since):
+    """How many changes have change_seq > since, and the updated_at of the oldest of them (None if none)."""
+    query = {"change_seq": {"$gt": since}}
+    count, oldest = 0, None
+    for collection in (books_collection, tombstones_collection):
+        count += collection.count_documents(query)
+        first = collection.find_one(query, {"updated_at": 1}, sort=[("change_seq", ASCENDING)])
+        if first and first.get("updated_at") and (oldest is None or first["updated_at"] < oldest):
+            oldest = first["updated_at"]
+    return count, oldest
@@ -0,0 +1,102 @@
+import logging
+from collections import Counter
+
+from pymongo import ASCENDING, UpdateOne
+
+from config.mongodb_db import mongo_db
+from models.book_schema import normalize_tags
+
+logger = logging.getLogger(__name__)
+
+# Catalog facet counts, kept as one small document per (facet, value):
+#   {"_id": {"facet": "tag", "value": "fantasy"}, "count": 12}
+# Writes adjust the counts with $inc, so reading facets never scans the books.
+books_collection = mongo_db["books"]
+facets_collection = mongo_db["book_facets"]
+
+
+def facet_deltas(books, sign=1):
+    """Count the tag and rating values of `books`, multiplied by sign (+1 added, -1 removed)."""
+    deltas = Counter()
+    for book in books:
+        for tag in book.get("tag_list") or normalize_tags(book.get("tags")):
+            deltas[("tag", tag)] += sign
+        if book.get("rating"):
+            deltas[("rating", book["rating"])] += sign
+    return deltas
+
+
+def apply_facet_deltas(deltas):
+    operations = [
+        UpdateOne({"_id": {"facet": facet, "value": value}}, {"$inc": {"count": delta}}, upsert=True)
+        for (facet, value), delta in deltas.items() if delta
+    ]
+    if not operations:
+        return
+    # Best effort: a failed update must not fail the book write itself.
+    # `flask migrate-books` recounts the facets if they drift.
+    try:
+        facets_collection.bulk_write(operations, ordered=False)
+    except Exception:
+        logger.exception("Database Error")
+
+
+def record_added_books(books):
+    apply_facet_deltas(facet_deltas(books, 1))
+
+
+def record_removed_book(book):
+    apply_facet_deltas(facet_deltas([book], -1))
+
+
+def get_facets():
+    """Return {"tags": {tag: count}, "ratings": {rating: count}}, most common first."""
+    facets = {"tag": [], "rating": []}
+    for row in facets_collection.find({"count": {"$gt": 0}}):
+        facets[row["_id"]["facet"]].append((row["_id"]["value"], row["count"]))
+    return {
+        "tags": dict(sorted(facets["tag"], key=lambda item: (-item[1], item[0]))),
+        "ratings": dict(sorted(facets["rating"], key=lambda item: (-item[1], item[0]))),
+    }
+
+
+def backfill_tag_list(batch_size=1000):
+    """Add tag_list to books written before it existed. Returns how many were updated."""
+    updated = 0
+    while True:
+        books = list(books_collection.find({"tag_list": {"$exists": False}}, {"tags": 1}).limit(batch_size))
+        if not books:
+            return updated
+        books_collection.bulk_write([
+            UpdateOne({"_id": book["_id"]}, {"$set": {"tag_list": normalize_tags(book.get("tags"))}})
+            for book in books
+        ], ordered=False)
+        updated += len(books)
+
+
+def rebuild_facets():
+    """Recount every facet from the books collection (migration and drift repair)."""
+    deltas = Counter()
+    for row in books_collection.aggregate([
+        {"$unwind": "$tag_list"},
+        {"$group": {"_id": "$tag_list", "count": {"$sum": 1}}},
+    ]):
+        deltas[("tag", row["_id"])] = row["count"]
+    for row in books_collection.aggregate([
+        {"$match": {"rating": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$rating", "count": {"$sum": 1}}},
+    ]):
+        deltas[("rating", row["_id"])] = row["count"]
+
+    facets_collection.delete_many({})
+    if deltas:
+        facets_collection.insert_many([
+            {"_id": {"facet": facet, "value": value}, "count": count}
+            for (facet, value), count in deltas.items()
+        ])
+
+
+def ensure_indexes():
+    """Multikey index for tag filters and an index for rating filters."""
+    books_collection.create_index([("tag_list", ASCENDING)])
+    books_collection.create_index([("rating", ASCENDING)])
@@ -0,0 +1,103 @@
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from config.mongodb_db import mongo_db
+
+logger = logging.getLogger(__name__)
+
+# A user's rewrite of a book in one style is an overlay on the shared book:
+#   {"user_id": 7, "book_serial": 12256, "style": "mystery", "base_change_seq": 41,
+#    "spans": {"0": {"end": 5120, "text": "..."}, "9870": {...}}, "revision": 3}
+# Each span replaces the original text[start:end]; everything else is read
+# from the shared book, which is never copied or modified.
+overlays_collection = mongo_db["book_overlays"]
+
+# Times a save re-reads the overlay after losing a race with another save
+SAVE_ATTEMPTS = 5
+
+
+def _key(user_id, book_serial, style):
+    return {"user_id": user_id, "book_serial": book_serial, "style": style}
+
+
+def get_overlay(user_id, book_serial, style):
+    try:
+        return overlays_collection.find_one(_key(user_id, book_serial, style), {"_id": 0})
+    except Exception:
+        logger.exception("Database Error")
+        return None
+
+
+def save_overlay_spans(user_id, book_serial, style, base_change_seq, spans):
+    """
+    Store rewritten spans ({start: (end, text)}) in a user's overlay.
+
+    Existing spans that overlap a new one are dropped. If the shared book
+    changed since the overlay was written (base_change_seq differs), the old
+    spans no longer line up and are all replaced.
+
+    The overlay carries a revision number, and a save only applies if the
+    revision is still the one it read, so concurrent rewrites of the same
+    overlay retry instead of overwriting each other's spans.
+    """
+    new_spans = {str(start): {"end": end, "text": text} for start, (end, text) in spans.items()}
+    key = _key(user_id, book_serial, style)
+    try:
+        for _ in range(SAVE_ATTEMPTS):
+            overlay = overlays_collection.find_one(key, {"spans": 1, "base_change_seq": 1, "revision": 1})
+            now = datetime.now(timezone.utc)
+            if overlay is None:
+                try:
+                    overlays_collection.insert_one({**key, "base_change_seq": base_change_seq, "spans": new_spans,
+                                                    "revision": 1, "updated_at": now})
+                    return True
+                except DuplicateKeyError:
+                    # Created by a concurrent save; merge into it
+                    continue
+
+            update = {"$set": {"base_change_seq": base_change_seq, "updated_at": now}, "$inc": {"revision": 1}}
+            if overlay.get("base_change_seq") == base_change_seq:
+                update["$set"].update({f"spans.{start}": span for start, span in new_spans.items()})
+                overlapping = [
+                    start for start, span in overlay.get("spans", {}).items()
+                    if start not in new_spans and any(
+                        int(start) < new_end and int(new_start) < span["end"]
+                        for new_start, (new_end, _) in spans.items())
+                ]
+                if overlapping:
+                    update["$unset"] = {f"spans.{start}": "" for start in overlapping}
+            else:
+                update["$set"]["spans"] = new_spans
+            # Overlays written before revisions existed have none, which matches None
+            result = overlays_collection.update_one({**key, "revision": overlay.get("revision")}, update)
+            if result.matched_count:
+                return True
+        logger.error("Overlay save kept conflicting",
+                     extra={"user_id": user_id, "book_serial": book_serial, "style": style})
+        return False
+    except Exception:
+        logger.exception("Database Error")
+        return False
+
+
+def get_user_book_serials(user_id):
+    """Serials of the books a user has rewritten, in any style."""
+    try:
+        return overlays_collection.distinct("book_serial", {"user_id": user_id})
+    except Exception:
+        logger.exception("Database Error")
+        return []
+
+
+def delete_book_overlays(book_serial):
+    overlays_collection.delete_many({"book_serial": book_serial})
+
+
+def ensure_indexes():
+    """One overlay per (user, book, style) (safe to call repeatedly)."""
+    overlays_collection.create_index(
+        [("user_id", ASCENDING), ("book_serial", ASCENDING), ("style", ASCENDING)], unique=True)
+    overlays_collection.create_index([("book_serial", ASCENDING)])
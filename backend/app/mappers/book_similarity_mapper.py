@@ -0,0 +1,86 @@
+from pymongo import ASCENDING, UpdateOne
+
+from config.mongodb_db import mongo_db
+from services.minhash import NUM_PERM, fingerprint, from_bytes, similarity
+
+# Each book stores a 512-byte MinHash signature ("minhash") and one hash per
+# LSH band ("lsh_bands", multikey-indexed). Books sharing any band are
+# candidates; candidates are then ranked by their estimated Jaccard similarity,
+# so a lookup touches only the matching index entries, not the catalog.
+books_collection = mongo_db["books"]
+
+CANDIDATE_FIELDS = {"book_serial": 1, "title": 1, "author": 1, "minhash": 1}
+
+# Bounds the work of one lookup when many books share a band (e.g. stub texts).
+MAX_CANDIDATES = 1000
+
+# What empty texts were fingerprinted with before texts without shingles got
+# no fingerprint; backfill_fingerprints replaces it.
+EMPTY_TEXT_MINHASH = b"\xff" * (NUM_PERM * 4)
+
+
+def find_similar(book_fingerprint, min_similarity=0.5, limit=10, exclude_serial=None):
+    """
+    Books whose text is similar to `book_fingerprint` (see services.minhash.fingerprint).
+
+    :return: [{"book_serial", "title", "author", "similarity"}], most similar first
+    """
+    if not book_fingerprint.get("lsh_bands"):
+        # Too short to compare
+        return []
+    query = {"lsh_bands": {"$in": book_fingerprint["lsh_bands"]}}
+    if exclude_serial is not None:
+        query["book_serial"] = {"$ne": exclude_serial}
+    signature = from_bytes(book_fingerprint["minhash"])
+
+    matches = []
+    for book in books_collection.find(query, CANDIDATE_FIELDS).limit(MAX_CANDIDATES):
+        if not book.get("minhash"):
+            continue
+        score = similarity(signature, from_bytes(book["minhash"]))
+        if score >= min_similarity:
+            matches.append({"book_serial": book["book_serial"], "title": book.get("title"),
+                            "author": book.get("author"), "similarity": score})
+    matches.sort(key=lambda match: (-match["similarity"], match["book_serial"]))
+    return matches[:limit]
+
+
+def get_fingerprint(book_serial):
+    """
+    The stored fingerprint of a book, computing (and saving) it first for books
+    written before fingerprints existed. Returns None if there is no such book.
+    """
+    book = books_collection.find_one({"book_serial": book_serial}, {"minhash": 1, "lsh_bands": 1})
+    if not book:
+        return None
+    if "lsh_bands" not in book:
+        book = books_collection.find_one({"book_serial": book_serial}, {"text": 1})
+        if not book:
+            return None
+        fields = fingerprint(book.get("text") or "")
+        books_collection.update_one({"_id": book["_id"]}, {"$set": fields})
+        return fields
+    return book
+
+
+def ensure_indexes():
+    """Create the LSH band index (safe to call repeatedly)."""
+    books_collection.create_index([("lsh_bands", ASCENDING)])
+
+
+def backfill_fingerprints(batch_size=100):
+    """
+    Fingerprint books written before fingerprints existed, and clear the shared
+    fingerprint of empty texts. Returns how many were updated.
+    """
+    updated = 0
+    query = {"$or": [{"lsh_bands": {"$exists": False}}, {"minhash": EMPTY_TEXT_MINHASH}]}
+    while True:
+        books = list(books_collection.find(query, {"text": 1}).limit(batch_size))
+        if not books:
+            return updated
+        books_collection.bulk_write([
+            UpdateOne({"_id": book["_id"]}, {"$set": fingerprint(book.get("text") or "")})
+            for book in books
+        ], ordered=False)
+        updated += len(books)
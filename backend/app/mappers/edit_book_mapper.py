@@ -1,20 +1,26 @@
+import logging
 from config.mongodb_db import mongo_db
+from mappers.book_change_mapper import book_change
+from services.minhash import fingerprint
+
+logger = logging.getLogger(__name__)
 
 def get_book_by_serial(book_serial):
     try:
         book = mongo_db.books.find_one({"book_serial": book_serial})
         return book if book else None
-    except Exception as e:
-        print(f"Database Error: {str(e)}")
+    except Exception:
+        logger.exception("Database Error")
         return None
 
 def update_book_text(book_serial, updated_text):
     try:
-        result = mongo_db.books.update_one(
-            {"book_serial": book_serial},
-            {"$set": {"text": updated_text}}
-        )
+        with book_change() as stamp:
+            result = mongo_db.books.update_one(
+                {"book_serial": book_serial},
+                {"$set": {"text": updated_text, **fingerprint(updated_text), **stamp}}
+            )
         return result.modified_count > 0
-    except Exception as e:
-        print(f"Database Error: {str(e)}")
+    except Exception:
+        logger.exception("Database Error")
         return False
@@ -0,0 +1,185 @@
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from config.mongodb_db import mongo_db
+from config.settings import LLM_LEDGER_BATCH_SIZE, LLM_LEDGER_FLUSH_SECONDS, LLM_LEDGER_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+# Append-only ledger of LLM calls, one document per call:
+#   {"book_serial", "style", "user_id", "model", "outcome", "prompt_tokens", "cached_tokens",
+#    "completion_tokens", "cost_usd", "latency_ms", "first_token_ms", "hedged", "hedge_won",
+#    "hedge_delay_ms", "saved_ms", "estimated", "created_at"}
+# outcome is "ok" or the exception class of a failed call (calls recorded before
+# outcomes were tracked have none and count as "ok"). A hedge attempt cut off
+# because the other one won has outcome "hedge_cancelled"; it is still billed,
+# and when it ended before the provider sent its usage, its token counts are
+# estimates ("estimated": true).
+# cached_tokens is the part of the prompt the provider served from its prefix cache.
+# model is the model that produced the result, which for a won hedge may be the
+# fallback model; saved_ms estimates how much sooner the hedge finished.
+# cost_usd is the estimate at the prices in force when the call was made.
+calls_collection = mongo_db["llm_calls"]
+
+# What usage_by can group the ledger by
+_GROUP_KEYS = {
+    "book": "$book_serial",
+    "style": "$style",
+    "user": "$user_id",
+    "model": "$model",
+    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+}
+GROUP_BY = tuple(_GROUP_KEYS)
+
+
+def usage_counts(usage):
+    """Token counts from an OpenAI `usage` object (missing fields count as 0)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+class LedgerWriter:
+    """
+    Buffers ledger documents and writes them in batches from a background
+    thread, so recording a call never waits for the database. A batch is
+    written once batch_size documents are pending or every flush_seconds.
+    Documents a failed write did not store are queued again for the next
+    flush. Beyond max_pending documents (the database is down), the newest
+    are dropped and counted in `dropped` rather than held in memory.
+    """
+
+    def __init__(self, collection, batch_size=LLM_LEDGER_BATCH_SIZE, flush_seconds=LLM_LEDGER_FLUSH_SECONDS,
+                 max_pending=LLM_LEDGER_MAX_PENDING):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def append(self, document):
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(document)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-ledger", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            documents, self._pending = self._pending, []
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            try:
+                self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                logger.exception("Database Error")
+                # insert_many gave every document an _id, so a duplicate key is one
+                # an earlier, failed-looking attempt did store
+                failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != 11000}
+                self._requeue([document for index, document in enumerate(batch) if index in failed])
+            except Exception:
+                logger.exception("Database Error")
+                # The rest would most likely fail the same way; keep it all for the next flush
+                self._requeue(documents[start:])
+                return
+
+    def _requeue(self, documents):
+        with self._lock:
+            pending = documents + self._pending
+            self.dropped += max(0, len(pending) - self.max_pending)
+            self._pending = pending[:self.max_pending]
+
+
+ledger = LedgerWriter(calls_collection)
+# Write what is still buffered when the worker exits
+atexit.register(ledger.flush)
+
+
+def append_llm_call(document):
+    """Queue one ledger document; it is written in the background."""
+    ledger.append({**document, "created_at": datetime.now(timezone.utc)})
+
+
+def prompt_cache_stats(since=None):
+    """Per-book totals, split by whether the call hit the prompt cache."""
+    match = {"created_at": {"$gte": since}} if since else {}
+    return list(calls_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"book_serial": "$book_serial", "cached": {"$gt": ["$cached_tokens", 0]}},
+            "calls": {"$sum": 1},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "cached_tokens": {"$sum": "$cached_tokens"},
+            "latency_ms": {"$sum": "$latency_ms"},
+        }},
+    ]))
+
+
+def hedge_stats(since=None):
+    """Per-model hedge counts and latency totals."""
+    match = {"created_at": {"$gte": since}} if since else {}
+    return list(calls_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$model",
+            "calls": {"$sum": 1},
+            "hedged": {"$sum": {"$cond": ["$hedged", 1, 0]}},
+            "hedge_won": {"$sum": {"$cond": ["$hedge_won", 1, 0]}},
+            "latency_ms": {"$sum": "$latency_ms"},
+            "saved_ms": {"$sum": {"$ifNull": ["$saved_ms", 0]}},
+        }},
+    ]))
+
+
+def usage_by(group_by, since=None, until=None, limit=None):
+    """Ledger totals grouped by one of GROUP_BY, most expensive first ("day": oldest first)."""
+    match = {}
+    if since or until:
+        match["created_at"] = {**({"$gte": since} if since else {}), **({"$lt": until} if until else {})}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": _GROUP_KEYS[group_by],
+            "calls": {"$sum": 1},
+            "errors": {"$sum": {"$cond": [{"$in": [{"$ifNull": ["$outcome", "ok"]}, ["ok", "hedge_cancelled"]]},
+                                          0, 1]}},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "cached_tokens": {"$sum": "$cached_tokens"},
+            "completion_tokens": {"$sum": "$completion_tokens"},
+            "cost_usd": {"$sum": {"$ifNull": ["$cost_usd", 0]}},
+            "latency_ms": {"$avg": "$latency_ms"},
+            "first_token_ms": {"$avg": "$first_token_ms"},
+        }},
+        {"$sort": {"_id": 1} if group_by == "day" else {"cost_usd": -1, "_id": 1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    return list(calls_collection.aggregate(pipeline))
+
+
+def ensure_indexes():
+    calls_collection.create_index([("created_at", ASCENDING)])
+    calls_collection.create_index([("book_serial", ASCENDING)])
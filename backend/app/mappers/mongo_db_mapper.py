@@ -1,6 +1,17 @@
 # backend/app/mappers/book_mapper.py
-from pymongo.errors import DuplicateKeyError
-from app.config.mongodb_db import mongo_db
+import logging
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from config.mongodb_db import mongo_db
+from mappers.book_change_mapper import book_change, reserve_change_seqs, stamp_books, record_tombstone
+from mappers.book_facet_mapper import record_added_books, record_removed_book
+from mappers.book_overlay_mapper import delete_book_overlays
+from models.book_schema import normalize_tags, FINGERPRINT_FIELDS
+from services.minhash import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 指纹字段是二进制/内部数据，不返回给调用方
+HIDDEN_FIELDS = {field: 0 for field in FINGERPRINT_FIELDS}
 
 class BookMapper:
   def __init__(self):
@@ -9,27 +20,66 @@ class BookMapper:
   def create_book(self, book_data):
     """创建新书"""
     try:
-      result = self.collection.insert_one(book_data)
+      book_data["tag_list"] = normalize_tags(book_data.get("tags"))
+      book_data.update(fingerprint(book_data.get("text") or ""))
+      with book_change() as stamp:
+        book_data.update(stamp)
+        result = self.collection.insert_one(book_data)
+      record_added_books([book_data])
       return str(result.inserted_id), None
     except DuplicateKeyError:
       return None, "Book with this book_serial already exists"
     except Exception as e:
       return None, str(e)
 
+  def insert_books(self, books):
+    """批量插入（无序），单条失败不影响其他文档"""
+    try:
+      with reserve_change_seqs(len(books)) as last:
+        result = self.collection.insert_many(stamp_books(books, last), ordered=False)
+    except BulkWriteError as e:
+      failed = {error["index"] for error in e.details.get("writeErrors", [])}
+      record_added_books(book for i, book in enumerate(books) if i not in failed)
+      raise
+    record_added_books(books)
+    return len(result.inserted_ids)
+
+  def get_max_book_serial(self):
+    """获取当前最大的book_serial，没有书时返回0"""
+    book = self.collection.find_one({}, {"book_serial": 1}, sort=[("book_serial", -1)])
+    return book["book_serial"] if book else 0
+
   def get_all_books(self):
     """获取所有书的元数据（不包括text）"""
-    books = list(self.collection.find({}, {"text": 0}))
+    books = list(self.collection.find({}, {"text": 0, **HIDDEN_FIELDS}))
     for book in books:
       book["_id"] = str(book["_id"])
     return books
 
   def get_book_by_serial(self, book_serial):
     """通过book_serial获取完整书信息"""
-    book = self.collection.find_one({"book_serial": book_serial})
+    book = self.collection.find_one({"book_serial": book_serial}, HIDDEN_FIELDS)
     if book:
       book["_id"] = str(book["_id"])
     return book
 
+  def get_books_by_serials(self, book_serials, projection=None):
+    """用一次$in查询获取多本书"""
+    return list(self.collection.find({"book_serial": {"$in": list(book_serials)}}, projection))
+
+  def iter_books(self, projection=None, batch_size=100):
+    """以游标分批遍历所有书，内存占用与书的数量无关"""
+    return self.collection.find({}, projection, batch_size=batch_size)
+
+  def iter_book_samples(self, max_text_chars, batch_size=500):
+    """遍历所有书的元数据和text的前max_text_chars个字符（在数据库端截断）"""
+    return self.collection.aggregate([
+      {"$project": {
+        "book_serial": 1, "title": 1, "author": 1, "tags": 1, "tag_list": 1,
+        "text": {"$substrCP": [{"$ifNull": ["$text", ""]}, 0, max_text_chars]},
+      }},
+    ], batchSize=batch_size)
+
   def get_book_text(self, book_serial):
     """获取书的text内容"""
     book = self.collection.find_one({"book_serial": book_serial}, {"text": 1})
@@ -37,13 +87,25 @@ class BookMapper:
 
   def update_book_text(self, book_serial, text):
     """更新书的text内容"""
-    result = self.collection.update_one(
-        {"book_serial": book_serial},
-        {"$set": {"text": text}}
-      )
+    with book_change() as stamp:
+      result = self.collection.update_one(
+          {"book_serial": book_serial},
+          {"$set": {"text": text, **fingerprint(text), **stamp}}
+        )
     return result.matched_count > 0
 
   def delete_book(self, book_serial):
     """删除书"""
-    result = self.collection.delete_one({"book_serial": book_serial})
-    return result.deleted_count > 0
\ No newline at end of file
+    book = self.collection.find_one_and_delete(
+      {"book_serial": book_serial}, {"tags": 1, "tag_list": 1, "rating": 1})
+    if book:
+      # The tombstone first: the change feed must learn of the delete even if the cleanup fails
+      record_tombstone(book_serial)
+      record_removed_book(book)
+      try:
+        delete_book_overlays(book_serial)
+      except Exception:
+        # Orphaned overlays are never read without their book
+        logger.exception("Database Error")
+      return True
+    return False
\ No newline at end of file
@@ -0,0 +1,61 @@
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+from config.mongodb_db import mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Rate limit state shared by every worker process, one document per (client, limit):
+#   {"_id": "ip:10.0.0.7|100/3600", "tat": 1718000000.5, "expires_at": datetime}
+# tat is the GCRA "theoretical arrival time" in epoch seconds; a key whose tat
+# has passed is back to its full burst, so the document can expire.
+limits_collection = mongo_db["rate_limits"]
+
+
+def hit(key, interval, period, now):
+    """
+    Count one request against a GCRA limit in a single atomic update.
+
+    :return: (allowed, tat) where tat is the key's state after the request
+    """
+    current = {"$max": [{"$ifNull": ["$tat", now]}, now]}
+    try:
+        document = limits_collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"next_tat": {"$add": [current, interval]}}},
+                {"$set": {"allowed": {"$lte": [{"$subtract": ["$next_tat", now]}, period]}}},
+                {"$set": {
+                    "tat": {"$cond": ["$allowed", "$next_tat", current]},
+                    "expires_at": datetime.fromtimestamp(now + period, timezone.utc),
+                }},
+                {"$project": {"next_tat": 0}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return document["allowed"], document["tat"]
+    except Exception:
+        # Fail open: an unavailable store must not take the API down with it.
+        logger.exception("Database Error")
+        return True, now
+
+
+def peek(key, interval, period, now):
+    """What hit() would return, without counting the request."""
+    try:
+        document = limits_collection.find_one({"_id": key}, {"tat": 1})
+    except Exception:
+        logger.exception("Database Error")
+        return True, now
+    tat = max(document["tat"] if document else now, now)
+    if tat + interval - now > period:
+        return False, tat
+    return True, tat + interval
+
+
+def ensure_indexes():
+    """Expire idle keys (safe to call repeatedly)."""
+    limits_collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
@@ -0,0 +1,44 @@
+import logging
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from config.mongodb_db import mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Background rewrite jobs, so any worker process can answer a client's poll:
+#   {"_id": ObjectId, "book_serial", "user_id", "style",
+#    "status": "pending" | "running" | "done" | "failed", "total", "completed", "error"}
+jobs_collection = mongo_db["rewrite_jobs"]
+
+
+def create_job(book_serial, user_id, style, total):
+    now = datetime.now(timezone.utc)
+    result = jobs_collection.insert_one({
+        "book_serial": book_serial, "user_id": user_id, "style": style,
+        "status": "pending", "total": total, "completed": 0, "error": None,
+        "created_at": now, "updated_at": now,
+    })
+    return str(result.inserted_id)
+
+
+def update_job(job_id, completed_increment=0, **fields):
+    update = {"$set": {**fields, "updated_at": datetime.now(timezone.utc)}}
+    if completed_increment:
+        update["$inc"] = {"completed": completed_increment}
+    try:
+        jobs_collection.update_one({"_id": ObjectId(job_id)}, update)
+    except Exception:
+        logger.exception("Database Error")
+
+
+def get_job(job_id):
+    try:
+        job = jobs_collection.find_one({"_id": ObjectId(job_id)})
+    except InvalidId:
+        return None
+    if job:
+        job["job_id"] = str(job.pop("_id"))
+    return job
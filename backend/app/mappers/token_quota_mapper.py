@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+from config.mongodb_db import mongo_db
+
+# Tokens used per user and quota window, shared by every worker process:
+#   {"_id": "7:day:2026-10-19", "user_id": 7, "period": "day", "window": "2026-10-19",
+#    "used": 48211, "expires_at": datetime}
+# Workers add their usage in batches (see services.token_quota).
+usage_collection = mongo_db["token_usage"]
+
+# Windows are kept a little past their end for reporting, then expire
+RETENTION = timedelta(days=40)
+
+
+def usage_id(user_id, period, window):
+    return f"{user_id}:{period}:{window}"
+
+
+def get_usage(keys):
+    """Tokens used in each (user_id, period, window); windows without usage count as 0."""
+    ids = {usage_id(*key): key for key in keys}
+    if not ids:
+        return {}
+    used = dict.fromkeys(ids.values(), 0)
+    for document in usage_collection.find({"_id": {"$in": list(ids)}}, {"used": 1}):
+        used[ids[document["_id"]]] = document["used"]
+    return used
+
+
+def add_usage(deltas):
+    """Add token counts to many (user_id, period, window) keys in one bulk write."""
+    expires_at = datetime.now(timezone.utc) + RETENTION
+    usage_collection.bulk_write([
+        UpdateOne({"_id": usage_id(user_id, period, window)}, {
+            "$inc": {"used": delta},
+            "$setOnInsert": {"user_id": user_id, "period": period, "window": window},
+            "$max": {"expires_at": expires_at},
+        }, upsert=True)
+        for (user_id, period, window), delta in deltas.items()
+    ], ordered=False)
+
+
+def ensure_indexes():
+    usage_collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    usage_collection.create_index([("user_id", ASCENDING)])
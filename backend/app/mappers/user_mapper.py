@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from models.user_model import User
-from sqlalchemy import or_
+from sqlalchemy import or_, insert, select
 
 class UserMapper:
     @staticmethod
@@ -44,4 +44,28 @@ class UserMapper:
 
     @staticmethod
     def get_user_by_username(db: Session, username: str):
-        return db.query(User).filter(User.username == username).first()
\ No newline at end of file
+        return db.query(User).filter(User.username == username).first()
+
+    @staticmethod
+    def get_taken_usernames_and_emails(db: Session, usernames, emails):
+        """Return the subset of the given usernames and emails that already exist."""
+        rows = db.query(User.username, User.email).filter(
+            or_(User.username.in_(usernames), User.email.in_(emails))
+        ).all()
+        return {row.username for row in rows}, {row.email for row in rows}
+
+    @staticmethod
+    def bulk_insert_users(db: Session, rows: list):
+        """Insert many user rows with one executemany. The caller commits."""
+        if rows:
+            db.execute(insert(User), rows)
+
+    @staticmethod
+    def iter_users(db: Session, batch_size: int = 1000):
+        """Yield user rows (without password hashes) through a server-side cursor."""
+        stmt = select(
+            User.user_id, User.username, User.email, User.age, User.gender,
+            User.fav_book, User.fav_author, User.preferred_genre, User.created_at
+        ).order_by(User.user_id).execution_options(yield_per=batch_size)
+        for row in db.execute(stmt):
+            yield row
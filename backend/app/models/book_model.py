@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, Index
+from models.user_model import Base
+from config.mysql_db import engine  # Import MySQL connection
+
+# Relational copy of the book metadata in MongoDB, kept in sync by the book
+# sync relay (services.book_sync_service). The text stays in MongoDB.
+
+class Book(Base):
+    __tablename__ = 'books'
+
+    book_serial = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String(255), nullable=False, index=True)
+    author = Column(String(255), index=True)
+    publication_date = Column(Date, index=True)
+    tags = Column(String(255))  # Comma-separated, as in MongoDB; filter on book_tags
+    rating = Column(String(10), index=True)
+    total_chapters = Column(Integer)
+    total_word_count = Column(Integer, index=True)
+    # change_seq of the MongoDB document this row was copied from
+    change_seq = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime)
+
+
+class BookTag(Base):
+    __tablename__ = 'book_tags'
+
+    tag = Column(String(100), primary_key=True)
+    book_serial = Column(Integer, ForeignKey('books.book_serial', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (Index('ix_book_tags_book_serial', 'book_serial'),)
+
+
+class SyncCheckpoint(Base):
+    __tablename__ = 'sync_checkpoints'
+
+    name = Column(String(64), primary_key=True)
+    # Last change_seq applied, and the MongoDB updated_at of that change
+    position = Column(BigInteger, nullable=False, default=0)
+    applied_through = Column(DateTime)
+    last_run_at = Column(DateTime)
+
+# Create tables in MySQL if they don't exist
+Base.metadata.create_all(bind=engine)
@@ -0,0 +1,60 @@
+# Field types of a document in the Mongo `books` collection.
+BOOK_FIELDS = {
+    "book_serial": int,
+    "title": str,
+    "author": str,
+    "publication_date": str,
+    "tags": str,
+    "rating": str,
+    "total_chapters": int,
+    "total_word_count": int,
+    "text": str,
+}
+
+# Near-duplicate fingerprint stored on each book (see services.minhash). These
+# are binary/internal and are never returned by the API.
+FINGERPRINT_FIELDS = ("minhash", "lsh_bands")
+
+
+def normalize_tags(tags):
+    """
+    Turn the comma-separated `tags` string into the `tag_list` array stored
+    alongside it: trimmed, lower-cased, de-duplicated, in original order.
+    "Fantasy, adventure ,fantasy" -> ["fantasy", "adventure"]
+    """
+    if not isinstance(tags, str):
+        return []
+    seen = []
+    for tag in tags.split(","):
+        tag = " ".join(tag.split()).lower()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def compile_schema(fields, required):
+    """
+    Build a validator for a {field: type} schema once, so checking a record is a
+    single pass over precomputed (field, type) pairs.
+
+    The returned function takes a dict and returns (missing_fields, invalid_fields).
+    """
+    required = tuple(required)
+    checks = tuple(fields.items())
+
+    def validate(record):
+        missing = [field for field in required if field not in record]
+        invalid = [field for field, field_type in checks
+                   if field in record and not isinstance(record[field], field_type)]
+        return missing, invalid
+
+    return validate
+
+
+# POST /books: the client supplies every field.
+validate_book = compile_schema(BOOK_FIELDS, BOOK_FIELDS)
+
+# Bulk ingestion: total_word_count is computed server-side.
+validate_bulk_book = compile_schema(
+    BOOK_FIELDS, [field for field in BOOK_FIELDS if field != "total_word_count"]
+)
@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from config.settings import (ADMISSION_INITIAL_LIMIT, ADMISSION_MAX_LIMIT, ADMISSION_MAX_QUEUE,
+                             ADMISSION_MIN_LIMIT, ADMISSION_QUEUE_TIMEOUT, ADMISSION_TTFT_TARGET)
+
+# Multiplicative decrease applied on an upstream 429, and on slow first tokens
+THROTTLED_BACKOFF = 0.5
+SLOW_BACKOFF = 0.9
+# Weight of the newest request in the mean service time (for Retry-After)
+SERVICE_TIME_WEIGHT = 0.2
+
+
+class Overloaded(Exception):
+    """Raised instead of admitting a request; retry_after is in whole seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds how many upstream calls run at once, with a bounded wait queue.
+
+    Calls beyond the concurrency limit wait in FIFO order for at most
+    queue_timeout seconds; when max_queue calls are already waiting, new
+    ones are shed immediately, and so are callers that cannot wait (timeout=0). The limit adapts (AIMD) to the upstream it
+    protects: every healthy upstream call adds 1/limit, a 429 halves it and a
+    first token slower than ttft_target shrinks it by 10%. Decreases happen at
+    most once per mean service time, so one burst of errors counts once.
+    """
+
+    def __init__(self, initial_limit=ADMISSION_INITIAL_LIMIT, min_limit=ADMISSION_MIN_LIMIT,
+                 max_limit=ADMISSION_MAX_LIMIT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT, ttft_target=ADMISSION_TTFT_TARGET):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.ttft_target = ttft_target
+        self.in_flight = 0
+        self.service_time = ttft_target
+        self._queue = []
+        self._last_decrease = 0.0
+        self._counters = {"admitted": 0, "shed_busy": 0, "shed_queue_full": 0, "shed_timeout": 0,
+                          "upstream_calls": 0, "upstream_throttled": 0, "upstream_slow": 0}
+        self._lock = threading.Lock()
+
+    def _retry_after(self):
+        # Roughly how long until everyone queued now has been served
+        return max(1, math.ceil(self.service_time * (len(self._queue) + 1) / max(1.0, self.limit)))
+
+    def _has_capacity(self):
+        return self.in_flight < int(self.limit)
+
+    def acquire(self, timeout=None):
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._lock:
+            if not self._queue and self._has_capacity():
+                self.in_flight += 1
+                self._counters["admitted"] += 1
+                return
+            if timeout <= 0:
+                self._counters["shed_busy"] += 1
+                raise Overloaded("busy", self._retry_after())
+            if len(self._queue) >= self.max_queue:
+                self._counters["shed_queue_full"] += 1
+                raise Overloaded("queue full", self._retry_after())
+            waiter = threading.Event()
+            self._queue.append(waiter)
+
+        if waiter.wait(timeout):
+            return
+        with self._lock:
+            # Admitted between the timeout and taking the lock
+            if waiter.is_set():
+                return
+            self._queue.remove(waiter)
+            self._counters["shed_timeout"] += 1
+            raise Overloaded("queueing deadline exceeded", self._retry_after())
+
+    def release(self, service_time=None):
+        with self._lock:
+            self.in_flight -= 1
+            if service_time is not None:
+                self.service_time += SERVICE_TIME_WEIGHT * (service_time - self.service_time)
+            self._admit_waiting()
+
+    def _admit_waiting(self):
+        # Caller holds the lock; a waiter is counted as in flight before it wakes.
+        while self._queue and self._has_capacity():
+            self.in_flight += 1
+            self._counters["admitted"] += 1
+            self._queue.pop(0).set()
+
+    @contextmanager
+    def admit(self, timeout=None):
+        """Run the block once admitted; raises Overloaded if the call is shed."""
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def record_upstream(self, first_token_seconds=None, throttled=False):
+        """Adapt the limit to one upstream call (its time to first token, or a 429)."""
+        with self._lock:
+            self._counters["upstream_calls"] += 1
+            now = time.monotonic()
+            if throttled or (first_token_seconds is not None and first_token_seconds > self.ttft_target):
+                self._counters["upstream_throttled" if throttled else "upstream_slow"] += 1
+                if now - self._last_decrease >= self.service_time:
+                    self._last_decrease = now
+                    backoff = THROTTLED_BACKOFF if throttled else SLOW_BACKOFF
+                    self.limit = max(self.min_limit, self.limit * backoff)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._admit_waiting()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2), "in_flight": self.in_flight, "queue_depth": len(self._queue),
+                "max_queue": self.max_queue, "mean_service_seconds": round(self.service_time, 3),
+                **self._counters,
+            }
+
+
+# Guards every upstream call of a rewrite, in a request or a background job,
+# and is fed by each of them
+rewrite_admission = AdmissionController()
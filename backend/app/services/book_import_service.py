@@ -0,0 +1,230 @@
+import os
+import posixpath
+import re
+import unicodedata
+import zipfile
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+from services.book_ingest_service import book_mapper, count_words, ingest_books
+from services.minhash import fingerprint
+from services.windowed_pool import windowed_map
+
+SUPPORTED_EXTENSIONS = ('.txt', '.epub')
+
+# A chapter heading is a short line of its own such as "Chapter 12",
+# "CHAPTER XII. The Storm", "Book Two" or "Part III".
+_NUMBER_WORDS = (
+    "one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|"
+    "fifteen|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|"
+    "seventy|eighty|ninety|hundred"
+)
+CHAPTER_HEADING_RE = re.compile(
+    rf"^[ \t]*(?:chapter|book|part)[ \t]+(?:\d+|[ivxlcdm]+|(?:{_NUMBER_WORDS})(?:-(?:{_NUMBER_WORDS}))?)\b"
+    r"[^\n]{0,80}$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Gutenberg-style header lines at the top of plain-text books.
+TXT_METADATA_RE = re.compile(r"^(Title|Author|Release Date):[ \t]*(.+)$", re.MULTILINE)
+
+# An EPUB spine document shorter than this is treated as front matter
+# (cover, table of contents, copyright) rather than a chapter.
+MIN_CHAPTER_WORDS = 200
+
+_HORIZONTAL_SPACE_RE = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+_OPF_NS = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+
+def decode_text(raw):
+    """Decode book bytes, honouring a BOM and falling back from UTF-8 to cp1252."""
+    if raw.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return raw.decode("utf-16")
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+
+def normalize_text(text):
+    """
+    Normalize to NFC with "\\n" line endings, single spaces inside lines and at
+    most one blank line between paragraphs.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = (_HORIZONTAL_SPACE_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def detect_chapters(text):
+    """Return the character offsets at which chapter headings start."""
+    return [match.start() for match in CHAPTER_HEADING_RE.finditer(text)]
+
+
+class _XHTMLTextExtractor(HTMLParser):
+    """Collect the visible text of an XHTML document, one paragraph per block element."""
+
+    BLOCK_TAGS = {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "tr"}
+    SKIP_TAGS = {"script", "style", "head"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data.replace("\n", " "))
+
+    def text(self):
+        return "".join(self.parts)
+
+
+def _book_record(text, chapter_offsets, title, author, publication_date, fallback_chapters=1):
+    return {
+        "title": title,
+        "author": author,
+        "publication_date": publication_date,
+        "total_chapters": len(chapter_offsets) or fallback_chapters,
+        "total_word_count": count_words(text),
+        "chapter_offsets": chapter_offsets,
+        "text": text,
+        # Fingerprinted while parsing, so it runs in parse_files' worker processes
+        **fingerprint(text),
+    }
+
+
+def parse_txt(path):
+    with open(path, "rb") as file:
+        text = normalize_text(decode_text(file.read()))
+
+    metadata = {key: value.strip() for key, value in TXT_METADATA_RE.findall(text[:5000])}
+    title = metadata.get("Title") or os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+    return _book_record(
+        text, detect_chapters(text),
+        title=title,
+        author=metadata.get("Author", "Unknown"),
+        publication_date=metadata.get("Release Date", ""),
+    )
+
+
+def parse_epub(path):
+    with zipfile.ZipFile(path) as epub:
+        container = ElementTree.fromstring(epub.read("META-INF/container.xml"))
+        rootfile = container.find(".//container:rootfile", _OPF_NS)
+        if rootfile is None:
+            raise ValueError("EPUB container has no rootfile")
+        opf_path = rootfile.get("full-path")
+        opf = ElementTree.fromstring(epub.read(opf_path))
+        opf_dir = posixpath.dirname(opf_path)
+
+        def metadata(tag):
+            element = opf.find(f"opf:metadata/dc:{tag}", _OPF_NS)
+            return element.text.strip() if element is not None and element.text else ""
+
+        manifest = {item.get("id"): item.get("href") for item in opf.findall("opf:manifest/opf:item", _OPF_NS)}
+        documents = []
+        for itemref in opf.findall("opf:spine/opf:itemref", _OPF_NS):
+            href = manifest.get(itemref.get("idref"))
+            if not href:
+                continue
+            extractor = _XHTMLTextExtractor()
+            extractor.feed(decode_text(epub.read(posixpath.join(opf_dir, href))))
+            document = normalize_text(extractor.text())
+            if document:
+                documents.append(document)
+
+    text = "\n\n".join(documents)
+    chapter_documents = sum(1 for document in documents if count_words(document) >= MIN_CHAPTER_WORDS)
+    return _book_record(
+        text, detect_chapters(text),
+        title=metadata("title") or os.path.splitext(os.path.basename(path))[0],
+        author=metadata("creator") or "Unknown",
+        publication_date=metadata("date")[:10],
+        fallback_chapters=max(1, chapter_documents),
+    )
+
+
+def parse_book_file(path):
+    """Parse one .txt or .epub file into a book document (without book_serial)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".txt":
+        return parse_txt(path)
+    if extension == ".epub":
+        return parse_epub(path)
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+def find_book_files(paths):
+    """Expand files and directories (recursively) into a sorted list of importable files."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files
+                             if name.lower().endswith(SUPPORTED_EXTENSIONS))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def parse_files(paths, workers=None, on_progress=None):
+    """
+    Parse files in a process pool and yield (path, book) pairs in input order.
+
+    At most 2 * workers files are in flight, so memory is bounded by a handful
+    of parsed books no matter how many files are imported. Files that fail to
+    parse are yielded as (path, ValueError).
+    """
+    workers = workers or os.cpu_count() or 1
+    for done, (path, future) in enumerate(windowed_map(parse_book_file, paths, workers), start=1):
+        try:
+            book = future.result()
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+            book = ValueError(f"Could not parse file: {e}")
+        if on_progress:
+            on_progress(done, len(paths))
+        yield path, book
+
+
+def import_book_files(paths, tags="", rating="", start_serial=None, workers=None, on_progress=None):
+    """
+    Import .txt/.epub files (or directories of them) into the books collection.
+
+    Each parsed book is assigned the next book_serial, starting after the
+    current maximum unless start_serial is given, and is written through the
+    bulk ingestion path. Errors are keyed by file path in the "line" field.
+
+    :return: the ingest_books summary
+    """
+    paths = find_book_files(paths)
+    next_serial = start_serial if start_serial is not None else book_mapper.get_max_book_serial() + 1
+
+    def records():
+        nonlocal next_serial
+        for path, book in parse_files(paths, workers, on_progress):
+            if isinstance(book, Exception):
+                yield path, book
+                continue
+            book.update(book_serial=next_serial, tags=tags, rating=rating)
+            next_serial += 1
+            yield path, book
+
+    return ingest_books(records(), compute_fields=False)
@@ -0,0 +1,120 @@
+import gzip
+import json
+import re
+
+from pymongo.errors import BulkWriteError
+
+from mappers.mongo_db_mapper import BookMapper
+from models.book_schema import validate_bulk_book, normalize_tags
+from services.minhash import fingerprint
+
+# insert_many batches are flushed at whichever limit is reached first. Book
+# documents vary from a few KB to several MB, so the byte cap keeps each batch
+# well below MongoDB's 48MB message size.
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+
+DUPLICATE_KEY_ERROR = 11000
+
+_WORD_RE = re.compile(r"\S+")
+
+book_mapper = BookMapper()
+
+
+def count_words(text):
+    """Count whitespace-separated words without building a list of them."""
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+
+def open_upload(stream, gzipped=False):
+    """Wrap a binary stream so it yields decompressed lines."""
+    return gzip.GzipFile(fileobj=stream) if gzipped else stream
+
+
+def iter_ndjson(stream):
+    """
+    Stream (line_number, record) pairs from a binary NDJSON stream.
+    Lines that cannot be parsed are yielded as (line_number, ValueError).
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError("Each line must be a JSON object")
+            continue
+        yield line_number, record
+
+
+def prepare_book(record, compute_fields=True):
+    """
+    Validate a bulk record and compute its server-side fields (word count and
+    near-duplicate fingerprint). Raises ValueError if the record does not
+    match the book schema.
+    """
+    missing, invalid = validate_bulk_book(record)
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    if invalid:
+        raise ValueError(f"Invalid data types: {', '.join(invalid)}")
+    if compute_fields or not isinstance(record.get("total_word_count"), int):
+        record["total_word_count"] = count_words(record["text"])
+    if compute_fields or "lsh_bands" not in record:
+        record.update(fingerprint(record["text"]))
+    record["tag_list"] = normalize_tags(record["tags"])
+    return record
+
+
+def _flush(batch, summary):
+    """Insert one batch unordered and record per-record failures."""
+    books = [book for _, book in batch]
+    try:
+        summary["inserted"] += book_mapper.insert_books(books)
+    except BulkWriteError as e:
+        summary["inserted"] += e.details.get("nInserted", 0)
+        for error in e.details.get("writeErrors", []):
+            line_number, book = batch[error["index"]]
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                summary["duplicates"].append({"line": line_number, "book_serial": book["book_serial"]})
+            else:
+                summary["errors"].append({"line": line_number, "error": error.get("errmsg", "Write failed")})
+
+
+def ingest_books(records, batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=MAX_BATCH_BYTES,
+                 compute_fields=True):
+    """
+    Insert books from an iterable of (line_number, record) pairs.
+
+    Records are validated against the book schema as they stream in and written
+    with unordered insert_many, so one bad or duplicate record never blocks the
+    rest of its batch. Pass compute_fields=False only for records whose
+    total_word_count and fingerprint were already computed server-side.
+
+    :return: {"inserted": int, "duplicates": [{"line", "book_serial"}], "errors": [{"line", "error"}]}
+    """
+    summary = {"inserted": 0, "duplicates": [], "errors": []}
+    batch, batch_bytes = [], 0
+
+    for line_number, record in records:
+        if isinstance(record, Exception):
+            summary["errors"].append({"line": line_number, "error": str(record)})
+            continue
+        try:
+            book = prepare_book(record, compute_fields)
+        except ValueError as e:
+            summary["errors"].append({"line": line_number, "error": str(e)})
+            continue
+
+        batch.append((line_number, book))
+        batch_bytes += len(book["text"])
+        if len(batch) >= batch_size or batch_bytes >= max_batch_bytes:
+            _flush(batch, summary)
+            batch, batch_bytes = [], 0
+
+    if batch:
+        _flush(batch, summary)
+    return summary
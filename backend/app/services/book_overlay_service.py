@@ -0,0 +1,83 @@
+from mappers.book_overlay_mapper import get_overlay
+from mappers.edit_book_mapper import get_book_by_serial
+from services.book_import_service import detect_chapters
+
+# Rewrites made without a userId share this overlay.
+ANONYMOUS_USER_ID = 0
+
+
+def chapter_spans(book):
+    """
+    (start, end) character spans of the chapters of a book: the stored
+    chapter_offsets, else detected chapter headings, else the whole text.
+    Text before the first heading counts as its own chapter.
+    """
+    text = book.get("text") or ""
+    offsets = book.get("chapter_offsets") or detect_chapters(text)
+    offsets = [offset for offset in offsets if 0 < offset < len(text)]
+    starts = [0] + offsets
+    return list(zip(starts, starts[1:] + [len(text)]))
+
+
+def rewritten_span(text, start, end, rewrite):
+    """
+    The overlay entry for a rewrite of text[start:end]. The original trailing
+    whitespace is kept so paragraphs stay separated when the spans are merged.
+    """
+    original = text[start:end]
+    return end, rewrite.strip() + original[len(original.rstrip()):]
+
+
+def merge_spans(text, spans, start=0, end=None):
+    """
+    The overlay view of text[start:end]: original text, with every stored
+    span inside the range replaced by its rewrite. Built with a single join.
+    """
+    end = len(text) if end is None else end
+    pieces, position = [], start
+    for span_start in sorted(int(key) for key in spans):
+        span = spans[str(span_start)]
+        if span_start < position or span["end"] > end:
+            continue
+        pieces.append(text[position:span_start])
+        pieces.append(span["text"])
+        position = span["end"]
+    pieces.append(text[position:end])
+    return "".join(pieces)
+
+
+def current_spans(book, overlay):
+    """The overlay's spans, or none if the shared book changed since they were written."""
+    if not overlay or overlay.get("base_change_seq") != book.get("change_seq"):
+        return {}
+    return overlay.get("spans", {})
+
+
+def get_book_view(book_serial, style, user_id=ANONYMOUS_USER_ID, chapter=None, book=None):
+    """
+    A book as one user sees it in one rewrite style. Pass `book` if the
+    caller has already loaded the book document.
+
+    :return: {"book_serial", "style", "user_id", "chapters", "rewritten_chapters", "text"}
+             (plus "chapter" when a single chapter is requested), or None if the
+             book or the chapter does not exist
+    """
+    book = book or get_book_by_serial(book_serial)
+    if not book:
+        return None
+    spans = current_spans(book, get_overlay(user_id, book_serial, style))
+    chapters = chapter_spans(book)
+    starts = [int(start) for start in spans]
+    rewritten = [index for index, (start, end) in enumerate(chapters)
+                 if any(start <= span_start < end for span_start in starts)]
+
+    view = {"book_serial": book_serial, "style": style, "user_id": user_id,
+            "chapters": len(chapters), "rewritten_chapters": rewritten}
+    if chapter is None:
+        view["text"] = merge_spans(book["text"], spans)
+    elif 0 <= chapter < len(chapters):
+        view["chapter"] = chapter
+        view["text"] = merge_spans(book["text"], spans, *chapters[chapter])
+    else:
+        return None
+    return view
@@ -0,0 +1,107 @@
+import logging
+import threading
+from datetime import datetime, timezone
+
+from config.mysql_db import SessionLocal
+from config.settings import BOOK_SYNC_BATCH_SIZE, BOOK_SYNC_INTERVAL
+from mappers.book_catalog_mapper import BookCatalogMapper
+from mappers.book_change_mapper import get_changes_since, get_current_change_seq, get_pending_changes
+
+logger = logging.getLogger(__name__)
+
+# Copies book metadata from MongoDB into the MySQL books and book_tags tables.
+#
+# The change feed (change_seq / tombstones, see book_change_mapper) is the
+# outbox: every book write stamps its change in the same document write, so a
+# write and its change event cannot diverge. The relay reads the feed from a
+# checkpoint and applies each batch and the new checkpoint in one MySQL
+# transaction, so a crash replays at most the uncommitted batch, and replayed
+# changes are skipped by their change_seq.
+
+
+def _utc(value):
+    # pymongo returns naive datetimes in UTC; naive values are taken as UTC throughout
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class BookSyncRelay:
+    """
+    Applies the book change feed to MySQL in batches.
+
+    The feed never returns a change past a write still in flight (see
+    book_change_mapper.get_stable_change_seq), so the checkpoint can advance
+    past everything it returns without skipping a write that lands later.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size=BOOK_SYNC_BATCH_SIZE, name="books"):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.name = name
+
+    def run_once(self, now=None):
+        """
+        Apply one batch of changes.
+
+        :return: (changes applied, whether more changes may be waiting)
+        """
+        now = _utc(now) if now else datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            # Held until commit, so two relays never apply the same batch
+            checkpoint = BookCatalogMapper.lock_checkpoint(db, self.name)
+            changes = get_changes_since(checkpoint.position, self.batch_size)
+
+            if changes:
+                summary = BookCatalogMapper.apply_changes(db, changes)
+                checkpoint.position = changes[-1]["change_seq"]
+                if changes[-1].get("updated_at"):
+                    checkpoint.applied_through = _utc(changes[-1]["updated_at"]).replace(tzinfo=None)
+                logger.info("Book sync batch applied", extra={"position": checkpoint.position, **summary})
+            checkpoint.last_run_at = now.astimezone(timezone.utc).replace(tzinfo=None)
+            db.commit()
+            return len(changes), len(changes) == self.batch_size
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def run(self, interval=BOOK_SYNC_INTERVAL, stop_event=None):
+        """Apply batches until stop_event is set, sleeping `interval` seconds once caught up."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                _, more = self.run_once()
+            except Exception:
+                logger.exception("Error in book sync")
+                more = False
+            if not more:
+                stop_event.wait(interval)
+
+
+def book_sync_status(session_factory=SessionLocal, name="books", now=None):
+    """
+    How far MySQL lags behind MongoDB.
+
+    :return: {"position", "head", "pending_changes", "lag_seconds", "applied_through", "last_run_at"}
+             lag_seconds is the age of the oldest change not yet applied (0 when caught up)
+    """
+    now = _utc(now) if now else datetime.now(timezone.utc)
+    db = session_factory()
+    try:
+        checkpoint = BookCatalogMapper.get_checkpoint(db, name)
+        position = checkpoint.position if checkpoint else 0
+        applied_through = checkpoint.applied_through if checkpoint else None
+        last_run_at = checkpoint.last_run_at if checkpoint else None
+    finally:
+        db.close()
+
+    pending, oldest = get_pending_changes(position)
+    return {
+        "position": position,
+        "head": get_current_change_seq(),
+        "pending_changes": pending,
+        "lag_seconds": round(max(0.0, (now - _utc(oldest)).total_seconds()), 3) if oldest else 0.0,
+        "applied_through": applied_through.isoformat() if applied_through else None,
+        "last_run_at": last_run_at.isoformat() if last_run_at else None,
+    }
@@ -0,0 +1,170 @@
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from config.settings import COMPARE_CACHE_SIZE
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+# Gale-Church length-based alignment of the paragraphs between unchanged ones.
+# Each step is (original paragraphs, rewrite paragraphs, -log prior probability).
+_STEPS = (
+    (1, 1, -math.log(0.89)),
+    (1, 0, -math.log(0.0099 / 2)),
+    (0, 1, -math.log(0.0099 / 2)),
+    (2, 1, -math.log(0.089 / 2)),
+    (1, 2, -math.log(0.089 / 2)),
+)
+_STEP_OPS = {(1, 0): "deleted", (0, 1): "inserted"}
+# Variance of the rewrite/original length ratio per character.
+_LENGTH_VARIANCE = 6.8
+# Paths stray at most this many paragraphs from the diagonal of a changed run,
+# which keeps the alignment linear in the length of the book.
+_BAND = 10
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def split_paragraphs(text):
+    """Paragraphs are separated by blank lines; surrounding whitespace is dropped."""
+    return [paragraph.strip() for paragraph in _PARAGRAPH_RE.split(text) if paragraph.strip()]
+
+
+def _length_cost(original_length, rewrite_length, ratio, penalty):
+    mean = (original_length + rewrite_length / ratio) / 2 or 1
+    delta = (rewrite_length - original_length * ratio) / math.sqrt(mean * _LENGTH_VARIANCE)
+    probability = math.erfc(abs(delta) / math.sqrt(2))
+    return penalty - math.log(max(probability, 1e-300))
+
+
+def _align_changed(original_lengths, rewrite_lengths):
+    """
+    Pair up a run of changed paragraphs by length (Gale-Church).
+    Returns [(original_count, rewrite_count)] steps covering both runs in order.
+    """
+    n, m = len(original_lengths), len(rewrite_lengths)
+    if not n or not m:
+        return [(1, 0)] * n + [(0, 1)] * m
+    ratio = (sum(rewrite_lengths) or 1) / (sum(original_lengths) or 1)
+
+    costs = {(0, 0): (0.0, None)}
+    for i in range(n + 1):
+        # Row i spans the diagonal up to row i + 1, so steep runs stay connected.
+        for j in range(max(0, i * m // n - _BAND), min(m, (i + 1) * m // n + _BAND) + 1):
+            if i == 0 and j == 0:
+                continue
+            best = None
+            for di, dj, penalty in _STEPS:
+                previous = costs.get((i - di, j - dj))
+                if previous is None:
+                    continue
+                cost = previous[0] + _length_cost(sum(original_lengths[i - di:i]),
+                                                  sum(rewrite_lengths[j - dj:j]), ratio, penalty)
+                if best is None or cost < best[0]:
+                    best = (cost, (di, dj))
+            if best is not None:
+                costs[(i, j)] = best
+
+    steps, i, j = [], n, m
+    while (i, j) != (0, 0):
+        di, dj = costs[(i, j)][1]
+        steps.append((di, dj))
+        i, j = i - di, j - dj
+    steps.reverse()
+    return steps
+
+
+def align_paragraphs(original, rewrite):
+    """
+    Align two lists of paragraphs.
+
+    Unchanged paragraphs are matched exactly first; the runs between them are
+    paired by length. Returns [(op, i1, i2, j1, j2)] covering both lists in
+    order, where op is "equal", "changed", "inserted" or "deleted" and
+    original[i1:i2] corresponds to rewrite[j1:j2].
+    """
+    original_keys = [" ".join(paragraph.split()) for paragraph in original]
+    rewrite_keys = [" ".join(paragraph.split()) for paragraph in rewrite]
+    matcher = SequenceMatcher(None, original_keys, rewrite_keys, autojunk=False)
+
+    alignment = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            alignment.extend(("equal", i1 + k, i1 + k + 1, j1 + k, j1 + k + 1) for k in range(i2 - i1))
+            continue
+        i, j = i1, j1
+        steps = _align_changed([len(key) for key in original_keys[i1:i2]],
+                               [len(key) for key in rewrite_keys[j1:j2]])
+        for di, dj in steps:
+            alignment.append((_STEP_OPS.get((di, dj), "changed"), i, i + di, j, j + dj))
+            i, j = i + di, j + dj
+    return alignment
+
+
+def get_alignment(original_hash, original, rewrite_hash, rewrite):
+    """align_paragraphs, memoized by the pair of text hashes."""
+    key = (original_hash, rewrite_hash)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    alignment = align_paragraphs(original, rewrite)
+    with _cache_lock:
+        _cache[key] = alignment
+        while len(_cache) > COMPARE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return alignment
+
+
+def _entry(op, i1, i2, j1, j2, original, rewrite):
+    return {"op": op, "original_index": i1, "rewrite_index": j1,
+            "original": original[i1:i2], "rewrite": rewrite[j1:j2]}
+
+
+def compare_texts(original_text, rewrite_text, offset=0, limit=50, compact=False, original_hash=None):
+    """
+    Compare an original text with its rewrite, one aligned paragraph group per entry.
+
+    With compact=True, runs of unchanged paragraphs in the page are collapsed
+    to {"op": "equal", "original_index", "rewrite_index", "count"} without text.
+
+    :return: {"original_hash", "rewrite_hash", "stats", "total", "offset", "has_more", "entries"}
+    """
+    original_hash = original_hash or text_hash(original_text)
+    rewrite_hash = text_hash(rewrite_text)
+    original = split_paragraphs(original_text)
+    rewrite = split_paragraphs(rewrite_text)
+    alignment = get_alignment(original_hash, original, rewrite_hash, rewrite)
+
+    stats = {"equal": 0, "changed": 0, "inserted": 0, "deleted": 0}
+    for op, *_ in alignment:
+        stats[op] += 1
+
+    entries = []
+    for op, i1, i2, j1, j2 in alignment[offset:offset + limit]:
+        if compact and op == "equal":
+            if entries and entries[-1]["op"] == "equal":
+                entries[-1]["count"] += 1
+            else:
+                entries.append({"op": op, "original_index": i1, "rewrite_index": j1, "count": 1})
+            continue
+        entries.append(_entry(op, i1, i2, j1, j2, original, rewrite))
+
+    return {
+        "original_hash": original_hash,
+        "rewrite_hash": rewrite_hash,
+        "stats": stats,
+        "total": len(alignment),
+        "offset": offset,
+        "has_more": offset + limit < len(alignment),
+        "entries": entries,
+    }
@@ -1,45 +1,390 @@
-from openai import OpenAI, OpenAIError
-from mappers.edit_book_mapper import get_book_by_serial, update_book_text
+import logging
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from openai import OpenAI, OpenAIError, RateLimitError
+from mappers.book_overlay_mapper import get_overlay, save_overlay_spans
+from mappers.llm_usage_mapper import usage_counts
+from mappers.edit_book_mapper import get_book_by_serial
+from mappers.rewrite_job_mapper import create_job, update_job
+from services.admission_control import Overloaded, rewrite_admission
+from services.llm_client import CompletionTruncated, hedged_completion
+from services.llm_usage_service import record_llm_call
+from services.token_quota import token_quotas
+from services.tracing import span
+from services.book_overlay_service import (ANONYMOUS_USER_ID, chapter_spans, current_spans, merge_spans,
+                                           rewritten_span)
 from config import OPENAI_API_KEY
+from config.settings import (REWRITE_JOB_ADMISSION_TIMEOUT, REWRITE_JOB_WORKERS, REWRITE_MAX_JOBS,
+                             REWRITE_PREVIEW_PARAGRAPHS, REWRITE_PREVIEW_TIMEOUT, REWRITE_REQUEST_TIMEOUT,
+                             REWRITE_REQUEST_WINDOW, REWRITE_WORKERS)
+from services.style_presets import MAX_OUTPUT_TOKENS, max_output_tokens, max_passage_chars, resolve_style
+
+logger = logging.getLogger(__name__)
+
+# The same for every request, so it starts the cacheable prompt prefix.
+SYSTEM_PROMPT = ("You are a creative writing assistant. The user sends a passage of a book, then says how "
+                 "to rewrite it. Keep the plot, characters, names and paragraph breaks. "
+                 "Return only the rewritten text.")
+
+# A preview is a few paragraphs, so it never needs more output tokens than this.
+PREVIEW_MAX_TOKENS = 1024
+
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n\s*")
+
+# Rewrites the chapters of a book in parallel for a waiting request
+_executor = ThreadPoolExecutor(max_workers=REWRITE_WORKERS, thread_name_prefix="rewrite")
+# Finishes preview rewrites after the request has returned
+_job_executor = ThreadPoolExecutor(max_workers=REWRITE_JOB_WORKERS, thread_name_prefix="rewrite-job")
+# One per background job from the preview that starts it until the job ends,
+# which bounds the job executor's queue
+_job_slots = threading.BoundedSemaphore(REWRITE_MAX_JOBS)
+# Retry-After (seconds) when every job slot is taken
+JOB_QUEUE_RETRY_AFTER = 30
+
+def build_messages(text, preset):
+    """
+    Chat messages for rewriting `text`. The provider caches prompts by prefix,
+    so the stable parts come first (system prompt, then the passage) and the
+    style instruction last: rewrites of one passage in different styles share
+    everything but the final message.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"text```\n{text}```"},
+        {"role": "user", "content": f"Rewrite the text above {preset['instruction']}"},
+    ]
+
+def rewrite_text(client, text, preset, max_tokens=None, book_serial=None, cache_key=None, user_id=None,
+                 reservation=None):
+    """
+    Rewrite one passage with the preset's model and record the call in the
+    usage ledger, whether it succeeds or not. cache_key routes requests for
+    the same passage to the same provider cache. A slow call is hedged (see
+    services.llm_client), and every call feeds the rewrite admission limit.
+    The tokens used, including those of a cancelled hedge attempt, are charged
+    to `reservation` (a token quota reservation). Raises CompletionTruncated
+    if the rewrite does not fit in max_tokens.
+    """
+    started = time.monotonic()
+    try:
+        with span("llm"):
+            updated_text, usage, stats = hedged_completion(
+                client,
+                preset["model"],
+                build_messages(text, preset),
+                max_tokens=max_tokens or max_output_tokens(preset, text),
+                temperature=preset["temperature"],
+                **({"prompt_cache_key": cache_key} if cache_key else {})
+            )
+    except Exception as e:
+        if isinstance(e, RateLimitError):
+            rewrite_admission.record_upstream(throttled=True)
+        # A truncated completion was generated, and billed, up to max_tokens
+        usage = e.usage if isinstance(e, CompletionTruncated) else None
+        record_llm_call(book_serial, preset["id"], preset["model"], usage, (time.monotonic() - started) * 1000,
+                        user_id=user_id, outcome=type(e).__name__)
+        if reservation and usage:
+            counts = usage_counts(usage)
+            reservation.consume(counts["prompt_tokens"] + counts["completion_tokens"])
+        raise
+    if stats["first_token_ms"] is not None:
+        rewrite_admission.record_upstream(stats["first_token_ms"] / 1000)
+    latency_ms = (time.monotonic() - started) * 1000
+    cancelled = stats.pop("cancelled_attempts")
+    record_llm_call(book_serial, preset["id"], stats.pop("model"), usage, latency_ms, user_id=user_id, **stats)
+    # The losing hedge attempt was billed for its prompt and whatever it generated
+    for attempt in cancelled:
+        record_llm_call(book_serial, preset["id"], attempt["model"], attempt["usage"], latency_ms, user_id=user_id,
+                        outcome="hedge_cancelled", estimated=attempt["estimated"])
+    if reservation:
+        for billed in [usage] + [attempt["usage"] for attempt in cancelled]:
+            counts = usage_counts(billed)
+            reservation.consume(counts["prompt_tokens"] + counts["completion_tokens"])
+    return updated_text
+
+def estimate_tokens(preset, texts):
+    """Upper estimate of the tokens rewriting `texts` uses: about 4 characters per prompt token, plus max output."""
+    overhead = len(SYSTEM_PROMPT) + len(preset["instruction"]) + 40
+    return sum((overhead + len(text)) // 4 + max_output_tokens(preset, text) for text in texts)
+
+def split_passage(text, start, end, preset, ceiling=MAX_OUTPUT_TOKENS):
+    """
+    (start, end) pieces of text[start:end], each short enough for its rewrite
+    to fit in `ceiling` output tokens. Cut at the last paragraph break that
+    fits, else at the last space or newline, else mid-word.
+    """
+    limit = max_passage_chars(preset, ceiling)
+    pieces = []
+    while end - start > limit:
+        cut = None
+        for match in _PARAGRAPH_BREAK_RE.finditer(text, start + 1, start + limit):
+            cut = match.end()
+        if cut is None:
+            cut = max(text.rfind(" ", start + 1, start + limit), text.rfind("\n", start + 1, start + limit)) + 1
+            if cut <= start:
+                cut = start + limit
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
 
-MODEL="gpt-4o"
+def passage_cache_key(book_serial, start):
+    return f"book-{book_serial}-{start}"
+
+def _rewrite_admitted(client, text, preset, **kwargs):
+    """
+    rewrite_text for a call already admitted by rewrite_admission.acquire();
+    gives the admission back when the call ends. Workers only run admitted
+    calls, so none of them ever waits for admission.
+    """
+    started = time.monotonic()
+    try:
+        return rewrite_text(client, text, preset, **kwargs)
+    finally:
+        rewrite_admission.release(time.monotonic() - started)
+
+def _time_left(deadline):
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("rewrite deadline exceeded")
+    return left
+
+def rewrite_passages(client, book_serial, book, preset, passages, user_id, reservation):
+    """
+    Rewrite (start, end) passages of a book in parallel on the rewrite pool,
+    at most REWRITE_REQUEST_WINDOW at a time so the pool is shared fairly
+    between requests. Every passage is one upstream call, admitted by
+    rewrite_admission before it is submitted.
+
+    :return: {start: (end, rewritten text)} for rewritten_span/save_overlay_spans
+    :raises Overloaded: if a passage is not admitted
+    :raises TimeoutError: if the passages are not done within REWRITE_REQUEST_TIMEOUT seconds
+    :raises: the first failed passage's error
+    """
+    deadline = time.monotonic() + REWRITE_REQUEST_TIMEOUT
+    futures = []
+    pending = set()
+    try:
+        for start, end in passages:
+            while len(pending) >= REWRITE_REQUEST_WINDOW:
+                done, pending = wait(pending, timeout=_time_left(deadline), return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            # The request waits for admission here, not a worker
+            rewrite_admission.acquire(min(rewrite_admission.queue_timeout, _time_left(deadline)))
+            future = _executor.submit(_rewrite_admitted, client, book["text"][start:end], preset,
+                                      book_serial=book_serial, cache_key=passage_cache_key(book_serial, start),
+                                      user_id=user_id, reservation=reservation)
+            futures.append((start, end, future))
+            pending.add(future)
+        _, pending = wait(pending, timeout=_time_left(deadline))
+        if pending:
+            raise TimeoutError("rewrite deadline exceeded")
+        return {start: rewritten_span(book["text"], start, end, future.result()) for start, end, future in futures}
+    finally:
+        # Passages not yet started are dropped and give their admission back.
+        # Running ones are not waited for; the reservation charges what they
+        # use even after it settles.
+        for _, _, future in futures:
+            if future.cancel():
+                rewrite_admission.release()
+
+def edit_book_service(book_serial, editing_option, user_id=ANONYMOUS_USER_ID, chapters=None, client=None):
+    """
+    Rewrite chapters of a book in a style for one user, in parallel. The rewrite
+    is stored in the user's overlay for (book, style preset id); the shared book
+    text is left as is. Returns the book text as that user now sees it, or None on failure.
+    Raises QuotaExceeded, before calling the model, if the token quota of the
+    user or of `client` (see TokenQuotas.reserve) cannot cover the rewrite, or
+    QuotaTooSmall if no quota window ever could,
+    Overloaded if a chapter's call is shed by rewrite_admission, and
+    TimeoutError if the chapters take longer than REWRITE_REQUEST_TIMEOUT.
+    """
+    preset = resolve_style(editing_option)
+    if not preset:
+        return None
 
-def edit_book_service(book_serial, editing_option):
     # Retrieve the book's existing text
     book = get_book_by_serial(book_serial)
     if not book:
         return None
 
+    spans = chapter_spans(book)
+    indices = range(len(spans)) if chapters is None else [i for i in chapters if 0 <= i < len(spans)]
+    if not indices:
+        return None
+
+    # Chapters too long to rewrite within one completion are rewritten in pieces
+    passages = [piece for index in indices for piece in split_passage(book["text"], *spans[index], preset)]
+    # Raises QuotaExceeded (or QuotaTooSmall) before any model call if the user is out of tokens
+    texts = [book["text"][start:end] for start, end in passages]
+    reservation = token_quotas.reserve(user_id, estimate_tokens(preset, texts), client=client)
     client = OpenAI(
         api_key=OPENAI_API_KEY,  # This is the default and can be omitted
     )
-    # Prepare the prompt for the OpenAI API based on the editing option
-    prompt = f"Rewrite the following text in a {editing_option} style. text```\n{book['text']}```"
 
     try:
-        # Call OpenAI API to get the rewritten text
-
-        completion = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": "You are a creative writing assistant."},
-                # <-- This is the system message that provides context to the model
-                {"role": "user", "content": prompt}
-                # <-- This is the user message for which the model will generate a response
-            ],
-            max_tokens=2048,
-            temperature=0.7
-        )
+        rewritten = rewrite_passages(client, book_serial, book, preset, passages, user_id, reservation)
+
+        # Save only the rewritten chapters to the user's overlay
+        update_success = save_overlay_spans(user_id, book_serial, preset["id"], book.get("change_seq"), rewritten)
+        if not update_success:
+            return None
+        overlay = get_overlay(user_id, book_serial, preset["id"])
+        return merge_spans(book["text"], current_spans(book, overlay))
 
+    except (OpenAIError, CompletionTruncated):
+        logger.exception("OpenAI API Error", extra={"book_serial": book_serial})
+        return None
+    finally:
+        reservation.settle()
 
+def preview_end(text, start, end, paragraphs=REWRITE_PREVIEW_PARAGRAPHS):
+    """Offset just past the first `paragraphs` paragraphs of text[start:end]."""
+    count = 0
+    for match in _PARAGRAPH_BREAK_RE.finditer(text, start, end):
+        if match.start() == start:
+            continue
+        count += 1
+        if count == paragraphs:
+            return match.end()
+    return end
 
-        # Extract the generated text
-        updated_text = completion.choices[0].message.content
+def _requeue(delay, **job):
+    """Submit _complete_rewrite(**job) to the job executor again in `delay` seconds."""
+    timer = threading.Timer(delay, _job_executor.submit, args=(_complete_rewrite,), kwargs=job)
+    timer.daemon = True
+    timer.start()
 
-        # Update the text in the database via the mapper
-        update_success = update_book_text(book_serial, updated_text)
-        return updated_text if update_success else None
+def _complete_rewrite(job_id, book_serial, preset, user_id, book, pieces, reservation=None, deferred_at=None):
+    """
+    Rewrite the remaining (start, end) pieces of a book into the user's overlay, one at a time.
 
-    except OpenAIError as e:
-        print(f"OpenAI API Error: {str(e)}")
+    Each piece's call shares rewrite_admission with requests, but the job never
+    waits for it on a worker: when no call can be admitted right away the job
+    is re-queued with the pieces left after the Retry-After, and fails once it
+    has been deferred (since deferred_at) for REWRITE_JOB_ADMISSION_TIMEOUT seconds.
+    """
+    update_job(job_id, status="running")
+    client = OpenAI(
+        api_key=OPENAI_API_KEY,  # This is the default and can be omitted
+    )
+    requeued = False
+    try:
+        for index, (start, end) in enumerate(pieces):
+            try:
+                rewrite_admission.acquire(timeout=0)
+            except Overloaded as e:
+                deferred_at = deferred_at or time.monotonic()
+                if time.monotonic() + e.retry_after - deferred_at > REWRITE_JOB_ADMISSION_TIMEOUT:
+                    raise
+                _requeue(e.retry_after, job_id=job_id, book_serial=book_serial, preset=preset, user_id=user_id,
+                         book=book, pieces=pieces[index:], reservation=reservation, deferred_at=deferred_at)
+                requeued = True
+                return
+            deferred_at = None
+            updated_text = _rewrite_admitted(client, book["text"][start:end], preset, book_serial=book_serial,
+                                             cache_key=passage_cache_key(book_serial, start), user_id=user_id,
+                                             reservation=reservation)
+            # Saved piece by piece, so readers see the rewrite fill in progressively
+            if not save_overlay_spans(user_id, book_serial, preset["id"], book.get("change_seq"),
+                                      {start: rewritten_span(book["text"], start, end, updated_text)}):
+                raise RuntimeError("Failed to save the rewrite")
+            update_job(job_id, completed_increment=1)
+        update_job(job_id, status="done")
+    except Exception as e:
+        logger.exception("Rewrite job failed", extra={"job_id": str(job_id), "book_serial": book_serial})
+        update_job(job_id, status="failed", error=str(e))
+    finally:
+        # A re-queued job still holds its reservation and slot
+        if not requeued:
+            if reservation:
+                reservation.settle()
+            _job_slots.release()
+
+def preview_book_service(book_serial, editing_option, user_id=ANONYMOUS_USER_ID, chapters=None,
+                         paragraphs=REWRITE_PREVIEW_PARAGRAPHS, client=None):
+    """
+    Rewrite only the first `paragraphs` paragraphs now, and schedule the rest of
+    the requested chapters for background completion.
+
+    The preview call uses a short timeout and no retries, so the response time
+    depends on the preview size rather than the book size. Tokens for the whole
+    rewrite are reserved up front from the quotas of the user and `client`
+    (raises QuotaExceeded or QuotaTooSmall) and
+    settled when the background job ends. Raises Overloaded if REWRITE_MAX_JOBS
+    background jobs are already queued or running, or the preview call is shed
+    by rewrite_admission.
+
+    :return: {"text": rewritten preview, "style": preset id, "job_id": background job id or None},
+             or None on failure
+    """
+    preset = resolve_style(editing_option)
+    if not preset:
         return None
+
+    book = get_book_by_serial(book_serial)
+    if not book:
+        return None
+
+    spans = chapter_spans(book)
+    indices = range(len(spans)) if chapters is None else [i for i in chapters if 0 <= i < len(spans)]
+    if not indices:
+        return None
+
+    start, end = spans[indices[0]]
+    # Paragraphs too long for PREVIEW_MAX_TOKENS shorten the preview
+    split = split_passage(book["text"], start, preview_end(book["text"], start, end, paragraphs), preset,
+                          PREVIEW_MAX_TOKENS)[0][1]
+    remaining = ([(split, end)] if split < end else []) + [spans[i] for i in indices[1:]]
+    pieces = [piece for piece_start, piece_end in remaining
+              for piece in split_passage(book["text"], piece_start, piece_end, preset)]
+    # Refused before any tokens are spent when the background queue is full
+    if pieces and not _job_slots.acquire(blocking=False):
+        raise Overloaded("rewrite queue full", JOB_QUEUE_RETRY_AFTER)
+    submitted = False
+    try:
+        texts = [book["text"][start:split]] + [book["text"][piece_start:piece_end]
+                                              for piece_start, piece_end in pieces]
+        reservation = token_quotas.reserve(user_id, estimate_tokens(preset, texts), client=client)
+        client = OpenAI(
+            api_key=OPENAI_API_KEY,  # This is the default and can be omitted
+            timeout=REWRITE_PREVIEW_TIMEOUT,
+            max_retries=0,
+        )
+        try:
+            preview_text = book["text"][start:split]
+            with rewrite_admission.admit():
+                preview = rewrite_text(client, preview_text, preset,
+                                       max_output_tokens(preset, preview_text, ceiling=PREVIEW_MAX_TOKENS),
+                                       book_serial=book_serial, cache_key=passage_cache_key(book_serial, start),
+                                       user_id=user_id, reservation=reservation)
+        except (OpenAIError, CompletionTruncated):
+            logger.exception("OpenAI API Error", extra={"book_serial": book_serial})
+            reservation.settle()
+            return None
+        except Exception:
+            reservation.settle()
+            raise
+
+        if not save_overlay_spans(user_id, book_serial, preset["id"], book.get("change_seq"),
+                                  {start: rewritten_span(book["text"], start, split, preview)}):
+            reservation.settle()
+            return None
+
+        job_id = None
+        if pieces:
+            job_id = create_job(book_serial, user_id, preset["id"], len(pieces))
+            _job_executor.submit(_complete_rewrite, job_id=job_id, book_serial=book_serial, preset=preset,
+                                 user_id=user_id, book=book, pieces=pieces, reservation=reservation)
+            submitted = True
+        else:
+            reservation.settle()
+        return {"text": preview.strip(), "style": preset["id"], "job_id": job_id}
+    finally:
+        # The job releases its own slot when it ends
+        if pieces and not submitted:
+            _job_slots.release()
@@ -0,0 +1,234 @@
+import socket
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from config.settings import (LLM_FALLBACK_MODEL, LLM_HEDGE_BUDGET, LLM_HEDGE_MAX_DELAY, LLM_HEDGE_MIN_DELAY,
+                             LLM_HEDGE_PERCENTILE)
+
+# Time-to-first-token samples kept per model for the hedge delay
+TTFT_SAMPLES = 500
+# Below this many samples the delay stays at LLM_HEDGE_MAX_DELAY
+MIN_TTFT_SAMPLES = 20
+# At most this many hedges can be saved up by quiet periods
+MAX_HEDGE_BURST = 5.0
+# For estimating the tokens of an attempt cancelled before its usage arrived
+CHARS_PER_TOKEN = 4
+
+
+class CompletionTruncated(Exception):
+    """The model stopped at max_tokens (finish_reason "length"); usage is what the cut-off completion was billed."""
+
+    def __init__(self, model, usage):
+        super().__init__(f"{model} completion was cut off at max_tokens")
+        self.model = model
+        self.usage = usage
+
+
+class HedgePolicy:
+    """
+    When to send a second copy of a slow LLM request.
+
+    A request is hedged once it has waited longer than the recent
+    LLM_HEDGE_PERCENTILE time-to-first-token of its model (clamped to
+    [LLM_HEDGE_MIN_DELAY, LLM_HEDGE_MAX_DELAY]). Duplicate spend is capped by
+    a budget: every request earns LLM_HEDGE_BUDGET hedges and every hedge
+    costs one, so at most that fraction of requests is ever sent twice.
+    """
+
+    def __init__(self, percentile=LLM_HEDGE_PERCENTILE, min_delay=LLM_HEDGE_MIN_DELAY,
+                 max_delay=LLM_HEDGE_MAX_DELAY, budget=LLM_HEDGE_BUDGET):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._samples = {}
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self, model):
+        """Seconds to wait for the first token before hedging."""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < MIN_TTFT_SAMPLES:
+            return self.max_delay
+        value = samples[min(len(samples) - 1, int(len(samples) * self.percentile / 100))]
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def record_first_token(self, model, seconds):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=TTFT_SAMPLES)).append(seconds)
+
+    def start_request(self):
+        with self._lock:
+            self._tokens = min(MAX_HEDGE_BURST, self._tokens + self.budget)
+
+    def try_hedge(self):
+        """Spend one hedge from the budget; False if it is exhausted."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Attempt(threading.Thread):
+    """One streamed chat completion, run in a thread so it can be raced and cancelled."""
+
+    def __init__(self, client, model, request, started, finished):
+        super().__init__(daemon=True)
+        self.client = client
+        self.model = model
+        self.request = request
+        self.started = started
+        self.finished = finished
+        self.first_token = threading.Event()
+        self.first_token_at = None
+        self.finished_at = None
+        self.text = None
+        self.finish_reason = None
+        self.completion_chars = 0
+        self.usage = None
+        self.error = None
+        self.cancelled = False
+        self._stream = None
+
+    def run(self):
+        parts = []
+        try:
+            self._stream = self.client.chat.completions.create(
+                model=self.model, stream=True, stream_options={"include_usage": True}, **self.request)
+            for chunk in self._stream:
+                if self.cancelled:
+                    return
+                if getattr(chunk, "usage", None):
+                    self.usage = chunk.usage
+                if chunk.choices and getattr(chunk.choices[0], "finish_reason", None):
+                    self.finish_reason = chunk.choices[0].finish_reason
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not self.first_token.is_set():
+                        self.first_token_at = time.monotonic()
+                        self.first_token.set()
+                    parts.append(chunk.choices[0].delta.content)
+                    self.completion_chars += len(chunk.choices[0].delta.content)
+            if self.finish_reason == "length":
+                raise CompletionTruncated(self.model, self.billed_usage()[0])
+            self.text = "".join(parts)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.monotonic()
+            self.first_token.set()
+            self.finished.set()
+
+    def cancel(self):
+        """Stop reading and close the HTTP response, which aborts generation upstream."""
+        self.cancelled = True
+        # Closing alone waits for the read this attempt's thread is blocked in,
+        # which lasts until the next token; shutting the socket down ends it now
+        response = getattr(self._stream, "response", None)
+        network_stream = response.extensions.get("network_stream") if response is not None else None
+        sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        close = getattr(self._stream, "close", None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def elapsed_ms(self, at):
+        return None if at is None else (at - self.started) * 1000
+
+    def billed_usage(self):
+        """
+        What the provider bills this attempt for: its usage if it got that
+        far, else an estimate from the prompt and the text received so far.
+
+        :return: (usage, whether it is an estimate)
+        """
+        if self.usage is not None:
+            return self.usage, False
+        prompt_chars = sum(len(message["content"]) for message in self.request["messages"])
+        return SimpleNamespace(prompt_tokens=prompt_chars // CHARS_PER_TOKEN,
+                               completion_tokens=self.completion_chars // CHARS_PER_TOKEN), True
+
+
+def hedged_completion(client, model, messages, policy=None, fallback_model=LLM_FALLBACK_MODEL, **request):
+    """
+    Run a chat completion, hedging it with a second request (to fallback_model
+    if set, else the same model) when the first token is late. The first
+    request to finish wins and the other is cancelled. A completion cut off
+    at max_tokens counts as failed.
+
+    :return: (text, usage, stats) where stats has "model", "hedged", "hedge_won",
+             "first_token_ms", "hedge_delay_ms", "saved_ms" (an estimate of
+             the latency the hedge saved, 0 when it did not win) and
+             "cancelled_attempts": [{"model", "usage", "estimated"}] for the
+             losing request unless it failed, which is billed as well
+    :raises CompletionTruncated: if no request finished before max_tokens
+    """
+    policy = policy or hedge_policy
+    policy.start_request()
+    request["messages"] = messages
+    delay = policy.delay(model)
+    started = time.monotonic()
+    finished = threading.Event()
+
+    primary = _Attempt(client, model, request, started, finished)
+    primary.start()
+    attempts = [primary]
+    if not primary.first_token.wait(delay) and policy.try_hedge():
+        hedge = _Attempt(client, fallback_model or model, request, time.monotonic(), finished)
+        hedge.start()
+        attempts.append(hedge)
+
+    winner = None
+    while winner is None:
+        finished.wait()
+        finished.clear()
+        done = [attempt for attempt in attempts if attempt.finished_at is not None]
+        winner = next((attempt for attempt in done if attempt.error is None), None)
+        if winner is None and len(done) == len(attempts):
+            raise done[0].error
+    # Every other attempt that has not failed is billed, whether it is cut off here or just finished,
+    # and so is one that generated up to max_tokens
+    cancelled = [attempt for attempt in attempts if attempt is not winner and
+                 (attempt.error is None or isinstance(attempt.error, CompletionTruncated))]
+    for attempt in cancelled:
+        attempt.cancel()
+
+    if winner.first_token_at is not None:
+        policy.record_first_token(winner.model, winner.first_token_at - winner.started)
+    if primary.first_token_at is not None and primary is not winner:
+        policy.record_first_token(primary.model, primary.first_token_at - primary.started)
+
+    hedge_won = winner is not primary
+    saved_ms = 0.0
+    if hedge_won:
+        # Had the primary been left to finish, it would have produced its first
+        # token no earlier than now and then generated as fast as the winner did.
+        generation = winner.finished_at - (winner.first_token_at or winner.finished_at)
+        primary_first_token = primary.first_token_at or winner.finished_at
+        saved_ms = max(0.0, (primary_first_token + generation - winner.finished_at) * 1000)
+
+    stats = {
+        "model": winner.model,
+        "hedged": len(attempts) > 1,
+        "hedge_won": hedge_won,
+        "first_token_ms": winner.elapsed_ms(winner.first_token_at),
+        "hedge_delay_ms": round(delay * 1000, 1),
+        "saved_ms": round(saved_ms, 1),
+        "cancelled_attempts": [dict(zip(("usage", "estimated"), attempt.billed_usage()), model=attempt.model)
+                               for attempt in cancelled],
+    }
+    return winner.text, winner.usage, stats
+
+
+# Shared by every request in this process
+hedge_policy = HedgePolicy()
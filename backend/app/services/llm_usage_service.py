@@ -0,0 +1,125 @@
+import logging
+
+from mappers.llm_usage_mapper import GROUP_BY, append_llm_call, hedge_stats, prompt_cache_stats, usage_by, usage_counts
+
+logger = logging.getLogger(__name__)
+
+# Estimated USD per 1M tokens: (uncached prompt, cached prompt, completion).
+# Update when the provider changes its prices; recorded costs keep the old ones.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+}
+
+
+def estimate_cost(model, counts):
+    """Estimated USD cost of a call from its token counts, or None for a model without prices."""
+    prices = MODEL_PRICES.get(model)
+    if not prices:
+        return None
+    uncached = counts["prompt_tokens"] - counts["cached_tokens"]
+    return round((uncached * prices[0] + counts["cached_tokens"] * prices[1] +
+                  counts["completion_tokens"] * prices[2]) / 1_000_000, 6)
+
+
+def record_llm_call(book_serial, style, model, usage, latency_ms, user_id=None, outcome="ok", **stats):
+    """
+    Add one LLM call to the usage ledger. The write is buffered and batched
+    off the request path; accounting never fails the call itself.
+
+    :param outcome: "ok", or the exception class name of a failed call
+    :param stats: extra per-call fields, e.g. first_token_ms and the hedge stats
+    """
+    try:
+        counts = usage_counts(usage)
+        append_llm_call({
+            "book_serial": book_serial, "style": style, "user_id": user_id, "model": model, "outcome": outcome,
+            **counts, "cost_usd": estimate_cost(model, counts), "latency_ms": round(latency_ms, 1), **stats,
+        })
+    except Exception:
+        logger.exception("LLM usage Error", extra={"book_serial": book_serial, "model": model})
+
+
+def prompt_cache_report(since=None):
+    """
+    Prompt cache effectiveness per book.
+
+    hit_rate is the share of prompt tokens served from the provider's cache.
+    saved_ms estimates the latency saved as (uncached mean - cached mean) *
+    cached calls, which is only meaningful once a book has calls of both kinds.
+
+    :return: [{"book_serial", "calls", "cached_calls", "prompt_tokens", "cached_tokens",
+               "hit_rate", "cached_latency_ms", "uncached_latency_ms", "saved_ms"}],
+             books with the most prompt tokens first
+    """
+    books = {}
+    for row in prompt_cache_stats(since):
+        book_serial = row["_id"].get("book_serial")
+        book = books.setdefault(book_serial, {
+            "book_serial": book_serial, "calls": 0, "cached_calls": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            "cached_latency_ms": None, "uncached_latency_ms": None,
+        })
+        book["calls"] += row["calls"]
+        book["prompt_tokens"] += row["prompt_tokens"]
+        book["cached_tokens"] += row["cached_tokens"]
+        mean_latency = round(row["latency_ms"] / row["calls"], 1)
+        if row["_id"].get("cached"):
+            book["cached_calls"] = row["calls"]
+            book["cached_latency_ms"] = mean_latency
+        else:
+            book["uncached_latency_ms"] = mean_latency
+
+    report = []
+    for book in books.values():
+        book["hit_rate"] = round(book["cached_tokens"] / book["prompt_tokens"], 4) if book["prompt_tokens"] else 0.0
+        book["saved_ms"] = None
+        if book["cached_latency_ms"] is not None and book["uncached_latency_ms"] is not None:
+            book["saved_ms"] = round((book["uncached_latency_ms"] - book["cached_latency_ms"]) * book["cached_calls"])
+        report.append(book)
+    report.sort(key=lambda book: -book["prompt_tokens"])
+    return report
+
+
+def hedge_report(since=None):
+    """
+    Hedged request effectiveness per model (the model that produced the result).
+
+    :return: [{"model", "calls", "hedged", "hedge_won", "hedge_rate", "win_rate",
+               "mean_latency_ms", "saved_ms"}], busiest model first
+    """
+    report = []
+    for row in hedge_stats(since):
+        report.append({
+            "model": row["_id"], "calls": row["calls"], "hedged": row["hedged"], "hedge_won": row["hedge_won"],
+            "hedge_rate": round(row["hedged"] / row["calls"], 4),
+            "win_rate": round(row["hedge_won"] / row["hedged"], 4) if row["hedged"] else 0.0,
+            "mean_latency_ms": round(row["latency_ms"] / row["calls"], 1),
+            "saved_ms": round(row["saved_ms"]),
+        })
+    report.sort(key=lambda model: -model["calls"])
+    return report
+
+
+def usage_report(group_by, since=None, until=None, limit=None):
+    """
+    LLM spend grouped by "book", "style", "user", "model" or "day".
+
+    :return: [{"key", "calls", "errors", "prompt_tokens", "cached_tokens", "completion_tokens",
+               "cost_usd", "cache_hit_rate", "mean_latency_ms", "mean_first_token_ms"}]
+    :raises ValueError: for an unknown group_by
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    report = []
+    for row in usage_by(group_by, since, until, limit):
+        report.append({
+            "key": row["_id"], "calls": row["calls"], "errors": row["errors"],
+            "prompt_tokens": row["prompt_tokens"], "cached_tokens": row["cached_tokens"],
+            "completion_tokens": row["completion_tokens"], "cost_usd": round(row["cost_usd"], 4),
+            "cache_hit_rate": round(row["cached_tokens"] / row["prompt_tokens"], 4) if row["prompt_tokens"] else 0.0,
+            "mean_latency_ms": None if row["latency_ms"] is None else round(row["latency_ms"], 1),
+            "mean_first_token_ms": None if row["first_token_ms"] is None else round(row["first_token_ms"], 1),
+        })
+    return report
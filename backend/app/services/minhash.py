@@ -0,0 +1,109 @@
+import hashlib
+import re
+import zlib
+from itertools import islice
+
+import numpy as np
+
+# 128 permutations split into 16 LSH bands of 8 rows: two books become
+# candidates when any band matches, which happens with probability above 50%
+# once their Jaccard similarity passes ~0.7.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+
+# Permutations are multiply-shift hashes h(x) = ((a*x + b) mod 2**64) >> 32
+# over 32-bit shingle hashes: uint64 arithmetic wraps for free, so there is
+# no modulo in the inner loop.
+_rng = np.random.RandomState(1)
+_A = (_rng.randint(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1))[:, None]
+_B = _rng.randint(0, 2**63, size=NUM_PERM, dtype=np.uint64)[:, None]
+_SHIFT = np.uint64(32)
+_MAX = np.iinfo(np.uint32).max
+
+_WORD_RE = re.compile(r"\w+")
+_CHUNK = 4096
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_LOW32 = np.uint64(0xFFFFFFFF)
+
+
+def _combine(word_hashes, width):
+    """Hash every run of `width` consecutive word hashes into one 32-bit value."""
+    count = len(word_hashes) - width + 1
+    shingles = word_hashes[:count].copy()
+    for offset in range(1, width):
+        shingles *= _MIX
+        shingles += word_hashes[offset:offset + count]
+    return (shingles ^ (shingles >> _SHIFT)) & _LOW32
+
+
+def _shingle_hashes(text):
+    """
+    Yield uint64 arrays of word 5-gram hashes, _CHUNK words at a time. Words
+    are hashed once each; the last SHINGLE_WORDS - 1 carry over so shingles
+    spanning two chunks are not lost.
+    """
+    matches = _WORD_RE.finditer(text)
+    carry = np.zeros(0, dtype=np.uint64)
+    while True:
+        words = [match.group().lower().encode() for match in islice(matches, _CHUNK)]
+        if not words:
+            break
+        hashes = np.concatenate((carry, np.fromiter(map(zlib.crc32, words), dtype=np.uint64, count=len(words))))
+        if len(hashes) >= SHINGLE_WORDS:
+            yield _combine(hashes, SHINGLE_WORDS)
+        carry = hashes[-(SHINGLE_WORDS - 1):]
+
+
+def signature(text):
+    """
+    MinHash signature of a text as NUM_PERM uint32 values. Shingle hashes are
+    folded into the running minimum a chunk at a time, so memory stays
+    constant however long the book is.
+
+    Texts shorter than one shingle have no signature (None): they would all
+    share the same one and match each other.
+    """
+    minimum = np.full(NUM_PERM, _MAX, dtype=np.uint64)
+    empty = True
+    for shingles in _shingle_hashes(text):
+        np.minimum(minimum, ((_A * shingles + _B) >> _SHIFT).min(axis=1), out=minimum)
+        empty = False
+    return None if empty else minimum.astype(np.uint32)
+
+
+def to_bytes(sig):
+    """Compact storage form: NUM_PERM * 4 = 512 bytes."""
+    return sig.astype("<u4").tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype="<u4")
+
+
+def band_hashes(sig):
+    """One integer per LSH band, salted with the band number so bands never collide with each other."""
+    bands = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].astype("<u4").tobytes(),
+                                 digest_size=7, salt=band.to_bytes(2, "little"))
+        bands.append(int.from_bytes(digest.digest(), "little"))
+    return bands
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def fingerprint(text):
+    """
+    The fields stored on a book document: {"minhash": bytes, "lsh_bands": [int]},
+    or {"minhash": None, "lsh_bands": []} for a text without shingles, which
+    never matches anything.
+    """
+    sig = signature(text)
+    if sig is None:
+        return {"minhash": None, "lsh_bands": []}
+    return {"minhash": to_bytes(sig), "lsh_bands": band_hashes(sig)}
@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Longest profile a request may ask for, and the sampling interval bounds
+MAX_SECONDS = 60
+DEFAULT_INTERVAL = 0.01
+MIN_INTERVAL = 0.001
+# Traceback depth recorded by the allocation profile
+ALLOCATION_FRAMES = 32
+
+# One profile at a time per process
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running in this process."""
+
+
+def _frame_label(code):
+    filename = code.co_filename if code.co_filename.startswith("<") else os.path.relpath(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(thread_name, frame, labels):
+    # labels caches the label of each code object for the length of a profile
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        label = labels.get(code)
+        if label is None:
+            label = labels[code] = _frame_label(code)
+        stack.append(label)
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL):
+    """
+    Statistical CPU profile of every other thread of this process: the stack
+    of each thread is read every `interval` seconds for `seconds` seconds.
+    Threads waiting in blocking calls are sampled too, so the profile shows
+    where wall-clock time goes (lock waits and I/O included).
+
+    :return: Counter {"thread;outer (file:line);...;inner (file:line)": samples}
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        stacks, labels = Counter(), {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stacks[_collapse(names.get(ident, f"thread-{ident}"), frame, labels)] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _profile_lock.release()
+
+
+def allocation_profile(seconds):
+    """
+    Memory still allocated at the end of a `seconds`-long window that was
+    allocated during it, by allocation traceback (tracemalloc). Tracing slows
+    allocations down, so it only runs for the window unless it was already on.
+
+    :return: Counter {"outer (file:line);...;allocation site (file:line)": bytes}
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    started_here = not tracemalloc.is_tracing()
+    try:
+        if started_here:
+            tracemalloc.start(ALLOCATION_FRAMES)
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        sizes = Counter()
+        for stat in after.compare_to(before, "traceback"):
+            if stat.size_diff > 0:
+                # Tracebacks run from the oldest frame to the allocation site, as collapsed stacks do
+                labels = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+                sizes[";".join(labels)] += stat.size_diff
+        return sizes
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+
+def collapsed_output(stacks):
+    """Stacks in the collapsed format read by flamegraph.pl and speedscope, heaviest first."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
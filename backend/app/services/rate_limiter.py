@@ -0,0 +1,177 @@
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, g, jsonify, request
+
+from config.settings import API_RATE_LIMIT, RATE_LIMIT_STORAGE
+from mappers import rate_limit_mapper
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RATE_RE = re.compile(r"^(\d+)\s*(?:per|/)\s*(\d*)\s*(second|minute|hour|day)s?$")
+
+# Idle keys are purged from the in-process store once it doubles in size
+MIN_PURGE_SIZE = 1024
+
+
+class Rate(namedtuple("Rate", ["count", "period"])):
+    """`count` requests per `period` seconds, with bursts of up to `count`."""
+
+    @property
+    def interval(self):
+        return self.period / self.count
+
+    def __str__(self):
+        return f"{self.count} per {self.period} seconds"
+
+
+def parse_rate_limits(value):
+    """
+    Parse limits in the API_RATE_LIMIT format: "100 per hour", "10/minute",
+    "1000 per 2 days", several separated by ";" or ",".
+
+    :raises ValueError: for an unparseable limit
+    """
+    rates = []
+    for part in re.split(r"[;,]", value or ""):
+        part = part.strip().lower()
+        if not part:
+            continue
+        match = _RATE_RE.match(part)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid rate limit: {part!r}")
+        count, multiple, unit = match.groups()
+        rates.append(Rate(int(count), int(multiple or 1) * _PERIODS[unit]))
+    return rates
+
+
+class MemoryRateLimitStore:
+    """
+    GCRA state in this process: one float per (client, limit). Also the local
+    stand-in for the shared store in development and tests.
+    """
+
+    def __init__(self):
+        self._tats = {}
+        self._purge_size = MIN_PURGE_SIZE
+        self._lock = threading.Lock()
+
+    def hit(self, key, interval, period, now):
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            if tat + interval - now > period:
+                return False, tat
+            self._tats[key] = tat + interval
+            if len(self._tats) >= self._purge_size:
+                self._tats = {key: tat for key, tat in self._tats.items() if tat > now}
+                self._purge_size = max(MIN_PURGE_SIZE, 2 * len(self._tats))
+            return True, tat + interval
+
+    def peek(self, key, interval, period, now):
+        """What hit() would return, without counting the request."""
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+        if tat + interval - now > period:
+            return False, tat
+        return True, tat + interval
+
+
+class MongoRateLimitStore:
+    """GCRA state shared by every worker process (see mappers.rate_limit_mapper)."""
+
+    def hit(self, key, interval, period, now):
+        return rate_limit_mapper.hit(key, interval, period, now)
+
+    def peek(self, key, interval, period, now):
+        return rate_limit_mapper.peek(key, interval, period, now)
+
+
+STORES = {"memory": MemoryRateLimitStore, "mongo": MongoRateLimitStore}
+
+
+def client_ip():
+    return f"ip:{request.remote_addr or 'unknown'}"
+
+
+def rate_limit(limits, key=client_ip):
+    """
+    Route-specific limits, checked in addition to API_RATE_LIMIT. Place it
+    below @route. `key` picks the client a request is counted against.
+    """
+    rates = parse_rate_limits(limits)
+
+    def decorate(view):
+        view.rate_limits = (rates, key)
+        return view
+    return decorate
+
+
+class RateLimiter:
+    """
+    Enforces API_RATE_LIMIT per client IP on every route, plus the limits of
+    routes marked with @rate_limit. Each limit is a GCRA, so a check is one
+    store update and the state is one timestamp per client and limit.
+    """
+
+    def __init__(self, default_limits=API_RATE_LIMIT, store=None):
+        self.default_limits = parse_rate_limits(default_limits)
+        self.store = store or STORES[RATE_LIMIT_STORAGE]()
+
+    def check(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if view is None or request.method == "OPTIONS":
+            return None
+        checks = [(client_ip(), rate) for rate in self.default_limits]
+        route_limits = getattr(view, "rate_limits", None)
+        if route_limits:
+            rates, key = route_limits
+            client = key()
+            checks += [(f"{request.endpoint}:{client}", rate) for rate in rates]
+
+        now = time.time()
+        # Every limit is checked before any is charged, so a request refused by
+        # one limit does not use up the others
+        for client, rate in checks:
+            allowed, tat = self.store.peek(f"{client}|{rate.count}/{rate.period}", rate.interval, rate.period, now)
+            if not allowed:
+                return self._refuse(rate, tat, now)
+
+        tightest = None
+        for client, rate in checks:
+            allowed, tat = self.store.hit(f"{client}|{rate.count}/{rate.period}", rate.interval, rate.period, now)
+            if not allowed:
+                # A concurrent request took the last of this limit since the check
+                return self._refuse(rate, tat, now)
+            remaining = max(0, int((rate.period - (tat - now)) / rate.interval + 1e-9))
+            if tightest is None or remaining < tightest[1]:
+                tightest = (rate, remaining, tat - now)
+        g.rate_limit = tightest
+        return None
+
+    @staticmethod
+    def _refuse(rate, tat, now):
+        g.rate_limit = (rate, 0, tat - now)
+        response = jsonify({"message": "Rate limit exceeded", "limit": str(rate)})
+        response.headers["Retry-After"] = str(max(1, math.ceil(tat + rate.interval - rate.period - now)))
+        return response, 429
+
+    @staticmethod
+    def add_headers(response):
+        state = g.pop("rate_limit", None)
+        if state:
+            rate, remaining, reset = state
+            response.headers["RateLimit-Limit"] = str(rate.count)
+            response.headers["RateLimit-Remaining"] = str(remaining)
+            response.headers["RateLimit-Reset"] = str(max(0, math.ceil(reset)))
+            response.headers["RateLimit-Policy"] = f"{rate.count};w={rate.period}"
+        return response
+
+
+def init_rate_limiter(app, default_limits=API_RATE_LIMIT, store=None):
+    limiter = RateLimiter(default_limits, store)
+    app.extensions["rate_limiter"] = limiter
+    app.before_request(limiter.check)
+    app.after_request(limiter.add_headers)
+    return limiter
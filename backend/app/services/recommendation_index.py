@@ -0,0 +1,136 @@
+import zlib
+
+import numpy as np
+
+from models.book_schema import normalize_tags
+from services.search_index import tokenize
+
+# Books are embedded as hashed TF-IDF vectors: every feature (a word, or a
+# prefixed "author:"/"tag:" feature) is hashed into one of DIMENSIONS buckets.
+# 256 float32 dimensions keep 100k books at about 100MB.
+DIMENSIONS = 256
+
+# Metadata features outweigh any single word of the text.
+AUTHOR_WEIGHT = 4.0
+TAG_WEIGHT = 3.0
+TITLE_WEIGHT = 2.0
+
+
+class RecommendationIndex:
+    """
+    Row-normalized book feature matrix; recommendations are a single
+    matrix-vector product against a user's preference vector.
+    """
+
+    def __init__(self, dimensions=DIMENSIONS):
+        self.dimensions = dimensions
+        self.matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self.idf = np.ones(dimensions, dtype=np.float32)
+        self.serials = np.zeros(0, dtype=np.int64)
+        self.titles = []
+        self.authors = []
+        self.row_by_serial = {}
+        self.row_by_title = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self.serials)
+
+    def _bucket(self, feature):
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            # crc32 rather than hash(), which is salted per process.
+            bucket = self._buckets[feature] = zlib.crc32(feature.encode()) % self.dimensions
+        return bucket
+
+    def _counts(self, features):
+        buckets = np.fromiter(map(self._bucket, features), dtype=np.intp)
+        return np.bincount(buckets, minlength=self.dimensions).astype(np.float32)
+
+    def _raw_vector(self, title="", author="", tags=(), text=""):
+        # Sub-linear term frequency for the text, then weighted metadata features.
+        row = np.log1p(self._counts(tokenize(text)))
+        row += TITLE_WEIGHT * self._counts(tokenize(title))
+        if author:
+            row += AUTHOR_WEIGHT * self._counts(["author:" + " ".join(author.lower().split())])
+            row += AUTHOR_WEIGHT / 2 * self._counts(tokenize(author))
+        row += TAG_WEIGHT * self._counts(["tag:" + tag for tag in tags])
+        return row
+
+    @classmethod
+    def build(cls, books, dimensions=DIMENSIONS):
+        """
+        Build from an iterable of book documents (title, author, tags/tag_list,
+        text). The text may be a prefix of the book; it only needs to be
+        representative.
+        """
+        index = cls(dimensions)
+        rows, serials = [], []
+        for book in books:
+            tags = book.get("tag_list") or normalize_tags(book.get("tags"))
+            rows.append(index._raw_vector(book.get("title") or "", book.get("author") or "",
+                                          tags, book.get("text") or ""))
+            serials.append(book["book_serial"])
+            index.titles.append(book.get("title") or "")
+            index.authors.append(book.get("author") or "")
+
+        if rows:
+            matrix = np.vstack(rows)
+            document_frequency = np.count_nonzero(matrix, axis=0)
+            index.idf = np.log((1 + len(rows)) / (1 + document_frequency)).astype(np.float32) + 1
+            matrix *= index.idf
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            matrix /= norms
+            index.matrix = matrix
+
+        index.serials = np.asarray(serials, dtype=np.int64)
+        index.row_by_serial = {serial: row for row, serial in enumerate(serials)}
+        index.row_by_title = {" ".join(title.lower().split()): row for row, title in enumerate(index.titles)}
+        # The feature -> bucket cache holds the whole vocabulary; only the build needs it.
+        index._buckets = {}
+        return index
+
+    def find_title(self, title):
+        """Row of the book with this title (case and spacing insensitive), or None."""
+        return self.row_by_title.get(" ".join((title or "").lower().split()))
+
+    def user_vector(self, fav_book=None, fav_author=None, preferred_genre=None, history_serials=()):
+        """
+        Embed a user's stated preferences, plus books they have interacted
+        with, into the same space as the books.
+        """
+        vector = self._raw_vector(author=fav_author or "",
+                                  tags=[preferred_genre.lower()] if preferred_genre else ())
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+
+        liked_rows = [self.row_by_serial[serial] for serial in history_serials if serial in self.row_by_serial]
+        favorite_row = self.find_title(fav_book)
+        if favorite_row is not None:
+            liked_rows.append(favorite_row)
+        if liked_rows:
+            vector += self.matrix[liked_rows].mean(axis=0)
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def top_k(self, vector, k=10, exclude_serials=()):
+        """Return up to k (score, row) pairs, best first, skipping excluded books."""
+        if not len(self) or not vector.any():
+            return []
+        scores = self.matrix @ vector
+        excluded = [self.row_by_serial[serial] for serial in exclude_serials if serial in self.row_by_serial]
+        if excluded:
+            scores[excluded] = -np.inf
+        k = min(k, len(scores) - len(excluded))
+        if k <= 0:
+            return []
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return [(float(scores[row]), int(row)) for row in rows]
+
+    def describe(self, row):
+        return {"book_serial": int(self.serials[row]), "title": self.titles[row], "author": self.authors[row]}
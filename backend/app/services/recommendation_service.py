@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+
+from config.settings import RECOMMENDATION_REBUILD_SECONDS
+from mappers.mongo_db_mapper import BookMapper
+from services.recommendation_index import RecommendationIndex
+
+logger = logging.getLogger(__name__)
+
+# Only the opening of each book is embedded; it is enough to characterise
+# style and vocabulary, and keeps the rebuild proportional to the catalog size.
+TEXT_SAMPLE_CHARS = 20000
+
+book_mapper = BookMapper()
+
+_lock = threading.Lock()
+# Held by the one request that builds the first index; the others wait for it
+_initial_build_lock = threading.Lock()
+_index = None
+_built_at = 0.0
+_rebuilding = False
+
+
+def build_index():
+    return RecommendationIndex.build(book_mapper.iter_book_samples(TEXT_SAMPLE_CHARS))
+
+
+def _rebuild_in_background():
+    global _index, _built_at, _rebuilding
+    try:
+        index = build_index()
+        with _lock:
+            _index, _built_at = index, time.monotonic()
+    except Exception:
+        logger.exception("Recommendation index rebuild failed")
+    finally:
+        with _lock:
+            _rebuilding = False
+
+
+def get_index():
+    """
+    Return the current index. The first call builds it synchronously (once,
+    however many requests arrive meanwhile); after that a stale index keeps
+    serving while a replacement is built in a thread.
+    """
+    global _index, _built_at, _rebuilding
+    with _lock:
+        index, stale = _index, time.monotonic() - _built_at >= RECOMMENDATION_REBUILD_SECONDS
+        if index is not None and stale and not _rebuilding:
+            _rebuilding = True
+            threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    if index is None:
+        with _initial_build_lock:
+            with _lock:
+                index = _index
+            if index is None:
+                index = build_index()
+                with _lock:
+                    _index, _built_at = index, time.monotonic()
+    return index
+
+
+def recommend_books(user, limit=10, history_serials=()):
+    """
+    Recommend books for a User from their favourite book, favourite author,
+    preferred genre and any books they have interacted with.
+
+    :return: [{"book_serial", "title", "author", "score"}], best first
+    """
+    index = get_index()
+    vector = index.user_vector(user.fav_book, user.fav_author, user.preferred_genre, history_serials)
+
+    exclude = list(history_serials)
+    favorite_row = index.find_title(user.fav_book)
+    if favorite_row is not None:
+        exclude.append(int(index.serials[favorite_row]))
+
+    results = []
+    for score, row in index.top_k(vector, limit, exclude):
+        result = index.describe(row)
+        result["score"] = round(score, 4)
+        results.append(result)
+    return results
@@ -0,0 +1,195 @@
+import heapq
+import math
+import pickle
+import re
+from array import array
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i in is it its me my
+not of on or our she so that the their them then there they this to was we were what
+when which who will with you your
+""".split())
+
+# A hit in the title or author counts as much as several hits in the text.
+FIELD_WEIGHTS = (("title", 5), ("author", 5), ("tags", 3), ("text", 1))
+
+
+def tokenize(text):
+    """Lower-case word tokens without stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index over books, ranked with BM25.
+
+    Postings are stored per term in a flat array('I') of interleaved
+    (doc, weighted term frequency) pairs, which costs 8 bytes per posting.
+    Documents are append-only: re-indexing a book appends it under a new doc
+    number and marks the old one dead, and compact() drops dead postings once
+    they pile up.
+
+    An index that serves searches is never modified: updates go to a copy()
+    that then replaces it (see services.search_service).
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = {}
+        self.serials = []
+        self.titles = []
+        self.authors = []
+        self.doc_lengths = array('I')
+        self.live = bytearray()
+        self.doc_by_serial = {}
+        self.live_count = 0
+        self.live_length = 0
+        # change_seq of the last change applied (see mappers.book_change_mapper)
+        self.last_change_seq = 0
+        # Terms whose postings array belongs to this index alone (see copy)
+        self._owned_terms = set()
+
+    def __len__(self):
+        return self.live_count
+
+    def copy(self):
+        """
+        A copy to update while this index keeps serving searches. Postings
+        arrays are shared until the copy adds to them, so copying costs a few
+        pointers per document rather than one per posting.
+        """
+        index = SearchIndex.__new__(SearchIndex)
+        index.__dict__.update(self.__dict__)
+        index.postings = dict(self.postings)
+        index.serials = list(self.serials)
+        index.titles = list(self.titles)
+        index.authors = list(self.authors)
+        index.doc_lengths = array('I', self.doc_lengths)
+        index.live = bytearray(self.live)
+        index.doc_by_serial = dict(self.doc_by_serial)
+        index._owned_terms = set()
+        return index
+
+    def add(self, book):
+        """Index a book document, replacing any previous version with the same serial."""
+        self.remove(book["book_serial"])
+
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            value = book.get(field)
+            if not isinstance(value, str):
+                continue
+            if weight == 1:
+                frequencies.update(tokenize(value))
+            else:
+                for token in tokenize(value):
+                    frequencies[token] += weight
+
+        doc = len(self.serials)
+        postings_by_term, owned = self.postings, self._owned_terms
+        for term, frequency in frequencies.items():
+            postings = postings_by_term.get(term)
+            if term not in owned:
+                # New, or still shared with the index this one was copied from
+                postings = postings_by_term[term] = array('I', postings or ())
+                owned.add(term)
+            postings.extend((doc, frequency))
+
+        length = sum(frequencies.values())
+        self.serials.append(book["book_serial"])
+        self.titles.append(book.get("title", ""))
+        self.authors.append(book.get("author", ""))
+        self.doc_lengths.append(length)
+        self.live.append(1)
+        self.doc_by_serial[book["book_serial"]] = doc
+        self.live_count += 1
+        self.live_length += length
+
+    def remove(self, book_serial):
+        doc = self.doc_by_serial.pop(book_serial, None)
+        if doc is None:
+            return False
+        self.live[doc] = 0
+        self.live_count -= 1
+        self.live_length -= self.doc_lengths[doc]
+        return True
+
+    def dead_ratio(self):
+        return 1 - self.live_count / len(self.serials) if self.serials else 0.0
+
+    def search(self, query, limit=10):
+        """Return up to `limit` (score, doc) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.live_count:
+            return []
+
+        k1, b = self.K1, self.B
+        average_length = self.live_length / self.live_count
+        lengths, live = self.doc_lengths, self.live
+        scores = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            # Dead docs still count towards df until the next compaction.
+            df = len(postings) // 2
+            idf = math.log(1 + (self.live_count - df + 0.5) / (df + 0.5))
+            for i in range(0, len(postings), 2):
+                doc = postings[i]
+                if not live[doc]:
+                    continue
+                tf = postings[i + 1]
+                norm = k1 * (1 - b + b * lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, ((score, doc) for doc, score in scores.items()))
+
+    def describe(self, doc):
+        return {"book_serial": self.serials[doc], "title": self.titles[doc], "author": self.authors[doc]}
+
+    def compact(self):
+        """Renumber live docs densely and drop postings of dead ones."""
+        renumber = {}
+        serials, titles, authors, lengths = [], [], [], array('I')
+        for doc, alive in enumerate(self.live):
+            if alive:
+                renumber[doc] = len(serials)
+                serials.append(self.serials[doc])
+                titles.append(self.titles[doc])
+                authors.append(self.authors[doc])
+                lengths.append(self.doc_lengths[doc])
+
+        postings = {}
+        for term, old in self.postings.items():
+            new = array('I')
+            for i in range(0, len(old), 2):
+                doc = renumber.get(old[i])
+                if doc is not None:
+                    new.append(doc)
+                    new.append(old[i + 1])
+            if new:
+                postings[term] = new
+
+        self.postings = postings
+        self._owned_terms = set(postings)
+        self.serials, self.titles, self.authors, self.doc_lengths = serials, titles, authors, lengths
+        self.live = bytearray(b"\x01" * len(serials))
+        self.doc_by_serial = {serial: doc for doc, serial in enumerate(serials)}
+
+    def save(self, path):
+        state = {key: value for key, value in self.__dict__.items() if key != "_owned_terms"}
+        with open(path, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, "rb") as file:
+            index.__dict__.update(pickle.load(file))
+        index._owned_terms = set(index.postings)
+        return index
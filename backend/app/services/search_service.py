@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+from config.settings import SEARCH_INDEX_PATH, SEARCH_REFRESH_SECONDS
+from mappers.book_change_mapper import get_changes_since, get_stable_change_seq
+from mappers.mongo_db_mapper import BookMapper
+from services.search_index import SearchIndex, FIELD_WEIGHTS
+
+INDEXED_FIELDS = {"book_serial": 1, **{field: 1 for field, _ in FIELD_WEIGHTS}}
+CHANGES_PAGE_SIZE = 500
+# Compact once this share of indexed docs are superseded or deleted versions.
+COMPACT_DEAD_RATIO = 0.3
+
+book_mapper = BookMapper()
+
+# Held while building or refreshing; the index itself is replaced, never modified
+_refresh_lock = threading.Lock()
+_index = None
+_last_refresh = 0.0
+
+
+def build_index(batch_size=100):
+    """Build a fresh index by streaming every book from MongoDB."""
+    index = SearchIndex()
+    # Changes made while scanning (or still landing) are replayed by the next refresh.
+    index.last_change_seq = get_stable_change_seq()
+    for book in book_mapper.iter_books(INDEXED_FIELDS, batch_size):
+        index.add(book)
+    return index
+
+
+def refresh_index(index):
+    """
+    Apply every book change since the index was last updated, using the
+    change feed, so each worker process catches up with writes made anywhere.
+
+    The changes go into a copy, so `index` can keep serving searches
+    meanwhile. Returns the updated copy, or `index` itself if nothing changed.
+    """
+    refreshed = index
+    while True:
+        changes = get_changes_since(refreshed.last_change_seq, CHANGES_PAGE_SIZE)
+        if not changes:
+            break
+        updated = set()
+        for change in changes:
+            if change.get("deleted"):
+                updated.discard(change["book_serial"])
+            else:
+                updated.add(change["book_serial"])
+        books = book_mapper.get_books_by_serials(updated, INDEXED_FIELDS) if updated else []
+
+        if refreshed is index:
+            refreshed = index.copy()
+        for change in changes:
+            if change.get("deleted"):
+                refreshed.remove(change["book_serial"])
+        for book in books:
+            refreshed.add(book)
+        refreshed.last_change_seq = changes[-1]["change_seq"]
+        if len(changes) < CHANGES_PAGE_SIZE:
+            break
+
+    if refreshed is not index and refreshed.dead_ratio() > COMPACT_DEAD_RATIO:
+        refreshed.compact()
+    return refreshed
+
+
+def _get_index():
+    """
+    The current index, loaded (or built) on first use and kept fresh.
+
+    Only one thread builds or refreshes at a time, without blocking searches:
+    a refresh builds a new index and swaps it in, and searches read whichever
+    index _index pointed to when they started. Only the first searches wait,
+    for the one initial build.
+    """
+    global _index, _last_refresh
+    if _index is None:
+        with _refresh_lock:
+            if _index is None:
+                index = SearchIndex.load(SEARCH_INDEX_PATH) if os.path.exists(SEARCH_INDEX_PATH) else build_index()
+                _index, _last_refresh = refresh_index(index), time.monotonic()
+        return _index
+
+    if time.monotonic() - _last_refresh >= SEARCH_REFRESH_SECONDS and _refresh_lock.acquire(blocking=False):
+        # Other requests keep searching the current index meanwhile
+        try:
+            if time.monotonic() - _last_refresh >= SEARCH_REFRESH_SECONDS:
+                _index, _last_refresh = refresh_index(_index), time.monotonic()
+        finally:
+            _refresh_lock.release()
+    return _index
+
+
+def search_books(query, limit=10):
+    """
+    Rank books against a free-text query with BM25.
+
+    :return: [{"book_serial", "title", "author", "score"}], best match first
+    """
+    index = _get_index()
+    results = []
+    for score, doc in index.search(query, limit):
+        result = index.describe(doc)
+        result["score"] = round(score, 4)
+        results.append(result)
+    return results
+
+
+def save_index(path=SEARCH_INDEX_PATH):
+    """Build the index from scratch and write it to `path`. Returns the number of books indexed."""
+    index = build_index()
+    index.save(path)
+    return len(index)
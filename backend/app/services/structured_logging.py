@@ -0,0 +1,181 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+from config.settings import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_REQUEST_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Id of the request being handled on this thread (None outside requests)
+_request_id = ContextVar("request_id", default=None)
+
+# Incoming X-Request-ID values are reused only if they look like an id
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Attributes of every LogRecord; any other attribute was passed with extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id",
+                                                                   "sample_rate"}
+
+# The handler installed by configure_logging (once per process) and its writer thread
+_handler = None
+_listener = None
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, request_id, the
+    fields passed with extra= and the formatted exception, if any.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "sample_rate", None) is not None:
+            # Each line kept stands for 1 / sample_rate events
+            entry["sample_rate"] = record.sample_rate
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tags records with the current request id, and keeps a record logged with
+    extra={"sample_rate": rate} with that probability only.
+    """
+
+    def filter(self, record):
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None and rate < 1 and random.random() >= rate:
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread through a bounded queue. The calling
+    thread only merges the message arguments; formatting (tracebacks
+    included) and writing happen on the writer thread. When the queue is
+    full the record is dropped and counted instead of waiting.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the arguments now, as they may change once the caller moves on
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=LOG_LEVEL, queue_size=LOG_QUEUE_SIZE, stream=None):
+    """
+    Send every log record to a background thread that writes JSON lines to
+    `stream` (stderr by default). Safe to call more than once.
+
+    :return: the handler installed on the root logger
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+    log_queue = queue.Queue(queue_size)
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter())
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+    _handler = handler
+    return handler
+
+
+def _stop_listener():
+    # Writes out the records still queued
+    try:
+        _listener.stop()
+    except queue.Full:
+        pass
+
+
+def _start():
+    header = request.headers.get("X-Request-ID", "")
+    request_id = header if _REQUEST_ID_RE.match(header) else uuid.uuid4().hex
+    g.request_id_token = _request_id.set(request_id)
+    g.request_log_started = time.perf_counter()
+
+
+def _finish(response):
+    request_id = _request_id.get()
+    if request_id:
+        response.headers["X-Request-ID"] = request_id
+    started = g.pop("request_log_started", None)
+    rate = 1.0 if response.status_code >= 500 else LOG_REQUEST_SAMPLE_RATE
+    if started is not None and rate > 0:
+        logger.info("request", extra={
+            "sample_rate": rate,
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    return response
+
+
+def _teardown(exc):
+    token = g.pop("request_id_token", None)
+    if token:
+        _request_id.reset(token)
+
+
+def init_logging(app):
+    """
+    Configure logging (see configure_logging) and give every request an id,
+    taken from its X-Request-ID header if it has a usable one, that tags its
+    log records and is returned in the X-Request-ID response header.
+    """
+    configure_logging()
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
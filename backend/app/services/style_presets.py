@@ -0,0 +1,116 @@
+import re
+
+# Rewrite styles offered to clients (GET /styles). A preset id is the canonical
+# form of a style: overlays, jobs and cached rewrites are keyed by it, so the
+# same request always produces a reusable result.
+#   instruction  the style-specific request, sent after the passage
+#   expansion    expected output/input length ratio, used to size max_tokens
+DEFAULT_MODEL = "gpt-4o"
+
+STYLE_PRESETS = [
+    {"id": "romantic", "name": "Romantic", "aliases": ["romance", "love story"],
+     "description": "Warm, emotional and focused on the relationships.",
+     "instruction": "in a romantic style, drawing out feelings and relationships.",
+     "model": DEFAULT_MODEL, "temperature": 0.8, "expansion": 1.15},
+    {"id": "explorative", "name": "Explorative", "aliases": ["adventure", "adventurous", "exploration"],
+     "description": "Curious and vivid, lingering on places and discoveries.",
+     "instruction": "in an explorative style, with vivid descriptions of places and discoveries.",
+     "model": DEFAULT_MODEL, "temperature": 0.8, "expansion": 1.2},
+    {"id": "mystery", "name": "Mystery", "aliases": ["mysterious", "detective", "noir", "suspense"],
+     "description": "Suspenseful, with clues and unanswered questions.",
+     "instruction": "as a mystery, building suspense and leaving subtle clues.",
+     "model": DEFAULT_MODEL, "temperature": 0.8, "expansion": 1.1},
+    {"id": "fantasy", "name": "Fantasy", "aliases": ["fantastical", "magical", "magic"],
+     "description": "Touched by magic and wonder.",
+     "instruction": "in a fantasy style, adding a touch of magic and wonder.",
+     "model": DEFAULT_MODEL, "temperature": 0.9, "expansion": 1.15},
+    {"id": "humorous", "name": "Humorous", "aliases": ["funny", "comedy", "comedic", "humor", "humour"],
+     "description": "Light-hearted, with wit and comic timing.",
+     "instruction": "in a humorous style, with light-hearted wit.",
+     "model": DEFAULT_MODEL, "temperature": 0.9, "expansion": 1.05},
+    {"id": "dramatic", "name": "Dramatic", "aliases": ["drama", "intense"],
+     "description": "Heightened stakes and emotion.",
+     "instruction": "in a dramatic style, heightening the stakes and emotions.",
+     "model": DEFAULT_MODEL, "temperature": 0.8, "expansion": 1.1},
+    {"id": "horror", "name": "Horror", "aliases": ["scary", "gothic", "creepy", "dark"],
+     "description": "Dark and unsettling.",
+     "instruction": "in a horror style, dark and unsettling.",
+     "model": DEFAULT_MODEL, "temperature": 0.8, "expansion": 1.1},
+    {"id": "simplified", "name": "Simplified", "aliases": ["simple", "easy", "kids", "children", "young readers"],
+     "description": "Plain language for younger or language-learning readers.",
+     "instruction": "in simple, plain language suitable for young readers.",
+     "model": DEFAULT_MODEL, "temperature": 0.4, "expansion": 0.85},
+]
+
+PRESETS_BY_ID = {preset["id"]: preset for preset in STYLE_PRESETS}
+
+# Free-text options that match no preset are still accepted as custom styles.
+CUSTOM_PREFIX = "custom:"
+CUSTOM_TEMPERATURE = 0.7
+CUSTOM_EXPANSION = 1.1
+
+# Words that do not change which style is meant: "a more Fantasy-style version" -> "fantasy"
+_FILLER_WORDS = frozenset("""
+a an the in it of with like make more very much please rewrite version way style styled tone
+mode voice genre
+""".split())
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize(option):
+    return " ".join(word for word in _NON_WORD_RE.sub(" ", option.lower()).split() if word not in _FILLER_WORDS)
+
+
+_PRESETS_BY_NAME = {}
+for _preset in STYLE_PRESETS:
+    for _name in [_preset["id"], _preset["name"], *_preset["aliases"]]:
+        _PRESETS_BY_NAME[_normalize(_name)] = _preset
+
+
+def resolve_style(option):
+    """
+    Map an editingOption (a preset id, a preset name or alias, or free text)
+    to its preset. Free text that matches no preset becomes a custom preset
+    with id "custom:<normalized text>". Resolving a preset id returns the
+    same preset, so ids can be passed around safely.
+
+    :return: the preset dict, or None if the option names no style at all
+    """
+    if not isinstance(option, str):
+        return None
+    if option in PRESETS_BY_ID:
+        return PRESETS_BY_ID[option]
+    if option.startswith(CUSTOM_PREFIX):
+        option = option[len(CUSTOM_PREFIX):]
+
+    normalized = _normalize(option)
+    if not normalized:
+        return None
+    preset = _PRESETS_BY_NAME.get(normalized)
+    if preset:
+        return preset
+    return {
+        "id": CUSTOM_PREFIX + normalized, "name": normalized, "aliases": [], "description": None,
+        "instruction": f"in a {normalized} style.", "model": DEFAULT_MODEL,
+        "temperature": CUSTOM_TEMPERATURE, "expansion": CUSTOM_EXPANSION,
+    }
+
+
+# Most output tokens requested for one passage; longer passages are split to fit (see max_passage_chars)
+MAX_OUTPUT_TOKENS = 4096
+
+
+def max_output_tokens(preset, text, ceiling=MAX_OUTPUT_TOKENS):
+    """Output budget for rewriting `text`: about 4 characters per token, scaled by the preset's expansion."""
+    return max(256, min(ceiling, int(len(text) / 4 * preset["expansion"] * 1.25)))
+
+
+def max_passage_chars(preset, ceiling=MAX_OUTPUT_TOKENS):
+    """Longest text whose rewrite max_output_tokens expects to fit in `ceiling` tokens."""
+    return int(ceiling * 4 / (preset["expansion"] * 1.25))
+
+
+def list_styles():
+    """Public description of every preset (the instruction stays server-side)."""
+    return [{key: preset[key] for key in ("id", "name", "description", "aliases", "model", "temperature", "expansion")}
+            for preset in STYLE_PRESETS]
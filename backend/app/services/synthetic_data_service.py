@@ -0,0 +1,254 @@
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import accumulate
+
+from sqlalchemy.exc import IntegrityError
+
+from mappers.user_mapper import UserMapper
+from services.book_ingest_service import book_mapper, ingest_books
+from services.minhash import fingerprint
+from services.windowed_pool import windowed_map
+from services.user_service import UserService
+
+# Synthetic books and users for scale tests. Every book and user is derived
+# from (seed, ordinal) alone, so a seed always produces the same data however
+# the work is split between processes, batches and runs.
+
+VOCABULARY_SIZE = 20000
+SYLLABLES = ("ka", "lo", "mi", "ra", "then", "dor", "el", "ves", "an", "tor", "shi", "wen", "mar", "is", "ul",
+             "bri", "ston", "fa", "gal", "ren", "or", "ith", "mo", "dra", "sel", "un", "ver", "ash", "ly", "cor")
+# The commonest English words head the vocabulary, as they head real text
+COMMON_WORDS = ("the and of to a in he was it his that she her had with for you as on at but him they not be "
+                "by from said all were one there have so when what this an which would into if no could out up "
+                "them my then been more about now did some over me down only time like little before we").split()
+FIRST_NAMES = ("Ada", "Alan", "Amara", "Ben", "Chen", "Clara", "Dev", "Elena", "Femi", "Grace", "Hugo", "Ines",
+               "Jonas", "Kai", "Lena", "Malik", "Mei", "Nora", "Omar", "Priya", "Quinn", "Rosa", "Sami", "Tess",
+               "Umar", "Vera", "Wen", "Yusuf", "Zoe")
+LAST_NAMES = ("Abbott", "Baker", "Castillo", "Dubois", "Eze", "Fischer", "Garcia", "Haddad", "Ito", "Jensen",
+              "Kowalski", "Larsen", "Moreau", "Nakamura", "Okafor", "Patel", "Quist", "Rossi", "Silva", "Tanaka",
+              "Umeh", "Varga", "Walsh", "Xu", "Yilmaz", "Zhang")
+# (tag, weight): a few genres dominate the catalog, as in real ones
+TAGS = (("Fiction", 30), ("Fantasy", 12), ("Mystery", 10), ("Romance", 10), ("Science Fiction", 8),
+        ("Adventure", 8), ("History", 6), ("Horror", 4), ("Biography", 4), ("Poetry", 3), ("Philosophy", 2),
+        ("Children", 3))
+RATINGS = (("G", 20), ("PG", 35), ("PG-13", 30), ("R", 15))
+GENDERS = (("Female", 46), ("Male", 46), ("Other", 4), ("Prefer not to say", 4))
+GENRES = (("fiction", 70), ("nonfiction", 30))
+
+# Book sizes follow a log-normal distribution of word counts
+DEFAULT_MEDIAN_WORDS = 60000
+DEFAULT_SIZE_SPREAD = 0.8
+DEFAULT_MIN_WORDS = 1000
+DEFAULT_MAX_WORDS = 1000000
+WORDS_PER_CHAPTER = (2000, 6000)
+MAX_CHAPTERS = 150
+
+DEFAULT_USER_BATCH_SIZE = 5000
+DEFAULT_PASSWORDS = 100
+
+_vocabularies = {}
+
+
+def _vocabulary(seed):
+    """Words and Zipf cumulative weights for a seed, built once per process."""
+    if seed not in _vocabularies:
+        rng = random.Random(f"{seed}:vocabulary")
+        words, seen = list(COMMON_WORDS), set(COMMON_WORDS)
+        while len(words) < VOCABULARY_SIZE:
+            word = "".join(rng.choices(SYLLABLES, k=rng.choice((1, 2, 2, 3, 3, 4))))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        _vocabularies[seed] = words, list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return _vocabularies[seed]
+
+
+def _weighted(rng, choices):
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def _phrase(rng, words, cum_weights, count):
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=count)).title()
+
+
+def synthetic_password(seed, user_index, passwords=DEFAULT_PASSWORDS):
+    """The password of synthetic user `user_index` (users share `passwords` distinct passwords)."""
+    return f"synthetic-{seed}-{user_index % passwords}"
+
+
+def book_word_count(rng, median_words, size_spread, min_words, max_words):
+    words = int(rng.lognormvariate(math.log(median_words), size_spread))
+    return max(min_words, min(max_words, words))
+
+
+def generate_book(seed, ordinal, median_words=DEFAULT_MEDIAN_WORDS, size_spread=DEFAULT_SIZE_SPREAD,
+                  min_words=DEFAULT_MIN_WORDS, max_words=DEFAULT_MAX_WORDS):
+    """
+    Synthetic book number `ordinal` of a seed, as a bulk ingestion record
+    without book_serial: chapters with headings, paragraphs of Zipf-distributed
+    words, tags, rating, word count and fingerprint.
+    """
+    rng = random.Random(f"{seed}:book:{ordinal}")
+    words, cum_weights = _vocabulary(seed)
+    target = book_word_count(rng, median_words, size_spread, min_words, max_words)
+    chapters = max(1, min(MAX_CHAPTERS, round(target / rng.randint(*WORDS_PER_CHAPTER))))
+
+    parts, offsets, length, word_count = [], [], 0, 0
+    for chapter in range(1, chapters + 1):
+        heading = f"Chapter {chapter}: {_phrase(rng, words, cum_weights, rng.randint(1, 4))}"
+        offsets.append(length)
+        parts.append(heading)
+        length += len(heading) + 2
+        # One draw per chapter, cut into sentences and paragraphs
+        chapter_words = rng.choices(words, cum_weights=cum_weights, k=target // chapters)
+        word_count += len(heading.split()) + len(chapter_words)
+        position = 0
+        while position < len(chapter_words):
+            sentences = []
+            for _ in range(rng.randint(2, 8)):
+                sentence = " ".join(chapter_words[position:position + rng.randint(5, 30)])
+                if not sentence:
+                    break
+                position += sentence.count(" ") + 1
+                sentences.append(sentence[0].upper() + sentence[1:] + rng.choice(".....?!"))
+            paragraph = " ".join(sentences)
+            parts.append(paragraph)
+            length += len(paragraph) + 2
+    text = "\n\n".join(parts)
+
+    tags, wanted = [], rng.randint(1, 3)
+    while len(tags) < wanted:
+        tag = _weighted(rng, TAGS)
+        if tag not in tags:
+            tags.append(tag)
+    return {
+        "title": _phrase(rng, words, cum_weights, rng.randint(1, 5)),
+        "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "publication_date": f"{rng.randint(1800, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "tags": ", ".join(tags),
+        "rating": _weighted(rng, RATINGS),
+        "total_chapters": chapters,
+        "total_word_count": word_count,
+        "chapter_offsets": offsets,
+        "text": text,
+        # Ingested with compute_fields=False, so the generating process fingerprints it
+        **fingerprint(text),
+    }
+
+
+def _generate_books(seed, count, workers, size):
+    """Yield (ordinal, book) in order, generating in a process pool with at most 2 * workers books in flight."""
+    if workers <= 1:
+        for ordinal in range(count):
+            yield ordinal, generate_book(seed, ordinal, **size)
+        return
+    for ordinal, future in windowed_map(partial(generate_book, seed, **size), range(count), workers):
+        yield ordinal, future.result()
+
+
+def load_synthetic_books(count, seed=42, start_serial=None, workers=None, batch_size=None, on_progress=None,
+                         **size):
+    """
+    Generate `count` books in parallel worker processes and insert them through
+    the bulk ingestion path, numbered from start_serial (default: after the
+    current maximum). `size` takes generate_book's size options.
+
+    :return: the ingest_books summary
+    """
+    workers = workers or os.cpu_count() or 1
+    first_serial = start_serial if start_serial is not None else book_mapper.get_max_book_serial() + 1
+
+    def records():
+        for ordinal, book in _generate_books(seed, count, workers, size):
+            book["book_serial"] = first_serial + ordinal
+            if on_progress:
+                on_progress(ordinal + 1, count)
+            yield first_serial + ordinal, book
+
+    options = {"batch_size": batch_size} if batch_size else {}
+    return ingest_books(records(), compute_fields=False, **options)
+
+
+def generate_user(seed, index):
+    """Column values of synthetic user number `index` (without password_hash); usernames embed the index."""
+    rng = random.Random(f"{seed}:user:{index}")
+    words, cum_weights = _vocabulary(seed)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    username = f"{first.lower()}.{last.lower()}{index}"
+    return {
+        "username": username,
+        "email": f"{username}@example.com",
+        "age": min(90, max(13, int(rng.gauss(34, 12)))),
+        "gender": _weighted(rng, GENDERS),
+        "fav_book": _phrase(rng, words, cum_weights, rng.randint(1, 4)),
+        "fav_author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "preferred_genre": _weighted(rng, GENRES),
+    }
+
+
+def _insert_users(session_factory, rows):
+    db = session_factory()
+    try:
+        UserMapper.bulk_insert_users(db, rows)
+        db.commit()
+        return len(rows)
+    except IntegrityError:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_synthetic_users(session_factory, count, seed=42, start_index=0, passwords=DEFAULT_PASSWORDS,
+                         batch_size=DEFAULT_USER_BATCH_SIZE, workers=None, writers=4, on_progress=None,
+                         on_error=None):
+    """
+    Generate users start_index .. start_index + count - 1 and insert them in
+    batches, `writers` transactions at a time (one session each).
+
+    Users share `passwords` distinct passwords (see synthetic_password), so
+    only that many hashes are computed, across `workers` processes; every
+    hash is a real one that login verifies. A batch that violates a unique
+    constraint (the users exist already) is reported to
+    on_error(first_index, message) and skipped.
+
+    :return: {"inserted": int, "failed": int}
+    """
+    passwords = max(1, passwords)
+    plain = [synthetic_password(seed, index, passwords) for index in range(passwords)]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and passwords > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, passwords)) as pool:
+            hashes = list(pool.map(UserService.hash_password, plain))
+    else:
+        hashes = [UserService.hash_password(password) for password in plain]
+
+    summary = {"inserted": 0, "failed": 0}
+
+    def finish(first_index, size, future):
+        try:
+            summary["inserted"] += future.result()
+        except IntegrityError as e:
+            summary["failed"] += size
+            if on_error:
+                on_error(first_index, str(e.orig))
+        if on_progress:
+            on_progress(summary["inserted"] + summary["failed"], count)
+
+    def batches():
+        for first_index in range(start_index, start_index + count, batch_size):
+            rows = []
+            for index in range(first_index, min(first_index + batch_size, start_index + count)):
+                row = generate_user(seed, index)
+                row["password_hash"] = hashes[index % passwords]
+                rows.append(row)
+            yield first_index, rows
+
+    # Windowed so memory stays flat for millions of users
+    for (first_index, rows), future in windowed_map(lambda batch: _insert_users(session_factory, batch[1]),
+                                                    batches(), writers, executor=ThreadPoolExecutor):
+        finish(first_index, len(rows), future)
+    return summary
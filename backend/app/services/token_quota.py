@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from config.settings import (CLIENT_DAILY_TOKEN_QUOTA, CLIENT_MONTHLY_TOKEN_QUOTA, QUOTA_FLUSH_SECONDS,
+                             USER_DAILY_TOKEN_QUOTA, USER_MONTHLY_TOKEN_QUOTA)
+from mappers import token_quota_mapper
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """
+    The user (or client, "ip:<address>") has no tokens left in a quota window;
+    reset_at is when it refills.
+    """
+
+    def __init__(self, user_id, period, limit, used, reset_at):
+        super().__init__(f"{period} token quota of {limit} exhausted")
+        self.user_id = user_id
+        self.period = period
+        self.limit = limit
+        self.used = used
+        self.reset_at = reset_at
+
+
+class QuotaTooSmall(Exception):
+    """One request needs more tokens than a quota window allows in total, so waiting will not help."""
+
+    def __init__(self, user_id, period, limit, estimate):
+        super().__init__(f"{estimate} tokens exceed the {period} token quota of {limit}")
+        self.user_id = user_id
+        self.period = period
+        self.limit = limit
+        self.estimate = estimate
+
+
+def current_windows(now=None):
+    """{period: (window id, reset time)} for the UTC day and month containing now."""
+    now = now or datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    next_month = (now.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return {"day": (now.strftime("%Y-%m-%d"), tomorrow), "month": (now.strftime("%Y-%m"), next_month)}
+
+
+class Reservation:
+    """
+    Tokens set aside for one rewrite before calling the model. Record what the
+    calls actually used with consume(), then settle() to refund the unused
+    part of the estimate (or charge the overrun). Tokens consumed after
+    settle(), by a call the rewrite stopped waiting for, are charged directly.
+    """
+
+    def __init__(self, quotas, keys, estimate):
+        self.quotas = quotas
+        self.keys = keys
+        self.estimate = estimate
+        self.consumed = 0
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def consume(self, tokens):
+        with self._lock:
+            self.consumed += tokens
+            settled = self._settled
+        if settled:
+            self.quotas._add(self.keys, tokens)
+
+    def settle(self):
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+        self.quotas._add(self.keys, self.consumed - self.estimate)
+
+
+class TokenQuotas:
+    """
+    Per-user daily and monthly token quotas, enforced from in-process counters,
+    and the same per client (see reserve) with client_limits.
+
+    Each (user, window) counter is the total the store had at the last sync
+    plus this process's usage since. A background thread writes the local
+    usage of every counter in one bulk write every flush_seconds and reads
+    back the totals, which include the other workers' usage. Checking a quota
+    is therefore a dictionary lookup; the store is read only the first time a
+    process sees a user in a window. Workers can overshoot a quota by at most
+    what they admit between two flushes.
+    """
+
+    def __init__(self, limits=None, flush_seconds=QUOTA_FLUSH_SECONDS, store=token_quota_mapper,
+                 client_limits=None):
+        self.limits = limits if limits is not None else {"day": USER_DAILY_TOKEN_QUOTA,
+                                                         "month": USER_MONTHLY_TOKEN_QUOTA}
+        self.client_limits = client_limits if client_limits is not None else {"day": CLIENT_DAILY_TOKEN_QUOTA,
+                                                                              "month": CLIENT_MONTHLY_TOKEN_QUOTA}
+        self.flush_seconds = flush_seconds
+        self.store = store
+        # (user_id, period, window) -> [total at last sync, local usage not yet flushed]
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _keys(self, user_id, now=None, limits=None):
+        windows = current_windows(now)
+        limits = self.limits if limits is None else limits
+        return {period: ((user_id, period, windows[period][0]), windows[period][1])
+                for period, limit in limits.items() if limit}
+
+    def _load(self, keys):
+        missing = [key for key in keys if key not in self._counters]
+        if missing:
+            try:
+                loaded = self.store.get_usage(missing)
+            except Exception:
+                # Enforce from local usage until the next flush resyncs the totals
+                logger.exception("Database Error")
+                loaded = dict.fromkeys(missing, 0)
+            with self._lock:
+                for key in missing:
+                    self._counters.setdefault(key, [loaded[key], 0])
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="token-quota", daemon=True)
+                    self._thread.start()
+
+    def _add(self, keys, tokens):
+        with self._lock:
+            for key in keys:
+                self._counters.setdefault(key, [0, 0])[1] += tokens
+
+    def reserve(self, user_id, estimate, now=None, client=None):
+        """
+        Set aside `estimate` tokens in every window of the user's quota and, if
+        given, of the client's ("ip:<address>", see services.rate_limiter.client_ip).
+
+        :raises QuotaTooSmall: if the estimate is larger than a window's whole limit
+        :raises QuotaExceeded: if any window lacks the room
+        """
+        owners = [(user_id, self.limits)] + ([(client, self.client_limits)] if client else [])
+        quotas = [(owner, limits, self._keys(owner, now, limits)) for owner, limits in owners]
+        for owner, limits, keys in quotas:
+            for period in keys:
+                if estimate > limits[period]:
+                    raise QuotaTooSmall(owner, period, limits[period], estimate)
+        reserved = [key for _, _, keys in quotas for key, _ in keys.values()]
+        self._load(reserved)
+        with self._lock:
+            for owner, limits, keys in quotas:
+                for period, (key, reset_at) in keys.items():
+                    used = sum(self._counters[key])
+                    if used + estimate > limits[period]:
+                        raise QuotaExceeded(owner, period, limits[period], used, reset_at)
+            for key in reserved:
+                self._counters[key][1] += estimate
+        return Reservation(self, reserved, estimate)
+
+    def usage(self, user_id, now=None):
+        """{period: {"limit", "used", "remaining", "resets_at"}} for each quota window of a user."""
+        keys = self._keys(user_id, now)
+        self._load([key for key, _ in keys.values()])
+        report = {}
+        with self._lock:
+            for period, (key, reset_at) in keys.items():
+                used = sum(self._counters[key])
+                report[period] = {"limit": self.limits[period], "used": used,
+                                  "remaining": max(0, self.limits[period] - used),
+                                  "resets_at": reset_at.isoformat()}
+        return report
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Database Error")
+
+    def flush(self):
+        """Write the local usage to the store and resync every counter with its total."""
+        with self._lock:
+            deltas = {key: counter[1] for key, counter in self._counters.items() if counter[1]}
+            for key in deltas:
+                self._counters[key][0] += deltas[key]
+                self._counters[key][1] = 0
+        try:
+            if deltas:
+                self.store.add_usage(deltas)
+        except Exception:
+            # Keep the usage for the next flush
+            self._add_back(deltas)
+            raise
+
+        current = {window for window, _ in current_windows().values()}
+        with self._lock:
+            # Counters of past windows are no longer needed once flushed
+            for key in [key for key, counter in self._counters.items()
+                        if key[2] not in current and not counter[1]]:
+                del self._counters[key]
+            keys = list(self._counters)
+        totals = self.store.get_usage(keys)
+        with self._lock:
+            for key, total in totals.items():
+                if key in self._counters:
+                    self._counters[key][0] = total
+
+    def _add_back(self, deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                counter = self._counters.setdefault(key, [0, 0])
+                counter[0] -= delta
+                counter[1] += delta
+
+
+# Shared by every request in this process
+token_quotas = TokenQuotas()
@@ -0,0 +1,176 @@
+import bisect
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config.instrumentation import current_trace
+from config.settings import TRACE_SAMPLE_RATE
+
+# Layers timed inside a sampled request, in Server-Timing order
+LAYERS = ("mongo", "mysql", "hash", "llm", "json")
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000)
+
+
+class Trace:
+    """Time spent per layer by one request."""
+
+    __slots__ = ("durations", "counts")
+
+    def __init__(self):
+        self.durations = dict.fromkeys(LAYERS, 0.0)
+        self.counts = dict.fromkeys(LAYERS, 0)
+
+    def add(self, layer, duration_ms):
+        self.durations[layer] += duration_ms
+        self.counts[layer] += 1
+
+
+@contextmanager
+def span(layer):
+    """Time the block as `layer` if the current request is sampled (otherwise one lookup)."""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(layer, (time.perf_counter() - started) * 1000)
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value_ms):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None past the last bound)."""
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else None
+        return None
+
+    def summary(self):
+        return {
+            "count": self.count, "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5), "p95_ms": self.quantile(0.95), "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in BUCKETS_MS] + ["inf"], self.buckets)),
+        }
+
+
+class LatencyStats:
+    """Histograms of request latency per route (every request) and per layer (sampled requests)."""
+
+    def __init__(self):
+        self.routes = {}
+        self.layers = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, total_ms, trace=None):
+        with self._lock:
+            self.routes.setdefault(route, Histogram()).observe(total_ms)
+            if trace:
+                for layer, duration in trace.durations.items():
+                    if trace.counts[layer]:
+                        self.layers.setdefault((route, layer), Histogram()).observe(duration)
+
+    def metrics(self):
+        with self._lock:
+            layers = {}
+            for (route, layer), histogram in sorted(self.layers.items()):
+                layers.setdefault(route, {})[layer] = histogram.summary()
+            return {
+                "sample_rate": TRACE_SAMPLE_RATE,
+                "routes": {route: histogram.summary() for route, histogram in sorted(self.routes.items())},
+                "layers": layers,
+            }
+
+
+latency_stats = LatencyStats()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_trace.get() is not None:
+        conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace.get()
+    started = conn.info.get("trace_started")
+    if trace is not None and started:
+        trace.add("mysql", (time.perf_counter() - started.pop()) * 1000)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Counts JSON encoding of responses towards the "json" layer."""
+
+    def dumps(self, obj, **kwargs):
+        with span("json"):
+            return super().dumps(obj, **kwargs)
+
+
+def _start():
+    g.trace_started = time.perf_counter()
+    if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+        g.trace_token = current_trace.set(Trace())
+
+
+def _finish(response):
+    started = g.pop("trace_started", None)
+    if started is None:
+        return response
+    total_ms = (time.perf_counter() - started) * 1000
+    token = g.pop("trace_token", None)
+    trace = current_trace.get() if token else None
+    if token:
+        current_trace.reset(token)
+    route = f"{request.method} {request.url_rule.rule}" if request.url_rule else "unmatched"
+    latency_stats.record(route, total_ms, trace)
+
+    if trace:
+        timings = [f'{layer};dur={trace.durations[layer]:.1f};desc="{trace.counts[layer]} calls"'
+                   for layer in LAYERS if trace.counts[layer]]
+        app_ms = max(0.0, total_ms - sum(trace.durations.values()))
+        timings += [f"app;dur={app_ms:.1f}", f"total;dur={total_ms:.1f}"]
+        response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+
+def _teardown(exc):
+    # A request that failed before after_request still leaves its trace
+    token = g.pop("trace_token", None)
+    if token:
+        current_trace.reset(token)
+
+
+def init_tracing(app):
+    """
+    Time every request per route, and for a TRACE_SAMPLE_RATE share of them
+    also per layer, reported in a Server-Timing header. Register it before
+    other before_request hooks so their time is included.
+    """
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
@@ -0,0 +1,232 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from mappers.user_mapper import UserMapper
+from services.user_service import UserService
+
+# Same field names as POST /auth/register.
+REQUIRED_FIELDS = [
+    'username', 'email', 'password', 'age',
+    'gender', 'favoriteBook', 'favoriteAuthor', 'preferredGenre'
+]
+GENDERS = {'Male', 'Female', 'Other', 'Prefer not to say'}
+GENRES = {'fiction', 'nonfiction'}
+# Lengths of the VARCHAR columns the fields are stored in; MySQL in strict
+# mode rejects a longer value
+MAX_LENGTHS = {'username': 255, 'email': 255, 'favoriteBook': 255, 'favoriteAuthor': 255}
+# Exports leave out passwords and their hashes, so they cannot be imported back.
+EXPORT_FIELDS = [
+    'userId', 'username', 'email', 'age', 'gender',
+    'favoriteBook', 'favoriteAuthor', 'preferredGenre', 'createdAt'
+]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def read_rows(file, fmt):
+    """
+    Stream (line_number, row) pairs from a CSV or NDJSON file object.
+    Rows that cannot be parsed are yielded as (line_number, ValueError).
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e.msg}")
+                continue
+            if not isinstance(row, dict):
+                yield line_number, ValueError("Each line must be a JSON object")
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def validate_row(row):
+    """
+    Convert an import row into the column values of a User.
+    Raises ValueError describing the first problem found.
+    """
+    for field in REQUIRED_FIELDS:
+        if row.get(field) in (None, ''):
+            raise ValueError(f"Missing field: {field}")
+    try:
+        age = int(row['age'])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid age")
+    if age < 0:
+        raise ValueError("Invalid age")
+    if row['gender'] not in GENDERS:
+        raise ValueError(f"Invalid gender: {row['gender']}")
+    if row['preferredGenre'] not in GENRES:
+        raise ValueError(f"Invalid preferredGenre: {row['preferredGenre']}")
+    for field, limit in MAX_LENGTHS.items():
+        if len(str(row[field]).strip()) > limit:
+            raise ValueError(f"{field} is longer than {limit} characters")
+    return {
+        "username": str(row['username']).strip(),
+        "email": str(row['email']).strip(),
+        "password": str(row['password']),
+        "age": age,
+        "gender": row['gender'],
+        "fav_book": row['favoriteBook'],
+        "fav_author": row['favoriteAuthor'],
+        "preferred_genre": row['preferredGenre'],
+    }
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert_batch(db: Session, batch, on_error):
+    """
+    Insert a validated batch in one transaction. If the database rejects a
+    row (a duplicate, or a value it cannot store), fall back to one
+    transaction per row so only the offending rows fail.
+    """
+    try:
+        UserMapper.bulk_insert_users(db, [values for _, values in batch])
+        db.commit()
+        return len(batch)
+    except (IntegrityError, DataError):
+        db.rollback()
+
+    inserted = 0
+    for line_number, values in batch:
+        try:
+            UserMapper.bulk_insert_users(db, [values])
+            db.commit()
+            inserted += 1
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            on_error(line_number, str(e.orig))
+    return inserted
+
+
+def import_users(db: Session, rows, batch_size=DEFAULT_BATCH_SIZE, workers=None, on_error=None):
+    """
+    Bulk-create users from an iterable of (line_number, row) pairs.
+
+    Rows are validated and de-duplicated a batch at a time, passwords are hashed
+    across a process pool, and each batch is written with a single executemany
+    inside its own transaction. Bad rows are reported through
+    on_error(line_number, message) and never abort the run.
+
+    :param workers: hashing processes; None uses every core, 1 hashes inline
+    :return: {"inserted": int, "failed": int}
+    """
+    summary = {"inserted": 0, "failed": 0}
+
+    def report(line_number, message):
+        summary["failed"] += 1
+        if on_error:
+            on_error(line_number, message)
+
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for raw_batch in _batches(rows, batch_size):
+            batch = []
+            usernames, emails = set(), set()
+            for line_number, row in raw_batch:
+                if isinstance(row, Exception):
+                    report(line_number, str(row))
+                    continue
+                try:
+                    values = validate_row(row)
+                except ValueError as e:
+                    report(line_number, str(e))
+                    continue
+                if values["username"] in usernames or values["email"] in emails:
+                    report(line_number, "Duplicate username or email in import file")
+                    continue
+                usernames.add(values["username"])
+                emails.add(values["email"])
+                batch.append((line_number, values))
+
+            if not batch:
+                continue
+
+            taken_usernames, taken_emails = UserMapper.get_taken_usernames_and_emails(db, usernames, emails)
+            if taken_usernames or taken_emails:
+                fresh = []
+                for line_number, values in batch:
+                    if values["username"] in taken_usernames or values["email"] in taken_emails:
+                        report(line_number, "Username or email already exists")
+                    else:
+                        fresh.append((line_number, values))
+                batch = fresh
+                if not batch:
+                    continue
+
+            passwords = [values.pop("password") for _, values in batch]
+            if pool:
+                hashes = pool.map(UserService.hash_password, passwords,
+                                  chunksize=max(1, len(passwords) // (4 * workers)))
+            else:
+                hashes = map(UserService.hash_password, passwords)
+            for (_, values), password_hash in zip(batch, hashes):
+                values["password_hash"] = password_hash
+
+            summary["inserted"] += _insert_batch(db, batch, report)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return summary
+
+
+def export_users(db: Session, file, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream every user (without password hashes) to a CSV or NDJSON file object.
+    Rows are read through a server-side cursor, so memory stays flat. The
+    output has no password column and is not valid input for import_users.
+
+    :return: number of users written
+    """
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    count = 0
+    for row in UserMapper.iter_users(db, batch_size):
+        record = {
+            "userId": row.user_id,
+            "username": row.username,
+            "email": row.email,
+            "age": row.age,
+            "gender": row.gender,
+            "favoriteBook": row.fav_book,
+            "favoriteAuthor": row.fav_author,
+            "preferredGenre": row.preferred_genre,
+            "createdAt": row.created_at.isoformat() if row.created_at else None,
+        }
+        if writer:
+            writer.writerow(record)
+        else:
+            file.write(json.dumps(record) + "\n")
+        count += 1
+    return count
@@ -1,9 +1,18 @@
+import logging
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm import Session
 from models.user_model import User
 from mappers.user_mapper import UserMapper
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
 
 class UserService:
+    @staticmethod
+    def hash_password(password: str) -> str:
+        with span("hash"):
+            return generate_password_hash(password, method="pbkdf2:sha256")
+
     @staticmethod
     def create_user(db: Session, username, email, password, age, gender, fav_book, fav_author, preferred_genre):
         """
@@ -22,7 +31,7 @@ class UserService:
         """
         # Hash the password
         # hashed_password = generate_password_hash(password)
-        hashed_password = generate_password_hash(password, method="pbkdf2:sha256")
+        hashed_password = UserService.hash_password(password)
         # hashed_password = password
         # Create User object
         new_user = User(
@@ -49,8 +58,11 @@ class UserService:
         :return: User object if authentication is successful, else None
         """
         user = UserMapper.get_user_by_username_or_email(db, username, username)
-        if user and check_password_hash(user.password_hash, password):
-            return user
+        if not user:
+            return None
+        with span("hash"):
+            if check_password_hash(user.password_hash, password):
+                return user
         return None
 
     @staticmethod
@@ -79,14 +91,11 @@ class UserService:
         if 'preferredGenre' in data:
             user.preferred_genre = data['preferredGenre']  # Map from camelCase to snake_case
         
-        # Add debug logging
-        print(f"Updating user {user_id} with data: {data}")
-        
         # Make sure we commit the changes to the database
         db.commit()
-        
-        # Verify the update worked
-        print(f"User updated successfully: {user.username}, fav_book: {user.fav_book}")
+
+        # Field names only: the values are personal data
+        logger.info("User profile updated", extra={"user_id": user_id, "fields": sorted(data)})
         
         return user
 
@@ -0,0 +1,22 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def windowed_map(function, items, workers, window=None, executor=ProcessPoolExecutor):
+    """
+    Run function(item) for every item in a pool of `workers` (processes unless
+    another executor class is given) and yield (item, future) pairs in input order.
+
+    At most `window` (default 2 * workers) calls are submitted ahead of the
+    consumer, so memory stays bounded by a handful of results however many
+    items there are. The caller takes each result (or its error) from the future.
+    """
+    window = window or 2 * workers
+    with executor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append((item, pool.submit(function, item)))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
@@ -0,0 +1,415 @@
+"""
+End-to-end load test: boots create_app() in a server process against local
+stand-ins (mongomock or a local mongod, SQLite or a local MySQL, and the fake
+OpenAI server of test/fake_llm_server.py) and drives it over HTTP with a mix
+of catalog, book, login, profile and edit requests at each concurrency level.
+
+    python benchmarks/load_benchmark.py --concurrency 1,8,32 --duration 20 \\
+        --mix catalog=30,book=30,login=10,profile=15,profile_update=5,edit=10 \\
+        --compare benchmarks/results/load-baseline.json
+
+Reports p50/p95/p99 latency and throughput per request type and the RSS of
+the server and driver processes, and saves them as JSON (--output) so runs
+can be compared with --compare.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCHMARKS_DIR, "../app")))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCHMARKS_DIR, "../test")))
+
+DEFAULT_MIX = "catalog=30,book=30,login=10,profile=15,profile_update=5,edit=10"
+READY_PREFIX = "BENCHMARK_READY "
+WORDS = ("the of and to in was he she it that his her with for as had you not on at but by from they "
+         "castle river night storm letter window garden stranger promise shadow ship lantern road "
+         "mountain secret morning silence village forest door voice fire winter").split()
+
+# Settings for the server process: limits that would throttle the load generator are lifted
+SERVER_ENV = {
+    "API_RATE_LIMIT": "1000000 per second",
+    "LOGIN_RATE_LIMIT": "1000000 per second",
+    "REWRITE_RATE_LIMIT": "1000000 per second",
+    "USER_DAILY_TOKEN_QUOTA": "0",
+    "USER_MONTHLY_TOKEN_QUOTA": "0",
+    "OPENAI_API_KEY": "benchmark",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+# ---------------------------------------------------------------------------
+# Server process
+# ---------------------------------------------------------------------------
+
+def install_stand_ins(mongo_uri, database_url):
+    """Point the app's hardcoded Atlas and MySQL connections at local databases (before importing it)."""
+    import pymongo.mongo_client
+    import sqlalchemy
+
+    if mongo_uri:
+        real_client = pymongo.mongo_client.MongoClient
+        pymongo.mongo_client.MongoClient = lambda uri, **kwargs: real_client(mongo_uri, **kwargs)
+    else:
+        import mongomock
+
+        class LocalMongoClient(mongomock.MongoClient):
+            def __init__(self, uri=None, **kwargs):
+                # pymongo-only options such as event_listeners are not supported
+                super().__init__()
+
+        pymongo.mongo_client.MongoClient = LocalMongoClient
+
+    create_engine = sqlalchemy.create_engine
+
+    def local_engine(url, *args, **kwargs):
+        if not str(url).startswith("mysql"):
+            return create_engine(url, *args, **kwargs)
+        if database_url.startswith("sqlite"):
+            return create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 30})
+        return create_engine(database_url, pool_size=32, max_overflow=32)
+
+    sqlalchemy.create_engine = local_engine
+
+
+def seed(args):
+    """
+    Load the synthetic corpus and users of args.seed (see `flask generate-books`
+    and `generate-users`); every user gets the same password.
+
+    :return: the book serials, [(user_id, username, password)] and the catalog tags
+    """
+    from config.mysql_db import SessionLocal
+    from models.user_model import User
+    from services.synthetic_data_service import TAGS, load_synthetic_books, load_synthetic_users, synthetic_password
+
+    summary = load_synthetic_books(args.books, seed=args.seed, start_serial=1, median_words=args.median_words,
+                                   max_words=args.max_words)
+    if summary["errors"] or summary["duplicates"]:
+        raise RuntimeError(f"Seeding books failed: {summary}")
+    load_synthetic_users(SessionLocal, args.users, seed=args.seed, passwords=1, writers=1)
+    db = SessionLocal()
+    try:
+        users = [(user_id, username, synthetic_password(args.seed, 0, 1))
+                 for user_id, username in db.query(User.user_id, User.username).order_by(User.user_id)]
+    finally:
+        db.close()
+    return list(range(1, args.books + 1)), users, [tag.lower() for tag, _ in TAGS]
+
+
+def serve(args):
+    install_stand_ins(args.mongo_uri, args.database_url)
+    from werkzeug.serving import make_server
+
+    from main import app
+
+    # One access log line per request would measure the terminal, not the app
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from services.style_presets import list_styles
+
+    serials, users, tags = seed(args)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    print(READY_PREFIX + json.dumps({"port": server.server_port, "books": serials, "users": users, "tags": tags,
+                                     "styles": [style["id"] for style in list_styles()]}), flush=True)
+    server.serve_forever()
+
+
+# ---------------------------------------------------------------------------
+# Load driver
+# ---------------------------------------------------------------------------
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown request type {name!r} (one of: {', '.join(OPERATIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def catalog(rng, world):
+    if rng.random() < 0.5:
+        return "GET", "/books", None
+    return "GET", f"/books?tag={rng.choice(world['tags']).replace(' ', '+')}", None
+
+
+def book(rng, world):
+    return "GET", f"/books/{rng.choice(world['books'])}", None
+
+
+def login(rng, world):
+    _, username, password = rng.choice(world["users"])
+    return "POST", "/auth/login", {"username": username, "password": password}
+
+
+def profile(rng, world):
+    user_id = rng.choice(world["users"])[0]
+    return "GET", f"/users/{user_id}/profile", None
+
+
+def profile_update(rng, world):
+    user_id = rng.choice(world["users"])[0]
+    return "PUT", f"/users/{user_id}/profile", {"favoriteBook": " ".join(rng.choices(WORDS, k=3)),
+                                                "age": rng.randint(18, 80)}
+
+
+def edit(rng, world):
+    user_id = rng.choice(world["users"])[0]
+    return "PUT", f"/books/{rng.choice(world['books'])}", {
+        "editingOption": rng.choice(world["styles"]), "userId": str(user_id),
+        "chapters": [0],
+    }
+
+
+OPERATIONS = {"catalog": catalog, "book": book, "login": login, "profile": profile,
+              "profile_update": profile_update, "edit": edit}
+
+
+def worker(port, world, mix, deadline, seed_value, samples):
+    rng = random.Random(seed_value)
+    names, weights = list(mix), list(mix.values())
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = OPERATIONS[name](rng, world)
+        payload = json.dumps(body).encode() if body is not None else None
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, payload, {"Content-Type": "application/json"} if payload else {})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            status = None
+        samples.append((name, (time.perf_counter() - started) * 1000, status))
+    connection.close()
+
+
+def rss_mb(pid="self"):
+    """Resident set size of a process in MB (Linux /proc; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+class RSSSampler(threading.Thread):
+    """Polls the RSS of each process during a run and keeps its start, peak and end."""
+
+    def __init__(self, pids, interval=0.25):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.stats = {name: {"start": rss_mb(pid), "peak": rss_mb(pid), "end": None} for name, pid in pids.items()}
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        for name, pid in self.pids.items():
+            value = rss_mb(pid)
+            stats = self.stats[name]
+            if value is not None:
+                stats["peak"] = max(stats["peak"] or 0, value)
+            stats["end"] = value
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self._sample()
+        return self.stats
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(latency for _, latency, _ in samples)
+    statuses = Counter(str(status) for _, _, status in samples)
+    errors = sum(1 for _, _, status in samples if status is None or status >= 500)
+    summary = {"requests": len(samples), "errors": errors, "throughput_rps": round(len(samples) / seconds, 1),
+               "statuses": dict(sorted(statuses.items()))}
+    if latencies:
+        summary.update({"mean_ms": round(sum(latencies) / len(latencies), 2),
+                        "p50_ms": round(percentile(latencies, 0.5), 2), "p95_ms": round(percentile(latencies, 0.95), 2),
+                        "p99_ms": round(percentile(latencies, 0.99), 2), "max_ms": round(latencies[-1], 2)})
+    return summary
+
+
+def run_level(port, world, mix, concurrency, duration, warmup, seed_value, pids):
+    if warmup:
+        drive(port, world, mix, concurrency, warmup, seed_value - 1)
+    sampler = RSSSampler(pids)
+    sampler.start()
+    started = time.monotonic()
+    samples = drive(port, world, mix, concurrency, duration, seed_value)
+    seconds = time.monotonic() - started
+    by_operation = defaultdict(list)
+    for sample in samples:
+        by_operation[sample[0]].append(sample)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(seconds, 2),
+        "total": summarize(samples, seconds),
+        "operations": {name: summarize(by_operation[name], seconds) for name in mix if by_operation[name]},
+        "rss_mb": sampler.stop(),
+    }
+
+
+def drive(port, world, mix, concurrency, duration, seed_value):
+    samples = []  # list.append is atomic, so the workers share one list
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=worker, args=(port, world, mix, deadline, seed_value * 1000 + index, samples))
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def start_server(args):
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--books", str(args.books),
+               "--users", str(args.users), "--median-words", str(args.median_words),
+               "--max-words", str(args.max_words),
+               "--seed", str(args.seed), "--database-url", args.database_url]
+    if args.mongo_uri:
+        command += ["--mongo-uri", args.mongo_uri]
+    env = {**os.environ, **SERVER_ENV, "OPENAI_BASE_URL": args.llm_base_url,
+           "TRACE_SAMPLE_RATE": str(args.trace_sample_rate)}
+    server = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.abspath(os.path.join(BENCHMARKS_DIR, "../app")))
+    for line in server.stdout:
+        if line.startswith(READY_PREFIX):
+            # Keep draining stdout so the server never blocks on a full pipe
+            threading.Thread(target=server.stdout.read, daemon=True).start()
+            return server, json.loads(line[len(READY_PREFIX):])
+    raise RuntimeError(f"The server process exited with status {server.wait()} before it was ready")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    previous = {}
+    for level in (baseline or {}).get("levels", []):
+        for name, summary in [("total", level["total"])] + list(level["operations"].items()):
+            previous[(level["concurrency"], name)] = summary
+
+    def delta(summary, before, key):
+        if not before or not before.get(key) or summary.get(key) is None:
+            return ""
+        return f" ({(summary[key] - before[key]) / before[key]:+.0%})"
+
+    for level in result["levels"]:
+        rss = ", ".join(f"{name} {stats['start']}->{stats['peak']} MB" for name, stats in level["rss_mb"].items())
+        print(f"\nconcurrency={level['concurrency']}  rss (start->peak): {rss}")
+        print(f"  {'request':<15}{'count':>8}{'errors':>8}{'rps':>16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+        for name, summary in [("total", level["total"])] + list(level["operations"].items()):
+            before = previous.get((level["concurrency"], name))
+            print(f"  {name:<15}{summary['requests']:>8}{summary['errors']:>8}"
+                  f"{str(summary['throughput_rps']) + delta(summary, before, 'throughput_rps'):>16}"
+                  + "".join(f"{str(summary.get(key)) + delta(summary, before, key):>18}"
+                            for key in ("p50_ms", "p95_ms", "p99_ms")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="seconds measured per level")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds run before each level, not measured")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="request type weights")
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--median-words", type=int, default=20000, help="median synthetic book length")
+    parser.add_argument("--max-words", type=int, default=200000, help="longest synthetic book")
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="fake model time to first token (s)")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="fake model time per token (s)")
+    parser.add_argument("--llm-reply-words", type=int, default=200, help="words streamed per fake completion")
+    parser.add_argument("--llm-base-url", help="use this OpenAI-compatible server instead of the fake one")
+    parser.add_argument("--mongo-uri", help="a local mongod to use instead of mongomock")
+    parser.add_argument("--database-url", help="SQLAlchemy URL used instead of MySQL (default: a temporary SQLite file)")
+    parser.add_argument("--trace-sample-rate", type=float, default=0, help="TRACE_SAMPLE_RATE of the server")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/load-<time>.json)")
+    parser.add_argument("--compare", help="a previous results file to show changes against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    started_at = datetime.now(timezone.utc)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        args.database_url = args.database_url or f"sqlite:///{os.path.join(scratch, 'benchmark.db')}"
+        if args.serve:
+            serve(args)
+            return
+
+        llm_server = None
+        if not args.llm_base_url:
+            from fake_llm_server import FakeLLMServer
+            llm_server = FakeLLMServer(first_token_delay=args.llm_first_token, token_delay=args.llm_token_delay,
+                                       reply=" ".join(random.Random(args.seed).choices(WORDS, k=args.llm_reply_words)))
+            args.llm_base_url = llm_server.base_url
+        server, world = start_server(args)
+        try:
+            levels = []
+            for index, concurrency in enumerate(int(level) for level in args.concurrency.split(",")):
+                print(f"concurrency {concurrency}: {args.warmup:g}s warmup, {args.duration:g}s measured", flush=True)
+                levels.append(run_level(world["port"], world, args.mix, concurrency, args.duration, args.warmup,
+                                        args.seed + index + 1, {"server": server.pid, "driver": os.getpid()}))
+        finally:
+            server.terminate()
+            server.wait()
+            if llm_server:
+                llm_server.close()
+
+    result = {
+        "benchmark": "load",
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("serve", "output", "compare")},
+        "levels": levels,
+    }
+    output = args.output or os.path.join(BENCHMARKS_DIR, "results",
+                                         f"load-{started_at:%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(result, baseline)
+    print(f"\nresults: {output}")
+
+
+if __name__ == "__main__":
+    main()
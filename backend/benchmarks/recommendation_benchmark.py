@@ -0,0 +1,52 @@
+"""
+Benchmark for the recommendation index: rebuild time and per-request latency.
+
+    python benchmarks/recommendation_benchmark.py --books 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from search_benchmark import make_vocabulary, make_books, percentile
+from services.recommendation_index import RecommendationIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=300, help="words sampled per book")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    books = list(make_books(args.books, args.words, vocabulary, rng))
+
+    start = time.perf_counter()
+    index = RecommendationIndex.build(books)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(args.requests):
+        favorite = rng.choice(books)
+        start = time.perf_counter()
+        vector = index.user_vector(fav_book=favorite["title"], fav_author=rng.choice(books)["author"],
+                                   preferred_genre="fiction")
+        index.top_k(vector, 10, exclude_serials=[favorite["book_serial"]])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"books={args.books} words/book={args.words} matrix={index.matrix.nbytes / 2**20:.0f}MB")
+    print(f"rebuild: {build_seconds:.2f}s ({args.books / build_seconds:.0f} books/s)")
+    print(f"request ms: p50={statistics.median(latencies):.2f} p95={percentile(latencies, 0.95):.2f} "
+          f"p99={percentile(latencies, 0.99):.2f}")
+
+
+if __name__ == "__main__":
+    main()
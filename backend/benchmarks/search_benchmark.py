@@ -0,0 +1,78 @@
+"""
+Benchmark for the BM25 search index: build time and query latency over a
+synthetic corpus with a Zipf-like vocabulary.
+
+    python benchmarks/search_benchmark.py --books 20000 --words 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.search_index import SearchIndex
+
+
+def make_vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def make_books(count, words_per_book, vocabulary, rng):
+    # Zipf-like weights: a few very common words, a long tail of rare ones.
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for serial in range(1, count + 1):
+        words = rng.choices(vocabulary, weights=weights, k=words_per_book)
+        yield {
+            "book_serial": serial,
+            "title": " ".join(rng.choices(vocabulary, k=3)),
+            "author": " ".join(rng.choices(vocabulary, k=2)),
+            "tags": "Fantasy, Adventure",
+            "text": " ".join(words),
+        }
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--words", type=int, default=2000, help="words per book")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+
+    index = SearchIndex()
+    build_seconds = 0.0
+    # Only index.add is timed; generating the synthetic text is not.
+    for book in make_books(args.books, args.words, vocabulary, rng):
+        start = time.perf_counter()
+        index.add(book)
+        build_seconds += time.perf_counter() - start
+    postings = sum(len(p) // 2 for p in index.postings.values())
+
+    latencies = []
+    for _ in range(args.queries):
+        query = " ".join(rng.choices(vocabulary, k=rng.randint(1, 3)))
+        start = time.perf_counter()
+        index.search(query, 10)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"books={args.books} words/book={args.words} terms={len(index.postings)} postings={postings}")
+    print(f"build: {build_seconds:.2f}s ({args.books / build_seconds:.0f} books/s)")
+    print(f"query ms: p50={statistics.median(latencies):.2f} p95={percentile(latencies, 0.95):.2f} "
+          f"p99={percentile(latencies, 0.99):.2f} max={max(latencies):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,13 +19,38 @@ CREATE TABLE users (
 );
 
 -- Books Table (Book Metadata & Serial Reference)
+-- A copy of the MongoDB book metadata, kept up to date by `flask sync-books`
 CREATE TABLE books (
-    book_serial INT PRIMARY KEY AUTO_INCREMENT,  -- Unique serial number
+    book_serial INT PRIMARY KEY,  -- Unique serial number (assigned in MongoDB)
     title VARCHAR(255) NOT NULL,
     author VARCHAR(255),
     publication_date DATE,
     tags VARCHAR(255),  -- Comma-separated genres
     rating VARCHAR(10), -- Age rating (PG, PG-13, etc.)
     total_chapters INT,
-    total_word_count INT
-);
\ No newline at end of file
+    total_word_count INT,
+    change_seq BIGINT NOT NULL,  -- change_seq of the MongoDB document copied
+    updated_at DATETIME,
+    INDEX ix_books_title (title),
+    INDEX ix_books_author (author),
+    INDEX ix_books_publication_date (publication_date),
+    INDEX ix_books_rating (rating),
+    INDEX ix_books_total_word_count (total_word_count)
+);
+
+-- Book Tags Table (one row per normalized tag of a book, for tag filters)
+CREATE TABLE book_tags (
+    tag VARCHAR(100) NOT NULL,
+    book_serial INT NOT NULL,
+    PRIMARY KEY (tag, book_serial),
+    INDEX ix_book_tags_book_serial (book_serial),
+    FOREIGN KEY (book_serial) REFERENCES books(book_serial) ON DELETE CASCADE
+);
+
+-- Sync Checkpoints Table (how far each relay has applied the MongoDB change feed)
+CREATE TABLE sync_checkpoints (
+    name VARCHAR(64) PRIMARY KEY,
+    position BIGINT NOT NULL DEFAULT 0,  -- Last change_seq applied
+    applied_through DATETIME,  -- MongoDB updated_at of that change
+    last_run_at DATETIME
+);
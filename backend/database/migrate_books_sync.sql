@@ -0,0 +1,44 @@
+-- Upgrade a database created from an earlier BookLoomMySQL.sql for the book
+-- sync relay (`flask sync-books`). New databases get this schema from
+-- BookLoomMySQL.sql; the app only creates missing tables, never alters the
+-- existing books table, so run this once on every older database.
+--
+-- Order: run `flask migrate-books` (stamps every MongoDB book with a
+-- change_seq), then this script, then `flask sync-books --once`.
+
+USE BookLoomMySQL;
+
+-- book_serial is assigned in MongoDB, so it is no longer AUTO_INCREMENT.
+-- Existing rows get change_seq 0, so the relay overwrites each of them with
+-- the MongoDB copy on its first pass.
+ALTER TABLE books
+    MODIFY book_serial INT NOT NULL,
+    ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN updated_at DATETIME,
+    ADD INDEX ix_books_title (title),
+    ADD INDEX ix_books_author (author),
+    ADD INDEX ix_books_publication_date (publication_date),
+    ADD INDEX ix_books_rating (rating),
+    ADD INDEX ix_books_total_word_count (total_word_count);
+
+-- Like BookLoomMySQL.sql, new rows must carry their change_seq
+ALTER TABLE books ALTER COLUMN change_seq DROP DEFAULT;
+
+CREATE TABLE IF NOT EXISTS book_tags (
+    tag VARCHAR(100) NOT NULL,
+    book_serial INT NOT NULL,
+    PRIMARY KEY (tag, book_serial),
+    INDEX ix_book_tags_book_serial (book_serial),
+    FOREIGN KEY (book_serial) REFERENCES books(book_serial) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+    name VARCHAR(64) PRIMARY KEY,
+    position BIGINT NOT NULL DEFAULT 0,  -- Last change_seq applied
+    applied_through DATETIME,  -- MongoDB updated_at of that change
+    last_run_at DATETIME
+);
+
+-- After the first full sync, rows still at change_seq 0 have no book in
+-- MongoDB. Review them, then remove them:
+--   DELETE FROM books WHERE change_seq = 0;
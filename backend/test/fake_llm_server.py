@@ -0,0 +1,114 @@
+"""
+A local stand-in for the OpenAI chat completions API, with injected latency.
+
+    server = FakeLLMServer(first_token_delays={"gpt-4o": [2.0]})
+    client = OpenAI(api_key="test", base_url=server.base_url)
+
+Streams the words of `reply` as server-sent events. The first request for a
+model waits first_token_delays[model][0] seconds before its first token, the
+second request waits [1], and so on (first_token_delay once the list runs
+out). Every token after the first takes token_delay seconds. A request with
+max_tokens gets at most that many words, ending with finish_reason "length".
+
+A client that closes its connection (such as a cancelled hedge attempt) is
+noticed even while its request is still waiting for its first token; its
+model is appended to `disconnected`, and wait_disconnected() blocks until then.
+"""
+import json
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMServer:
+
+    def __init__(self, first_token_delays=None, token_delay=0.001, reply="Rewritten by the fake model.",
+                 first_token_delay=0.0, host="127.0.0.1", port=0):
+        self.first_token_delays = {model: list(delays) for model, delays in (first_token_delays or {}).items()}
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.reply = reply
+        self.requests = []
+        self.disconnected = []
+        self._lock = threading.Lock()
+        self._disconnect = threading.Condition(self._lock)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_disconnected(self, model, timeout=5.0):
+        """Wait until a client requesting `model` has closed its connection; False on timeout."""
+        with self._disconnect:
+            return self._disconnect.wait_for(lambda: model in self.disconnected, timeout)
+
+    def _record_disconnect(self, model):
+        with self._disconnect:
+            self.disconnected.append(model)
+            self._disconnect.notify_all()
+
+    def _next_delay(self, model):
+        with self._lock:
+            self.requests.append(model)
+            delays = self.first_token_delays.get(model)
+            return delays.pop(0) if delays else self.first_token_delay
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                model = body["model"]
+                delay = server._next_delay(model)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                try:
+                    if self._closed_within(delay):
+                        server._record_disconnect(model)
+                        return
+                    words = server.reply.split(" ")
+                    finish_reason = "stop"
+                    if body.get("max_tokens") and len(words) > body["max_tokens"]:
+                        words, finish_reason = words[:body["max_tokens"]], "length"
+                    for index, word in enumerate(words):
+                        self._event({"choices": [{"index": 0, "delta": {"content": word if index == 0 else " " + word},
+                                                  "finish_reason": None}]}, model)
+                        time.sleep(server.token_delay)
+                    self._event({"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}, model)
+                    self._event({"choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": len(words),
+                                                          "total_tokens": 100 + len(words)}}, model)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    server._record_disconnect(model)
+
+            def _closed_within(self, seconds):
+                """Wait `seconds`; True as soon as the client closes the connection."""
+                deadline = time.monotonic() + seconds
+                while (remaining := deadline - time.monotonic()) > 0:
+                    readable, _, _ = select.select([self.connection], [], [], remaining)
+                    if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                        return True
+                return False
+
+            def _event(self, chunk, model):
+                chunk.update({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": model})
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,76 @@
+import sys
+import os
+import threading
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.admission_control import AdmissionController, Overloaded
+
+
+def test_queue_is_bounded_and_sheds_when_full():
+    controller = AdmissionController(initial_limit=1, max_queue=1, queue_timeout=5)
+    controller.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        controller.acquire()
+        admitted.set()
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while controller.metrics()["queue_depth"] < 1:
+        pass
+
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire()
+    assert shed.value.reason == "queue full" and shed.value.retry_after >= 1
+
+    # Releasing the running request admits the queued one.
+    controller.release()
+    thread.join(1)
+    assert admitted.is_set()
+    metrics = controller.metrics()
+    assert (metrics["in_flight"], metrics["queue_depth"]) == (1, 0)
+    assert (metrics["admitted"], metrics["shed_queue_full"]) == (2, 1)
+
+
+def test_queueing_deadline():
+    controller = AdmissionController(initial_limit=1, max_queue=4, queue_timeout=0.05)
+    controller.acquire()
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire()
+    assert shed.value.reason == "queueing deadline exceeded"
+    assert controller.metrics()["shed_timeout"] == 1
+    assert controller.metrics()["queue_depth"] == 0
+
+    # A caller that cannot wait is shed without queueing
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire(timeout=0)
+    assert shed.value.reason == "busy"
+    assert controller.metrics()["shed_busy"] == 1
+
+
+def test_limit_adapts_to_upstream():
+    controller = AdmissionController(initial_limit=4, min_limit=1, max_limit=5, ttft_target=1.0)
+    controller.service_time = 0
+    for _ in range(4):
+        controller.record_upstream(0.2)
+    assert controller.limit == pytest.approx(5.0, abs=0.1)
+
+    controller.record_upstream(throttled=True)
+    assert controller.limit == pytest.approx(2.5, abs=0.1)
+    controller.record_upstream(2.0)
+    assert controller.limit == pytest.approx(2.25, abs=0.1)
+    for _ in range(10):
+        controller.record_upstream(throttled=True)
+    assert controller.limit == 1
+    assert controller.metrics()["upstream_throttled"] == 11
+
+
+def test_decreases_once_per_service_time():
+    controller = AdmissionController(initial_limit=8)
+    controller.service_time = 60
+    controller.record_upstream(throttled=True)
+    controller.record_upstream(throttled=True)
+    assert controller.limit == 4
@@ -0,0 +1,99 @@
+import sys
+import os
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+import mongomock
+import pytest
+
+from mappers import book_change_mapper
+from mappers.mongo_db_mapper import BookMapper
+
+
+@pytest.fixture
+def counters(mocker):
+    collection = mongomock.MongoClient().db.counters
+    mocker.patch.object(book_change_mapper, "counters_collection", collection)
+    return collection
+
+
+def test_stamp_books_fills_the_reserved_range():
+    books = book_change_mapper.stamp_books([{"book_serial": 1}, {"book_serial": 2}, {"book_serial": 3}], 30)
+    assert [book["change_seq"] for book in books] == [28, 29, 30]
+    assert all("updated_at" in book for book in books)
+
+
+def test_the_feed_stops_short_of_writes_in_flight(counters):
+    with book_change_mapper.reserve_change_seqs(2) as first_write:
+        with book_change_mapper.reserve_change_seqs() as second_write:
+            assert (first_write, second_write) == (2, 3)
+            assert book_change_mapper.get_stable_change_seq() == 0
+        # The later write landed first; readers must still wait for 1 and 2
+        assert book_change_mapper.get_stable_change_seq() == 0
+    assert book_change_mapper.get_stable_change_seq() == 3
+    assert counters.find_one()["pending"] == []
+
+
+def test_a_failed_write_releases_its_reservation(counters):
+    with pytest.raises(RuntimeError):
+        with book_change_mapper.book_change() as stamp:
+            assert stamp["change_seq"] == 1
+            raise RuntimeError("write failed")
+    assert book_change_mapper.get_stable_change_seq() == 1
+
+
+def test_reservations_of_dead_writers_expire(counters, mocker):
+    clock = mocker.patch.object(book_change_mapper.time, "time", return_value=1000.0)
+    counters.insert_one({"_id": book_change_mapper.BOOKS_COUNTER_ID, "seq": 5,
+                         "pending": [{"token": "dead", "floor": 3, "expires": 1000.0 + 600}]})
+    assert book_change_mapper.get_stable_change_seq() == 2
+
+    clock.return_value = 2000.0
+    assert book_change_mapper.get_stable_change_seq() == 5
+    with book_change_mapper.book_change():
+        pass
+    assert counters.find_one()["pending"] == []
+
+
+def test_get_changes_since_caps_at_the_stable_seq(mocker):
+    mocker.patch.object(book_change_mapper, "get_stable_change_seq", return_value=12)
+    books = mocker.patch.object(book_change_mapper, "books_collection")
+    tombstones = mocker.patch.object(book_change_mapper, "tombstones_collection")
+    books.find.return_value.sort.return_value.limit.return_value = []
+    tombstones.find.return_value.sort.return_value.limit.return_value = []
+
+    book_change_mapper.get_changes_since(10, 100)
+
+    assert books.find.call_args.args[0] == {"change_seq": {"$gt": 10, "$lte": 12}}
+    assert tombstones.find.call_args.args[0] == {"change_seq": {"$gt": 10, "$lte": 12}}
+
+
+def test_delete_book_records_tombstone(mocker):
+    mapper = BookMapper()
+    mocker.patch.object(mapper, "collection")
+    mapper.collection.find_one_and_delete.return_value = {"book_serial": 7, "tags": "Drama"}
+    tombstone = mocker.patch("mappers.mongo_db_mapper.record_tombstone")
+    mocker.patch("mappers.mongo_db_mapper.record_removed_book")
+    # Deleting a book also removes the data derived from it
+    mocker.patch("mappers.mongo_db_mapper.delete_book_overlays")
+
+    assert mapper.delete_book(7) is True
+    tombstone.assert_called_once_with(7)
+
+    mapper.collection.find_one_and_delete.return_value = None
+    tombstone.reset_mock()
+    assert mapper.delete_book(8) is False
+    tombstone.assert_not_called()
+
+
+def test_delete_book_records_tombstone_when_cleanup_fails(mocker):
+    mapper = BookMapper()
+    mocker.patch.object(mapper, "collection")
+    mapper.collection.find_one_and_delete.return_value = {"book_serial": 7, "tags": "Drama"}
+    tombstone = mocker.patch("mappers.mongo_db_mapper.record_tombstone")
+    mocker.patch("mappers.mongo_db_mapper.record_removed_book")
+    mocker.patch("mappers.mongo_db_mapper.delete_book_overlays", side_effect=RuntimeError("Mongo went away"))
+
+    assert mapper.delete_book(7) is True
+    tombstone.assert_called_once_with(7)
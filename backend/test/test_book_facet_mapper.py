@@ -0,0 +1,37 @@
+import sys
+import os
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from mappers import book_facet_mapper
+from models.book_schema import normalize_tags
+
+
+def test_normalize_tags():
+    assert normalize_tags("Fantasy, adventure ,fantasy,, Science   Fiction") == \
+        ["fantasy", "adventure", "science fiction"]
+    assert normalize_tags(None) == []
+
+
+def test_facet_deltas_add_and_remove():
+    books = [
+        {"tag_list": ["fantasy", "adventure"], "rating": "PG"},
+        {"tags": "Fantasy", "rating": "PG-13"},
+    ]
+    assert book_facet_mapper.facet_deltas(books) == {
+        ("tag", "fantasy"): 2, ("tag", "adventure"): 1, ("rating", "PG"): 1, ("rating", "PG-13"): 1
+    }
+    assert book_facet_mapper.facet_deltas(books[:1], -1)[("tag", "fantasy")] == -1
+
+
+def test_get_facets_orders_by_count(mocker):
+    rows = [
+        {"_id": {"facet": "tag", "value": "adventure"}, "count": 1},
+        {"_id": {"facet": "tag", "value": "fantasy"}, "count": 3},
+        {"_id": {"facet": "rating", "value": "PG"}, "count": 4},
+    ]
+    mocker.patch.object(book_facet_mapper, "facets_collection").find.return_value = rows
+    facets = book_facet_mapper.get_facets()
+    assert list(facets["tags"].items()) == [("fantasy", 3), ("adventure", 1)]
+    assert facets["ratings"] == {"PG": 4}
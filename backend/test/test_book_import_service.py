@@ -0,0 +1,92 @@
+import sys
+import os
+import zipfile
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services import book_ingest_service
+from services.book_import_service import (
+    decode_text, normalize_text, detect_chapters, parse_txt, parse_epub, import_book_files
+)
+
+
+def write_epub(path):
+    with zipfile.ZipFile(path, "w") as epub:
+        epub.writestr("mimetype", "application/epub+zip")
+        epub.writestr("META-INF/container.xml", """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>""")
+        epub.writestr("OEBPS/content.opf", """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:title>The Test Voyage</dc:title><dc:creator>Ada Author</dc:creator><dc:date>1851-10-18</dc:date>
+  </metadata>
+  <manifest>
+    <item id="c1" href="ch1.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="ch2.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine><itemref idref="c1"/><itemref idref="c2"/></spine>
+</package>""")
+        epub.writestr("OEBPS/ch1.xhtml", "<html><head><style>p {}</style></head><body>"
+                                         "<h1>Chapter 1</h1><p>Call me   Ishmael.</p></body></html>")
+        epub.writestr("OEBPS/ch2.xhtml", "<html><body><h1>Chapter 2</h1><p>The sea.</p></body></html>")
+
+
+def test_decode_and_normalize_text():
+    assert decode_text("café".encode("cp1252")) == "café"
+    assert decode_text("﻿hello".encode("utf-8")) == "hello"
+    assert normalize_text("  A\t\tline \r\n\r\n\r\n\r\nNext  ") == "A line\n\nNext"
+
+
+def test_detect_chapters():
+    text = "Preface\n\nCHAPTER I. Loomings\n\nText\n\nChapter twenty-one\n\nPart of me wanted to go."
+    offsets = detect_chapters(text)
+    assert len(offsets) == 2
+    assert text[offsets[0]:].startswith("CHAPTER I.")
+
+
+def test_parse_txt_reads_gutenberg_header(tmp_path):
+    path = tmp_path / "moby_dick.txt"
+    path.write_text("Title: Moby Dick\nAuthor: Herman Melville\n\nChapter 1\n\nCall me Ishmael.\n\n"
+                    "Chapter 2\n\nThe Carpet-Bag.", encoding="utf-8")
+    book = parse_txt(str(path))
+    assert book["title"] == "Moby Dick"
+    assert book["author"] == "Herman Melville"
+    assert book["total_chapters"] == 2
+    assert book["total_word_count"] == 15
+
+
+def test_parse_epub(tmp_path):
+    path = tmp_path / "voyage.epub"
+    write_epub(path)
+    book = parse_epub(str(path))
+    assert book["title"] == "The Test Voyage"
+    assert book["author"] == "Ada Author"
+    assert book["publication_date"] == "1851-10-18"
+    assert book["total_chapters"] == 2
+    assert book["text"] == "Chapter 1\n\nCall me Ishmael.\n\nChapter 2\n\nThe sea."
+
+
+def test_import_book_files_assigns_serials(tmp_path, mocker):
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "a.txt").write_text("Chapter 1\n\nHello world.", encoding="utf-8")
+    write_epub(tmp_path / "nested" / "b.epub")
+    (tmp_path / "broken.epub").write_bytes(b"not a zip")
+    (tmp_path / "notes.md").write_text("ignored", encoding="utf-8")
+
+    mocker.patch.object(book_ingest_service.book_mapper, "get_max_book_serial", return_value=41)
+    insert = mocker.patch.object(book_ingest_service.book_mapper, "insert_books",
+                                 side_effect=lambda books: len(books))
+    progress = []
+
+    summary = import_book_files([str(tmp_path)], tags="Classic", workers=2,
+                                on_progress=lambda done, total: progress.append((done, total)))
+
+    assert summary["inserted"] == 2
+    assert [error["line"] for error in summary["errors"]] == [str(tmp_path / "broken.epub")]
+    books = insert.call_args.args[0]
+    assert [book["book_serial"] for book in books] == [42, 43]
+    assert all(book["tags"] == "Classic" for book in books)
+    assert progress[-1] == (3, 3)
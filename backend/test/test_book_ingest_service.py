@@ -0,0 +1,50 @@
+import sys
+import os
+import io
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services import book_ingest_service
+from services.book_ingest_service import count_words, ingest_books, iter_ndjson
+
+
+def make_book(serial, text="word " * 10):
+    return {"book_serial": serial, "title": "T", "author": "A", "publication_date": "2024-01-01",
+            "tags": "Drama", "rating": "PG", "total_chapters": 1, "text": text}
+
+
+def test_count_words():
+    assert count_words("") == 0
+    assert count_words("  Once upon\n a\ttime  ") == 4
+
+
+def test_iter_ndjson_skips_blank_lines():
+    stream = io.BytesIO(b'{"a": 1}\n\n[1, 2]\n')
+    records = list(iter_ndjson(stream))
+    assert records[0] == (1, {"a": 1})
+    assert records[1][0] == 3
+    assert isinstance(records[1][1], ValueError)
+
+
+def test_ingest_books_batches_by_count_and_bytes(mocker):
+    insert = mocker.patch.object(book_ingest_service.book_mapper, "insert_books",
+                                 side_effect=lambda books: len(books))
+
+    records = [(i, make_book(i)) for i in range(5)]
+    summary = ingest_books(records, batch_size=2)
+    assert summary["inserted"] == 5
+    assert [len(call.args[0]) for call in insert.call_args_list] == [2, 2, 1]
+
+    insert.reset_mock()
+    records = [(i, make_book(i, text="x" * 100)) for i in range(3)]
+    ingest_books(records, batch_size=100, max_batch_bytes=150)
+    assert [len(call.args[0]) for call in insert.call_args_list] == [2, 1]
+
+
+def test_ingest_books_ignores_client_word_count(mocker):
+    insert = mocker.patch.object(book_ingest_service.book_mapper, "insert_books", return_value=1)
+    book = make_book(1, text="three short words")
+    book["total_word_count"] = 999
+    ingest_books([(1, book)])
+    assert insert.call_args.args[0][0]["total_word_count"] == 3
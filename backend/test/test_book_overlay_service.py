@@ -0,0 +1,84 @@
+import sys
+import os
+
+import mongomock
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from mappers import book_overlay_mapper
+from services import book_overlay_service
+from services.book_overlay_service import chapter_spans, get_book_view, merge_spans, rewritten_span
+
+TEXT = "Preface.\n\nChapter 1\n\nIt begins.\n\nChapter 2\n\nIt ends.\n"
+
+
+def test_chapter_spans_from_headings():
+    spans = chapter_spans({"text": TEXT})
+    assert [TEXT[start:end].split("\n")[0] for start, end in spans] == ["Preface.", "Chapter 1", "Chapter 2"]
+    assert spans[-1][1] == len(TEXT)
+    assert chapter_spans({"text": "No headings", "chapter_offsets": []}) == [(0, 11)]
+
+
+def test_merge_spans_replaces_only_rewritten_chapters():
+    start, end = chapter_spans({"text": TEXT})[1]
+    spans = {str(start): dict(zip(("end", "text"), rewritten_span(TEXT, start, end, "  CHAPTER ONE, darkly.  ")))}
+    merged = merge_spans(TEXT, spans)
+    assert merged == "Preface.\n\nCHAPTER ONE, darkly.\n\nChapter 2\n\nIt ends.\n"
+    # A single chapter reads just its range.
+    assert merge_spans(TEXT, spans, start, end) == "CHAPTER ONE, darkly.\n\n"
+
+
+def test_get_book_view_ignores_stale_overlay(mocker):
+    book = {"book_serial": 1, "text": TEXT, "change_seq": 5}
+    mocker.patch.object(book_overlay_service, "get_book_by_serial", return_value=book)
+    overlay = {"base_change_seq": 5, "spans": {"0": {"end": 10, "text": "PREFACE.\n\n"}}}
+    mocker.patch.object(book_overlay_service, "get_overlay", return_value=overlay)
+
+    view = get_book_view(1, "mystery", 7)
+    assert view["text"].startswith("PREFACE.\n\nChapter 1")
+    assert view["rewritten_chapters"] == [0] and view["chapters"] == 3
+    assert get_book_view(1, "mystery", 7, chapter=2)["text"] == "Chapter 2\n\nIt ends.\n"
+    assert get_book_view(1, "mystery", 7, chapter=9) is None
+
+    overlay["base_change_seq"] = 4
+    assert get_book_view(1, "mystery", 7)["text"] == TEXT
+
+
+def test_save_overlay_spans_drops_overlapping_spans(mocker):
+    overlays = mocker.patch.object(book_overlay_mapper, "overlays_collection")
+    overlays.find_one.return_value = {"base_change_seq": 5, "spans": {
+        "0": {"end": 10, "text": "a"}, "10": {"end": 30, "text": "b"}, "30": {"end": 50, "text": "c"}}}
+
+    assert book_overlay_mapper.save_overlay_spans(7, 1, "mystery", 5, {0: (30, "ab")})
+    update = overlays.update_one.call_args.args[1]
+    assert update["$set"]["spans.0"] == {"end": 30, "text": "ab"}
+    assert update["$unset"] == {"spans.10": ""}
+
+    # A changed base replaces every span.
+    book_overlay_mapper.save_overlay_spans(7, 1, "mystery", 6, {30: (50, "C")})
+    assert overlays.update_one.call_args.args[1]["$set"]["spans"] == {"30": {"end": 50, "text": "C"}}
+
+
+def test_concurrent_overlay_saves_keep_each_others_spans(mocker):
+    overlays = mongomock.MongoClient().db.book_overlays
+    mocker.patch.object(book_overlay_mapper, "overlays_collection", overlays)
+    book_overlay_mapper.ensure_indexes()
+    book_overlay_mapper.save_overlay_spans(7, 1, "mystery", 5, {0: (10, "a")})
+
+    # Another save lands between this save's read and its write
+    read = overlays.find_one
+    raced = []
+
+    def find_one(*args, **kwargs):
+        overlay = read(*args, **kwargs)
+        if not raced:
+            raced.append(True)
+            assert book_overlay_mapper.save_overlay_spans(7, 1, "mystery", 6, {10: (20, "b")})
+        return overlay
+    mocker.patch.object(overlays, "find_one", side_effect=find_one)
+
+    assert book_overlay_mapper.save_overlay_spans(7, 1, "mystery", 6, {20: (30, "c")})
+    overlay = read({"user_id": 7})
+    assert overlay["spans"] == {"10": {"end": 20, "text": "b"}, "20": {"end": 30, "text": "c"}}
+    assert overlay["revision"] == 3
@@ -0,0 +1,157 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Ensure `backend/app/` is in sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from services import book_sync_service
+from services.book_sync_service import BookSyncRelay, book_sync_status
+from mappers.book_catalog_mapper import BookCatalogMapper
+from models.book_model import Book, BookTag, SyncCheckpoint
+from models.user_model import Base
+
+NOW = datetime(2025, 3, 1, 12, 0, 0)
+
+
+def change(serial, seq, age=60, **fields):
+    return {"book_serial": serial, "change_seq": seq, "updated_at": NOW - timedelta(seconds=age), "deleted": False,
+            "title": f"Book {serial}", "author": "Ada Baker", "publication_date": "2001-02-03",
+            "tags": "Fantasy, Adventure", "rating": "PG", "total_chapters": 3, "total_word_count": 1000, **fields}
+
+
+def tombstone(serial, seq, age=60):
+    return {"book_serial": serial, "change_seq": seq, "updated_at": NOW - timedelta(seconds=age), "deleted": True}
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def feed(mocker):
+    """A stand-in change feed; append changes to the returned list."""
+    changes = []
+    mocker.patch.object(book_sync_service, "get_changes_since",
+                        side_effect=lambda since, limit: [c for c in changes if c["change_seq"] > since][:limit])
+    return changes
+
+
+def rows(session_factory):
+    db = session_factory()
+    try:
+        books = {book.book_serial: book for book in db.execute(select(Book)).scalars()}
+        tags = sorted((tag.book_serial, tag.tag) for tag in db.execute(select(BookTag)).scalars())
+        return books, tags
+    finally:
+        db.close()
+
+
+def test_changes_are_upserted_with_their_tags(session_factory, feed):
+    feed.extend([change(1, 1), change(2, 2, tags="Mystery"), change(1, 3, title="Book One, revised")])
+    relay = BookSyncRelay(session_factory, batch_size=10)
+
+    assert relay.run_once(NOW) == (3, False)
+
+    books, tags = rows(session_factory)
+    assert books[1].title == "Book One, revised"
+    assert books[1].change_seq == 3
+    assert str(books[2].publication_date) == "2001-02-03"
+    assert tags == [(1, "adventure"), (1, "fantasy"), (2, "mystery")]
+
+
+def test_tombstones_delete_books_and_their_tags(session_factory, feed):
+    feed.extend([change(1, 1), change(2, 2)])
+    relay = BookSyncRelay(session_factory, batch_size=10)
+    relay.run_once(NOW)
+
+    feed.append(tombstone(1, 3))
+    relay.run_once(NOW)
+
+    books, tags = rows(session_factory)
+    assert list(books) == [2]
+    assert [serial for serial, _ in tags] == [2, 2]
+
+
+def test_replaying_old_changes_is_harmless(session_factory):
+    db = session_factory()
+    BookCatalogMapper.apply_changes(db, [change(1, 5, title="New")])
+    db.commit()
+
+    assert BookCatalogMapper.apply_changes(db, [change(1, 2, title="Old"), change(1, 5, title="New")]) == \
+        {"upserted": 0, "deleted": 0, "skipped": 2}
+    db.commit()
+    assert db.get(Book, 1).title == "New"
+    db.close()
+
+
+def test_the_checkpoint_advances_batch_by_batch(session_factory, feed):
+    feed.extend(change(serial, serial) for serial in range(1, 6))
+    relay = BookSyncRelay(session_factory, batch_size=2)
+
+    assert relay.run_once(NOW) == (2, True)
+    assert relay.run_once(NOW) == (2, True)
+    assert relay.run_once(NOW) == (1, False)
+
+    db = session_factory()
+    checkpoint = db.get(SyncCheckpoint, "books")
+    assert checkpoint.position == 5
+    assert checkpoint.applied_through == NOW - timedelta(seconds=60)
+    assert checkpoint.last_run_at == NOW
+    db.close()
+
+
+def test_a_failed_batch_leaves_the_checkpoint_alone(session_factory, feed, mocker):
+    feed.extend([change(1, 1), change(2, 2)])
+    mocker.patch.object(BookCatalogMapper, "apply_changes", side_effect=RuntimeError("MySQL went away"))
+    relay = BookSyncRelay(session_factory, batch_size=10)
+
+    with pytest.raises(RuntimeError):
+        relay.run_once(NOW)
+
+    db = session_factory()
+    checkpoint = db.get(SyncCheckpoint, "books")
+    assert checkpoint is None or checkpoint.position == 0
+    db.close()
+
+
+def test_status_reports_the_lag(session_factory, feed, mocker):
+    feed.extend([change(1, 1), change(2, 2)])
+    BookSyncRelay(session_factory, batch_size=1).run_once(NOW)
+    mocker.patch.object(book_sync_service, "get_current_change_seq", return_value=2)
+    pending = mocker.patch.object(book_sync_service, "get_pending_changes",
+                                  return_value=(1, NOW - timedelta(seconds=60)))
+
+    status = book_sync_status(session_factory, now=NOW)
+
+    pending.assert_called_once_with(1)
+    assert status["position"] == 1
+    assert status["head"] == 2
+    assert status["pending_changes"] == 1
+    assert status["lag_seconds"] == 60.0
+
+
+def test_catalog_filters_and_sorts_in_sql(session_factory):
+    db = session_factory()
+    BookCatalogMapper.apply_changes(db, [
+        change(1, 1, title="Cedar", publication_date="1999-01-01"),
+        change(2, 2, title="Aspen", tags="Mystery", publication_date="2010-05-05"),
+        change(3, 3, title="Birch", author="Omar Silva", publication_date="2005-07-07"),
+    ])
+    db.commit()
+
+    fantasy = BookCatalogMapper.search_catalog(db, tag="fantasy", sort="title")
+    assert [book["title"] for book in fantasy] == ["Birch", "Cedar"]
+    newest = BookCatalogMapper.search_catalog(db, sort="-publication_date", limit=2)
+    assert [book["book_serial"] for book in newest] == [2, 3]
+    assert newest[0]["publication_date"] == "2010-05-05"
+    by_author = BookCatalogMapper.search_catalog(db, author="Ada Baker", offset=1)
+    assert [book["book_serial"] for book in by_author] == [2]
+    db.close()
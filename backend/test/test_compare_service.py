@@ -0,0 +1,54 @@
+import sys
+import os
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services import compare_service
+from services.compare_service import align_paragraphs, compare_texts, split_paragraphs
+
+
+def test_split_paragraphs():
+    assert split_paragraphs("One\nline.\n\n  \n\nTwo.\n") == ["One\nline.", "Two."]
+
+
+def test_align_paragraphs_matches_unchanged_and_pairs_changed():
+    original = ["Chapter 1", "It was a dark night.", "The end."]
+    rewrite = ["Chapter 1", "The night was dark and stormy.", "A new paragraph of moderate length here.",
+               "The end."]
+    alignment = align_paragraphs(original, rewrite)
+    assert alignment[0] == ("equal", 0, 1, 0, 1)
+    assert alignment[-1] == ("equal", 2, 3, 3, 4)
+    # The middle paragraph maps onto the two rewritten ones.
+    assert [op for op, *_ in alignment[1:-1]] in (["changed"], ["changed", "inserted"])
+    assert alignment[1][1:4] == (1, 2, 1)
+
+
+def test_align_paragraphs_covers_both_texts_in_order():
+    original = ["p%d " % i * (i % 7 + 1) for i in range(300)]
+    rewrite = [paragraph.upper() for paragraph in original[:100]] + original[100:250] + ["extra"] * 30
+    alignment = align_paragraphs(original, rewrite)
+    i = j = 0
+    for _, i1, i2, j1, j2 in alignment:
+        assert (i1, j1) == (i, j)
+        i, j = i2, j2
+    assert (i, j) == (len(original), len(rewrite))
+
+
+def test_compare_texts_pages_and_caches(mocker):
+    original = "\n\n".join("Paragraph %d." % i for i in range(10))
+    rewrite = original.replace("Paragraph 3.", "Paragraph three, rewritten.")
+    align = mocker.spy(compare_service, "align_paragraphs")
+
+    first = compare_texts(original, rewrite, offset=0, limit=4)
+    second = compare_texts(original, rewrite, offset=4, limit=4)
+    assert align.call_count == 1
+    assert first["total"] == 10 and first["has_more"] and not compare_texts(original, rewrite, 8, 4)["has_more"]
+    assert first["entries"][3] == {"op": "changed", "original_index": 3, "rewrite_index": 3,
+                                   "original": ["Paragraph 3."], "rewrite": ["Paragraph three, rewritten."]}
+    assert second["entries"][0]["original"] == ["Paragraph 4."]
+    assert first["stats"] == {"equal": 9, "changed": 1, "inserted": 0, "deleted": 0}
+
+    compact = compare_texts(original, rewrite, compact=True)
+    assert [entry["op"] for entry in compact["entries"]] == ["equal", "changed", "equal"]
+    assert compact["entries"][2] == {"op": "equal", "original_index": 4, "rewrite_index": 4, "count": 6}
@@ -108,4 +108,129 @@ def test_edit_book_service_failure(client, mocker):
     response = client.put("/books/100", json=payload)
     assert response.status_code == 500
     json_data = response.get_json()
-    assert json_data["message"] == "Internal Server Error"
\ No newline at end of file
+    assert json_data["message"] == "Internal Server Error"
+
+
+def test_edit_book_passes_user_and_chapters(client, mocker):
+    mocker.patch("controllers.edit_book_controller.user_exists", side_effect=lambda user_id: user_id == 7)
+    service = mocker.patch("controllers.edit_book_controller.edit_book_service", return_value="text")
+    response = client.put("/books/123", json={"editingOption": "mystery", "userId": "7", "chapters": [2]},
+                          environ_base={"REMOTE_ADDR": "10.0.0.5"})
+    assert response.status_code == 201
+    # The client IP's quota is charged along with the user's
+    service.assert_called_once_with(123, "mystery", 7, [2], client="ip:10.0.0.5")
+
+    response = client.put("/books/123", json={"editingOption": "mystery", "userId": "8"})
+    assert response.status_code == 404
+    assert response.get_json() == {"message": "User not found"}
+    assert service.call_count == 1
+
+    assert client.put("/books/123", json={"editingOption": "mystery", "userId": "me"}).status_code == 400
+    assert client.put("/books/123", json={"editingOption": "mystery", "chapters": "all"}).status_code == 400
+
+
+def test_get_rewrite(client, mocker):
+    view = mocker.patch("controllers.edit_book_controller.get_book_view",
+                        return_value={"book_serial": 123, "text": "merged"})
+    response = client.get("/books/123/rewrite?style=mystery&userId=7&chapter=2")
+    assert response.status_code == 200
+    view.assert_called_once_with(123, "mystery", 7, 2)
+    assert client.get("/books/123/rewrite").status_code == 400
+
+
+def test_compare_book(client, mocker):
+    book = {"book_serial": 123, "text": "Same.\n\nOld ending."}
+    mocker.patch("controllers.edit_book_controller.get_book_by_serial", return_value=book)
+    mocker.patch("controllers.edit_book_controller.get_book_view",
+                 return_value={"rewritten_chapters": [0], "text": "Same.\n\nNew ending."})
+
+    response = client.get("/books/123/compare?style=mystery&format=diff")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["stats"]["changed"] == 1
+    assert data["entries"][1]["rewrite"] == ["New ending."]
+
+    # Unchanged texts revalidate without a body.
+    cached = client.get("/books/123/compare?style=mystery&format=diff",
+                        headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+
+def test_compare_book_without_rewrite(client, mocker):
+    mocker.patch("controllers.edit_book_controller.get_book_by_serial", return_value={"text": "x"})
+    mocker.patch("controllers.edit_book_controller.get_book_view", return_value={"rewritten_chapters": []})
+    assert client.get("/books/123/compare?style=mystery").status_code == 404
+    assert client.get("/books/123/compare").status_code == 400
+    assert client.get("/books/123/compare?style=mystery&format=html").status_code == 400
+
+
+def test_edit_book_preview(client, mocker):
+    preview = mocker.patch("controllers.edit_book_controller.preview_book_service",
+                           return_value={"text": "Opening", "job_id": "abc"})
+    response = client.put("/books/123", json={"editingOption": "mystery", "preview": True, "previewParagraphs": 2})
+    assert response.status_code == 202
+    assert response.get_json() == {"message": "Preview ready", "style": "mystery", "text": "Opening", "jobId": "abc"}
+    preview.assert_called_once_with(123, "mystery", 0, None, 2, client="ip:127.0.0.1")
+
+    response = client.put("/books/123", json={"editingOption": "mystery", "preview": True, "previewParagraphs": 0})
+    assert response.status_code == 400
+
+
+def test_get_rewrite_job(client, mocker):
+    job = {"job_id": "abc", "status": "running", "completed": 1, "total": 3}
+    mocker.patch("controllers.edit_book_controller.get_job", side_effect=lambda job_id: job if job_id == "abc" else None)
+    assert client.get("/rewrite-jobs/abc").get_json() == job
+    assert client.get("/rewrite-jobs/nope").status_code == 404
+
+
+def test_get_styles(client):
+    styles = client.get("/styles").get_json()["styles"]
+    assert "mystery" in [style["id"] for style in styles]
+    assert all("prompt" not in style for style in styles)
+
+
+def test_edit_book_canonicalizes_style(client, mocker):
+    service = mocker.patch("controllers.edit_book_controller.edit_book_service", return_value="text")
+    response = client.put("/books/123", json={"editingOption": "  Fantasy style "})
+    assert response.get_json()["style"] == "fantasy"
+    assert service.call_args.args[1] == "fantasy"
+
+
+def test_edit_book_sheds_load_when_overloaded(client, mocker):
+    from services.admission_control import Overloaded
+
+    mocker.patch("controllers.edit_book_controller.edit_book_service", side_effect=Overloaded("queue full", 4))
+    response = client.put("/books/123", json={"editingOption": "mystery"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "4"
+    assert response.get_json()["reason"] == "queue full"
+
+
+def test_edit_book_times_out_with_504(client, mocker):
+    mocker.patch("controllers.edit_book_controller.edit_book_service", side_effect=TimeoutError("deadline"))
+    response = client.put("/books/123", json={"editingOption": "mystery"})
+    assert response.status_code == 504
+
+
+def test_preview_sheds_load_when_the_job_queue_is_full(client, mocker):
+    from services.admission_control import Overloaded
+
+    mocker.patch("controllers.edit_book_controller.preview_book_service",
+                 side_effect=Overloaded("rewrite queue full", 30))
+    response = client.put("/books/123", json={"editingOption": "mystery", "preview": True})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert response.get_json()["reason"] == "rewrite queue full"
+
+
+def test_rewrite_larger_than_the_quota_is_413(client, mocker):
+    from services.token_quota import QuotaTooSmall
+
+    mocker.patch("controllers.edit_book_controller.user_exists", return_value=True)
+    mocker.patch("controllers.edit_book_controller.edit_book_service",
+                 side_effect=QuotaTooSmall(7, "day", 200000, 250000))
+    response = client.put("/books/123", json={"editingOption": "mystery", "userId": "7"})
+    assert response.status_code == 413
+    assert "Retry-After" not in response.headers
+    assert response.get_json() == {"message": "Rewrite exceeds quota; select fewer chapters", "period": "day",
+                                   "limit": 200000, "estimate": 250000}
@@ -13,6 +13,35 @@ from mappers.edit_book_mapper import get_book_by_serial, update_book_text
 from services.edit_book_service import edit_book_service
 
 
+def completion_stream(content, usage=None):
+    """The chunks of a streamed chat completion."""
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None),
+        SimpleNamespace(choices=[], usage=usage),
+    ]
+
+
+@pytest.fixture(autouse=True)
+def fake_usage_record(mocker):
+    # Keep LLM call accounting out of these tests.
+    return mocker.patch("services.edit_book_service.record_llm_call")
+
+
+@pytest.fixture(autouse=True)
+def token_quotas(mocker):
+    from services.token_quota import TokenQuotas
+
+    class EmptyStore:
+        def get_usage(self, keys):
+            return dict.fromkeys(keys, 0)
+
+        def add_usage(self, deltas):
+            pass
+    quotas = TokenQuotas({"day": 100000}, flush_seconds=3600, store=EmptyStore())
+    mocker.patch("services.edit_book_service.token_quotas", quotas)
+    return quotas
+
+
 # ----------------------------
 # Test: Book Not Found
 # ----------------------------
@@ -32,19 +61,45 @@ def test_edit_book_success(mocker):
     # Patch both get_book_by_serial and update_book_text as they appear in services.edit_book_service.
     mocker.patch("services.edit_book_service.get_book_by_serial", return_value=original_book)
 
-    fake_completion = SimpleNamespace(
-        choices=[SimpleNamespace(message=SimpleNamespace(content="This is the updated text."))]
-    )
+    fake_completion = completion_stream("This is the updated text.")
     fake_client = SimpleNamespace(
         chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: fake_completion))
     )
     mocker.patch("services.edit_book_service.OpenAI", return_value=fake_client)
 
-    mocker.patch("services.edit_book_service.update_book_text", return_value=True)
+    save = mocker.patch("services.edit_book_service.save_overlay_spans", return_value=True)
+    mocker.patch("services.edit_book_service.get_overlay",
+                 side_effect=lambda user_id, book_serial, style: {
+                     "base_change_seq": None, "spans": {"0": {"end": 26, "text": "This is the updated text."}}})
 
     result = edit_book_service(123, "change style")
     assert result == "This is the updated text.", "The service should return the updated text from OpenAI."
     assert result != original_book["text"], "The updated text should differ from the original."
+    # The rewrite goes to the anonymous user's overlay, never into the shared book.
+    assert save.call_args.args[:3] == (0, 123, "custom:change")
+    assert save.call_args.args[4] == {0: (26, "This is the updated text.")}
+
+
+def test_edit_book_rewrites_chapters_in_parallel(mocker):
+    import threading
+
+    text = "Chapter 1\n\nFirst.\n\nChapter 2\n\nSecond.\n"
+    mocker.patch("services.edit_book_service.get_book_by_serial",
+                 return_value={"book_serial": 123, "text": text, "change_seq": 4})
+    # Each call waits for the other, so the test only passes if both chapters run at once
+    both_started = threading.Barrier(2, timeout=5)
+
+    def fake_create(**kwargs):
+        both_started.wait()
+        return completion_stream("ONE" if "First." in kwargs["messages"][1]["content"] else "TWO")
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    mocker.patch("services.edit_book_service.OpenAI", return_value=fake_client)
+    save = mocker.patch("services.edit_book_service.save_overlay_spans", return_value=True)
+    mocker.patch("services.edit_book_service.get_overlay", return_value=None)
+
+    assert edit_book_service(123, "mystery", 7)
+    assert save.call_count == 1
+    assert save.call_args.args[4] == {0: (19, "ONE\n\n"), 19: (len(text), "TWO\n")}
 
 
 # ----------------------------
@@ -56,9 +111,7 @@ def test_edit_book_update_failure(mocker):
     mocker.patch("mappers.edit_book_mapper.get_book_by_serial", return_value=original_book)
 
     # Create a fake OpenAI response with updated text.
-    fake_completion = SimpleNamespace(
-        choices=[SimpleNamespace(message=SimpleNamespace(content="New updated text."))]
-    )
+    fake_completion = completion_stream("New updated text.")
     fake_client = SimpleNamespace(
         chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: fake_completion)))
     mocker.patch("services.edit_book_service.OpenAI", return_value=fake_client)
@@ -95,3 +148,322 @@ def test_edit_book_openai_error(mocker):
     result = edit_book_service(123, "change style")
     assert result is None, "If the OpenAI call fails, the service should return None."
 
+
+
+# ----------------------------
+# Test: Preview, then background completion
+# ----------------------------
+def test_preview_rewrites_opening_and_schedules_rest(mocker):
+    from services import edit_book_service as service
+
+    text = "Chapter 1\n\nFirst.\n\nSecond.\n\nThird.\n\nChapter 2\n\nMore."
+    mocker.patch.object(service, "get_book_by_serial",
+                        return_value={"book_serial": 123, "text": text, "change_seq": 4})
+    prompts = []
+
+    def fake_create(**kwargs):
+        prompts.append((kwargs["messages"][1]["content"], kwargs["max_tokens"]))
+        return completion_stream("REWRITTEN")
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    openai = mocker.patch.object(service, "OpenAI", return_value=fake_client)
+    save = mocker.patch.object(service, "save_overlay_spans", return_value=True)
+    mocker.patch.object(service, "create_job", return_value="job-1")
+    update_job = mocker.patch.object(service, "update_job")
+    submit = mocker.patch.object(service._job_executor, "submit")
+
+    result = service.preview_book_service(123, "mystery", 7, paragraphs=2)
+    assert result == {"text": "REWRITTEN", "style": "mystery", "job_id": "job-1"}
+    # Only the heading and first paragraph went into the synchronous call.
+    assert "First." in prompts[0][0] and "Second." not in prompts[0][0]
+    assert prompts[0][1] <= service.PREVIEW_MAX_TOKENS
+    assert openai.call_args.kwargs["max_retries"] == 0
+    assert save.call_args.args[4] == {0: (19, "REWRITTEN\n\n")}
+
+    # The rest of chapter 1 and all of chapter 2 are finished in the background.
+    job = submit.call_args
+    assert job.kwargs["job_id"] == "job-1" and job.kwargs["user_id"] == 7
+    assert [text[start:end].split("\n")[0] for start, end in job.kwargs["pieces"]] == ["Second.", "Chapter 2"]
+    job.args[0](**job.kwargs)
+    assert save.call_count == 3
+    assert update_job.call_args_list[-1].kwargs == {"status": "done"}
+
+
+# ----------------------------
+# Test: Prompt layout for prefix caching
+# ----------------------------
+def test_prompt_prefix_is_shared_across_styles():
+    from services.edit_book_service import build_messages
+    from services.style_presets import resolve_style
+
+    mystery = build_messages("Once upon a time.", resolve_style("mystery"))
+    fantasy = build_messages("Once upon a time.", resolve_style("fantasy"))
+    # Everything but the final style instruction is identical.
+    assert mystery[:-1] == fantasy[:-1]
+    assert mystery[-1] != fantasy[-1]
+    assert "Once upon a time." in mystery[1]["content"]
+
+
+def test_rewrite_records_cached_tokens(mocker, fake_usage_record):
+    from services.edit_book_service import rewrite_text
+    from services.style_presets import resolve_style
+    from mappers.llm_usage_mapper import usage_counts
+
+    usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=300,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1536))
+    create = mocker.Mock(return_value=completion_stream("Rewritten", usage))
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    assert rewrite_text(client, "Text", resolve_style("mystery"), book_serial=5, cache_key="book-5-0") == "Rewritten"
+    assert create.call_args.kwargs["prompt_cache_key"] == "book-5-0"
+    book_serial, style, model, recorded_usage, latency_ms = fake_usage_record.call_args.args
+    assert (book_serial, style, model) == (5, "mystery", "gpt-4o")
+    assert fake_usage_record.call_args.kwargs["hedged"] is False
+    assert usage_counts(recorded_usage) == {"prompt_tokens": 2000, "cached_tokens": 1536, "completion_tokens": 300}
+    assert usage_counts(None) == {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+
+def test_rewrite_is_refused_over_quota_and_refunds_unused_tokens(mocker, token_quotas):
+    from services.token_quota import QuotaExceeded, QuotaTooSmall
+
+    mocker.patch("services.edit_book_service.get_book_by_serial",
+                 return_value={"book_serial": 123, "text": "Original text. " * 2000})
+    create = mocker.Mock(return_value=completion_stream(
+        "Rewritten", SimpleNamespace(prompt_tokens=900, completion_tokens=100)))
+    mocker.patch("services.edit_book_service.OpenAI",
+                 return_value=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    mocker.patch("services.edit_book_service.save_overlay_spans", return_value=True)
+    mocker.patch("services.edit_book_service.get_overlay", return_value=None)
+
+    # Other rewrites have most of the day's quota reserved
+    other = token_quotas.reserve(7, 95000)
+    with pytest.raises(QuotaExceeded):
+        edit_book_service(123, "mystery", 7)
+    assert not create.called
+    other.settle()
+
+    # More than a whole day's quota is refused as too large rather than "try tomorrow"
+    token_quotas.limits["day"] = 5000
+    with pytest.raises(QuotaTooSmall):
+        edit_book_service(123, "mystery", 7)
+    assert not create.called
+
+    token_quotas.limits["day"] = 100000
+    assert edit_book_service(123, "mystery", 7)
+    # The estimate was reserved, then settled to the 1000 tokens each call actually used
+    # (the chapter is too long for one call).
+    assert create.call_count == 3
+    assert token_quotas.usage(7)["day"]["used"] == 3000
+
+
+def test_preview_is_refused_while_the_job_queue_is_full(mocker):
+    import threading
+    from services import edit_book_service as service
+    from services.admission_control import Overloaded
+
+    text = "Chapter 1\n\nFirst.\n\nChapter 2\n\nMore."
+    mocker.patch.object(service, "get_book_by_serial", return_value={"book_serial": 123, "text": text})
+    create = mocker.Mock(return_value=completion_stream("REWRITTEN"))
+    mocker.patch.object(service, "OpenAI",
+                        return_value=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    mocker.patch.object(service, "save_overlay_spans", return_value=True)
+    mocker.patch.object(service, "create_job", return_value="job-1")
+    mocker.patch.object(service, "update_job")
+    mocker.patch.object(service, "_job_slots", threading.BoundedSemaphore(1))
+    submit = mocker.patch.object(service._job_executor, "submit")
+
+    assert service.preview_book_service(123, "mystery", 7)["job_id"] == "job-1"
+    create.reset_mock()
+    with pytest.raises(Overloaded) as shed:
+        service.preview_book_service(123, "mystery", 7)
+    assert shed.value.reason == "rewrite queue full"
+    assert not create.called
+
+    # The slot is free again once the job ends
+    submit.call_args.args[0](**submit.call_args.kwargs)
+    assert service.preview_book_service(123, "mystery", 7)["job_id"] == "job-1"
+
+
+def test_background_rewrites_are_requeued_until_admitted(mocker):
+    from services import edit_book_service as service
+    from services.admission_control import AdmissionController
+
+    admission = AdmissionController(initial_limit=1, max_limit=1, max_queue=0)
+    mocker.patch.object(service, "rewrite_admission", admission)
+    in_flight = []
+
+    def fake_create(**kwargs):
+        in_flight.append(admission.metrics()["in_flight"])
+        return completion_stream("REWRITTEN")
+
+    def fake_save(*args):
+        if save.call_count == 1:
+            # A request takes the limit once the job's first call is done
+            admission.acquire()
+        return True
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    mocker.patch.object(service, "OpenAI", return_value=client)
+    save = mocker.patch.object(service, "save_overlay_spans", side_effect=fake_save)
+    update_job = mocker.patch.object(service, "update_job")
+    job_slots = mocker.patch.object(service, "_job_slots")
+    requeue = mocker.patch.object(service, "_requeue")
+    text = "Chapter 1\n\nFirst.\n\nChapter 2\n\nMore."
+
+    # The second piece is not admitted, so the job gives its worker back and is re-queued with it
+    service._complete_rewrite("job-1", 123, service.resolve_style("mystery"), 7, {"text": text},
+                              [(0, 19), (19, 38)])
+    assert save.call_count == 1 and requeue.call_count == 1
+    assert requeue.call_args.args[0] >= 1
+    assert requeue.call_args.kwargs["pieces"] == [(19, 38)]
+    assert not job_slots.release.called
+
+    admission.release()
+    service._complete_rewrite(**requeue.call_args.kwargs)
+    assert in_flight == [1, 1]
+    assert admission.metrics()["in_flight"] == 0
+    assert update_job.call_args_list[-1].kwargs == {"status": "done"}
+    assert job_slots.release.call_count == 1
+
+    # A job deferred for longer than REWRITE_JOB_ADMISSION_TIMEOUT fails instead
+    admission.acquire()
+    requeue.reset_mock()
+    service._complete_rewrite("job-2", 123, service.resolve_style("mystery"), 7, {"text": text}, [(0, 19)],
+                              deferred_at=service.time.monotonic() - service.REWRITE_JOB_ADMISSION_TIMEOUT)
+    assert not requeue.called
+    assert update_job.call_args_list[-1].kwargs["status"] == "failed"
+    assert job_slots.release.call_count == 2
+
+
+def test_long_chapters_are_split_to_fit_the_output_budget(mocker):
+    from services import edit_book_service as service
+    from services.style_presets import MAX_OUTPUT_TOKENS, max_passage_chars
+
+    preset = service.resolve_style("mystery")
+    limit = max_passage_chars(preset)
+    paragraph = "A sentence of the chapter. " * 40 + "\n\n"
+    # No headings, so the whole book is one chapter
+    text = paragraph * (3 * limit // len(paragraph))
+    pieces = service.split_passage(text, 0, len(text), preset)
+    assert len(pieces) > 2 and pieces[0][0] == 0 and pieces[-1][1] == len(text)
+    assert all(end - start <= limit and text[start:end].endswith("\n\n") for start, end in pieces)
+    assert all(previous[1] == following[0] for previous, following in zip(pieces, pieces[1:]))
+    # A paragraph longer than the limit is cut at a space
+    words = service.split_passage("word " * limit, 0, 5 * limit, preset)
+    assert len(words) >= 5 and all(("word " * limit)[end - 1] == " " for _, end in words[:-1])
+
+    mocker.patch.object(service, "get_book_by_serial", return_value={"book_serial": 123, "text": text})
+    create = mocker.Mock(return_value=completion_stream("REWRITTEN"))
+    mocker.patch.object(service, "OpenAI",
+                        return_value=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    save = mocker.patch.object(service, "save_overlay_spans", return_value=True)
+    mocker.patch.object(service, "get_overlay", return_value=None)
+    mocker.patch.object(service, "token_quotas").reserve.return_value = mocker.Mock()
+
+    assert service.edit_book_service(123, "mystery", 7)
+    assert create.call_count == len(pieces)
+    assert all(call.kwargs["max_tokens"] <= MAX_OUTPUT_TOKENS for call in create.call_args_list)
+    assert sorted(save.call_args.args[4]) == [start for start, _ in pieces]
+
+
+def test_chapters_in_flight_are_capped_per_request(mocker):
+    import threading
+    from services import edit_book_service as service
+
+    mocker.patch.object(service, "REWRITE_REQUEST_WINDOW", 2)
+    text = "".join(f"Chapter {number}\n\nText {number}.\n\n" for number in range(1, 7))
+    mocker.patch.object(service, "get_book_by_serial", return_value={"book_serial": 123, "text": text})
+    lock = threading.Lock()
+    running, most = [0], [0]
+
+    def fake_create(**kwargs):
+        with lock:
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+        threading.Event().wait(0.02)
+        with lock:
+            running[0] -= 1
+        return completion_stream("REWRITTEN")
+    mocker.patch.object(service, "OpenAI", return_value=SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create))))
+    save = mocker.patch.object(service, "save_overlay_spans", return_value=True)
+    mocker.patch.object(service, "get_overlay", return_value=None)
+
+    assert service.edit_book_service(123, "mystery", 7)
+    assert len(save.call_args.args[4]) == 6
+    assert most[0] == 2
+
+
+def test_rewrite_stops_waiting_at_the_deadline(mocker, token_quotas):
+    import threading
+    from services import edit_book_service as service
+
+    mocker.patch.object(service, "REWRITE_REQUEST_TIMEOUT", 0.2)
+    mocker.patch.object(service, "get_book_by_serial",
+                        return_value={"book_serial": 123, "text": "Chapter 1\n\nFirst.\n"})
+    answer = threading.Event()
+
+    def fake_create(**kwargs):
+        answer.wait(5)
+        return completion_stream("REWRITTEN", SimpleNamespace(prompt_tokens=900, completion_tokens=100))
+    mocker.patch.object(service, "OpenAI", return_value=SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create))))
+    save = mocker.patch.object(service, "save_overlay_spans", return_value=True)
+
+    with pytest.raises(TimeoutError):
+        service.edit_book_service(123, "mystery", 7)
+    assert not save.called
+    assert token_quotas.usage(7)["day"]["used"] == 0
+
+    # The call still running when the request gave up is charged once it ends
+    answer.set()
+    for _ in range(500):
+        if not service.rewrite_admission.metrics()["in_flight"]:
+            break
+        threading.Event().wait(0.01)
+    assert token_quotas.usage(7)["day"]["used"] == 1000
+
+
+def test_each_chapter_call_is_admitted(mocker):
+    from services import edit_book_service as service
+    from services.admission_control import AdmissionController, Overloaded
+
+    admission = AdmissionController(initial_limit=1, max_limit=1, max_queue=1, queue_timeout=0.5)
+    mocker.patch.object(service, "rewrite_admission", admission)
+    text = "Chapter 1\n\nFirst.\n\nChapter 2\n\nSecond.\n"
+    mocker.patch.object(service, "get_book_by_serial", return_value={"book_serial": 123, "text": text})
+    create = mocker.Mock(return_value=completion_stream("REWRITTEN"))
+    mocker.patch.object(service, "OpenAI",
+                        return_value=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    mocker.patch.object(service, "save_overlay_spans", return_value=True)
+    mocker.patch.object(service, "get_overlay", return_value=None)
+
+    # With a limit of one the chapters run one after the other, each admitted on its own
+    assert service.edit_book_service(123, "mystery", 7)
+    assert create.call_count == 2
+    assert admission.metrics()["admitted"] == 2 and admission.metrics()["in_flight"] == 0
+
+    # A chapter that cannot be admitted in time sheds the request
+    admission.acquire()
+    with pytest.raises(Overloaded):
+        service.edit_book_service(123, "mystery", 7)
+    assert create.call_count == 2
+
+
+def test_cancelled_hedge_attempt_is_recorded_and_charged(mocker, fake_usage_record, token_quotas):
+    from services import edit_book_service as service
+
+    cancelled = {"model": "gpt-4o", "usage": SimpleNamespace(prompt_tokens=250, completion_tokens=0),
+                 "estimated": True}
+    mocker.patch.object(service, "hedged_completion", return_value=(
+        "Rewritten", SimpleNamespace(prompt_tokens=250, completion_tokens=50),
+        {"model": "gpt-4o-mini", "hedged": True, "hedge_won": True, "first_token_ms": 900.0,
+         "hedge_delay_ms": 800.0, "saved_ms": 1200.0, "cancelled_attempts": [cancelled]}))
+    reservation = token_quotas.reserve(7, 1000)
+
+    service.rewrite_text(None, "Text", service.resolve_style("mystery"), book_serial=5, user_id=7,
+                         reservation=reservation)
+
+    won, lost = fake_usage_record.call_args_list
+    assert won.args[2] == "gpt-4o-mini" and "outcome" not in won.kwargs
+    assert lost.args[2:4] == ("gpt-4o", cancelled["usage"])
+    assert lost.kwargs == {"user_id": 7, "outcome": "hedge_cancelled", "estimated": True}
+    assert reservation.consumed == 550
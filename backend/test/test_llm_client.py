@@ -0,0 +1,119 @@
+import sys
+import os
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from openai import OpenAI
+from fake_llm_server import FakeLLMServer
+from services.llm_client import MIN_TTFT_SAMPLES, CompletionTruncated, HedgePolicy, hedged_completion
+
+MESSAGES = [{"role": "user", "content": "Rewrite this."}]
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**kwargs):
+        server = FakeLLMServer(**kwargs)
+        servers.append(server)
+        return server, OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_slow_request_is_hedged_to_fallback_model(fake_server):
+    # The test waits for the primary's cancellation, not for its first token
+    server, client = fake_server(first_token_delays={"gpt-4o": [30.0]})
+    policy = HedgePolicy(max_delay=0.1, budget=1.0)
+
+    text, usage, stats = hedged_completion(client, "gpt-4o", MESSAGES, policy, fallback_model="gpt-4o-mini")
+    assert text == "Rewritten by the fake model."
+    assert usage.prompt_tokens == 100
+    assert server.requests == ["gpt-4o", "gpt-4o-mini"]
+    assert stats["model"] == "gpt-4o-mini"
+    assert stats["hedged"] and stats["hedge_won"]
+    assert stats["saved_ms"] > 0
+    # The primary was cancelled while still waiting for its first token
+    assert server.wait_disconnected("gpt-4o")
+    assert server.disconnected == ["gpt-4o"]
+    # It is billed for its prompt all the same, estimated as it never got its usage
+    [cancelled] = stats["cancelled_attempts"]
+    assert cancelled["model"] == "gpt-4o" and cancelled["estimated"]
+    assert (cancelled["usage"].prompt_tokens, cancelled["usage"].completion_tokens) == (3, 0)
+
+
+def test_fast_request_is_not_hedged(fake_server):
+    server, client = fake_server()
+    text, _, stats = hedged_completion(client, "gpt-4o", MESSAGES, HedgePolicy(max_delay=1.0, budget=1.0))
+    assert text == "Rewritten by the fake model."
+    assert server.requests == ["gpt-4o"]
+    assert not stats["hedged"] and stats["saved_ms"] == 0
+    assert stats["cancelled_attempts"] == []
+
+
+def test_completion_cut_off_at_max_tokens_fails(fake_server):
+    server, client = fake_server()
+    policy = HedgePolicy(max_delay=1.0, budget=1.0)
+    with pytest.raises(CompletionTruncated) as truncated:
+        hedged_completion(client, "gpt-4o", MESSAGES, policy, max_tokens=2)
+    # The cut-off text is billed all the same
+    assert (truncated.value.usage.prompt_tokens, truncated.value.usage.completion_tokens) == (100, 2)
+
+    text, _, _ = hedged_completion(client, "gpt-4o", MESSAGES, policy, max_tokens=50)
+    assert text == "Rewritten by the fake model."
+
+
+def test_truncated_rewrite_is_recorded_charged_and_not_saved(fake_server, mocker):
+    from services import edit_book_service as service
+    from services.token_quota import TokenQuotas
+
+    class EmptyStore:
+        def get_usage(self, keys):
+            return dict.fromkeys(keys, 0)
+
+        def add_usage(self, deltas):
+            pass
+    quotas = TokenQuotas({"day": 100000}, flush_seconds=3600, store=EmptyStore())
+    mocker.patch.object(service, "token_quotas", quotas)
+    record = mocker.patch.object(service, "record_llm_call")
+    save = mocker.patch.object(service, "save_overlay_spans", return_value=True)
+    mocker.patch.object(service, "get_book_by_serial", return_value={"book_serial": 5, "text": "One chapter."})
+    server, client = fake_server(reply=" ".join(["word"] * 300))
+    mocker.patch.object(service, "OpenAI", return_value=client)
+
+    # The reply is longer than the 256 tokens allowed for so short a chapter
+    assert service.edit_book_service(5, "mystery", 7) is None
+    assert not save.called
+    assert record.call_args.kwargs["outcome"] == "CompletionTruncated"
+    assert quotas.usage(7)["day"]["used"] == 100 + 256
+
+
+def test_primary_wins_when_hedge_is_slower(fake_server):
+    server, client = fake_server(first_token_delays={"gpt-4o": [0.3, 3.0]})
+    _, _, stats = hedged_completion(client, "gpt-4o", MESSAGES, HedgePolicy(max_delay=0.1, budget=1.0))
+    assert server.requests == ["gpt-4o", "gpt-4o"]
+    assert stats["hedged"] and not stats["hedge_won"]
+
+
+def test_budget_caps_duplicate_requests(fake_server):
+    server, client = fake_server(first_token_delays={"gpt-4o": [0.2] * 10})
+    policy = HedgePolicy(max_delay=0.05, budget=0.25)
+    hedged = [hedged_completion(client, "gpt-4o", MESSAGES, policy)[2]["hedged"] for _ in range(4)]
+    # Four requests earn one hedge between them.
+    assert hedged == [False, False, False, True]
+
+
+def test_hedge_delay_follows_recent_first_token_times():
+    policy = HedgePolicy(percentile=90, min_delay=0.05, max_delay=5.0)
+    assert policy.delay("gpt-4o") == 5.0
+    for i in range(MIN_TTFT_SAMPLES * 5):
+        policy.record_first_token("gpt-4o", 0.1 if i % 10 else 1.0)
+    assert policy.delay("gpt-4o") == 1.0
+    for _ in range(500):
+        policy.record_first_token("gpt-4o", 0.01)
+    assert policy.delay("gpt-4o") == 0.05
@@ -0,0 +1,102 @@
+import sys
+import os
+import time
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from mappers.llm_usage_mapper import LedgerWriter
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(list(documents))
+
+
+def test_ledger_writes_in_batches_off_the_caller_thread():
+    collection = FakeCollection()
+    writer = LedgerWriter(collection, batch_size=3, flush_seconds=60, max_pending=100)
+    for i in range(3):
+        writer.append({"i": i})
+    # A full batch wakes the writer thread without waiting for flush_seconds.
+    deadline = time.monotonic() + 5
+    while not collection.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert collection.batches == [[{"i": 0}, {"i": 1}, {"i": 2}]]
+
+    writer.append({"i": 3})
+    assert len(collection.batches) == 1
+    writer.flush()
+    assert collection.batches[-1] == [{"i": 3}]
+
+
+def test_ledger_drops_calls_beyond_max_pending():
+    collection = FakeCollection()
+    writer = LedgerWriter(collection, batch_size=100, flush_seconds=60, max_pending=2)
+    for i in range(5):
+        writer.append({"i": i})
+    assert writer.dropped == 3
+    writer.flush()
+    assert collection.batches == [[{"i": 0}, {"i": 1}]]
+
+
+class FailingCollection(FakeCollection):
+    """Fails every write until `down` is cleared."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = True
+        self.while_failing = None
+
+    def insert_many(self, documents, ordered=True):
+        if self.down:
+            if self.while_failing:
+                self.while_failing()
+            raise ConnectionError("MongoDB is down")
+        super().insert_many(documents, ordered)
+
+
+def test_ledger_keeps_failed_batches_up_to_max_pending():
+    collection = FailingCollection()
+    writer = LedgerWriter(collection, batch_size=2, flush_seconds=60, max_pending=3)
+    for i in range(3):
+        writer.append({"i": i})
+    writer.flush()
+    assert collection.batches == []
+    assert writer.dropped == 0
+
+    # The failed calls are still pending, so only one more fits
+    writer.append({"i": 3})
+    writer.flush()
+    assert writer.dropped == 1
+
+    # Calls recorded while a write is failing share the same bound
+    collection.while_failing = lambda: writer.append({"i": 4})
+    writer.flush()
+    assert writer.dropped == 2
+
+    collection.down = False
+    writer.flush()
+    assert collection.batches == [[{"i": 0}, {"i": 1}], [{"i": 2}]]
+
+
+def test_ledger_requeues_only_what_a_partial_write_did_not_store():
+    from pymongo.errors import BulkWriteError
+
+    class PartialCollection(FakeCollection):
+        def insert_many(self, documents, ordered=True):
+            if not self.batches:
+                self.batches.append([])
+                raise BulkWriteError({"writeErrors": [{"index": 1, "code": 91}, {"index": 2, "code": 11000}]})
+            super().insert_many(documents, ordered)
+
+    collection = PartialCollection()
+    writer = LedgerWriter(collection, batch_size=3, flush_seconds=60, max_pending=10)
+    for i in range(3):
+        writer.append({"i": i})
+    writer.flush()
+    writer.flush()
+    assert collection.batches[-1] == [{"i": 1}]
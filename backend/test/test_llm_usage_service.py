@@ -0,0 +1,87 @@
+import sys
+import os
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services import llm_usage_service
+
+
+def test_prompt_cache_report(mocker):
+    mocker.patch.object(llm_usage_service, "prompt_cache_stats", return_value=[
+        {"_id": {"book_serial": 1, "cached": False}, "calls": 2, "prompt_tokens": 4000, "cached_tokens": 0,
+         "latency_ms": 9000.0},
+        {"_id": {"book_serial": 1, "cached": True}, "calls": 3, "prompt_tokens": 6000, "cached_tokens": 4500,
+         "latency_ms": 9000.0},
+        {"_id": {"book_serial": 2, "cached": False}, "calls": 1, "prompt_tokens": 500, "cached_tokens": 0,
+         "latency_ms": 800.0},
+    ])
+    report = llm_usage_service.prompt_cache_report()
+    assert [book["book_serial"] for book in report] == [1, 2]
+    assert report[0]["hit_rate"] == 0.45
+    assert (report[0]["cached_latency_ms"], report[0]["uncached_latency_ms"]) == (3000.0, 4500.0)
+    assert report[0]["saved_ms"] == 4500
+    assert report[1]["saved_ms"] is None and report[1]["hit_rate"] == 0.0
+
+
+def test_hedge_report(mocker):
+    mocker.patch.object(llm_usage_service, "hedge_stats", return_value=[
+        {"_id": "gpt-4o-mini", "calls": 4, "hedged": 4, "hedge_won": 3, "latency_ms": 4000.0, "saved_ms": 6000.0},
+        {"_id": "gpt-4o", "calls": 36, "hedged": 2, "hedge_won": 0, "latency_ms": 72000.0, "saved_ms": 0},
+    ])
+    report = llm_usage_service.hedge_report()
+    assert [model["model"] for model in report] == ["gpt-4o", "gpt-4o-mini"]
+    assert report[1]["hedge_rate"] == 1.0 and report[1]["win_rate"] == 0.75
+    assert report[0]["mean_latency_ms"] == 2000.0 and report[1]["saved_ms"] == 6000
+
+
+def test_record_llm_call_estimates_cost(mocker):
+    from types import SimpleNamespace
+
+    append = mocker.patch.object(llm_usage_service, "append_llm_call")
+    usage = SimpleNamespace(prompt_tokens=3000, completion_tokens=500,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=2000))
+    llm_usage_service.record_llm_call(5, "mystery", "gpt-4o", usage, 1234.56, user_id=7, first_token_ms=300.0)
+    document = append.call_args.args[0]
+    # 1000 uncached, 2000 cached and 500 completion tokens at gpt-4o prices
+    assert document["cost_usd"] == 0.0100
+    assert (document["user_id"], document["outcome"], document["latency_ms"]) == (7, "ok", 1234.6)
+    assert document["first_token_ms"] == 300.0
+
+    llm_usage_service.record_llm_call(5, "mystery", "some-model", None, 50, outcome="RateLimitError")
+    document = append.call_args.args[0]
+    assert document["outcome"] == "RateLimitError"
+    assert document["cost_usd"] is None and document["prompt_tokens"] == 0
+
+
+def test_usage_report(mocker):
+    import pytest
+
+    usage_by = mocker.patch.object(llm_usage_service, "usage_by", return_value=[
+        {"_id": "mystery", "calls": 10, "errors": 1, "prompt_tokens": 8000, "cached_tokens": 2000,
+         "completion_tokens": 1000, "cost_usd": 0.0375, "latency_ms": 2100.04, "first_token_ms": None},
+    ])
+    report = llm_usage_service.usage_report("style", limit=5)
+    assert usage_by.call_args.args == ("style", None, None, 5)
+    assert report == [{"key": "mystery", "calls": 10, "errors": 1, "prompt_tokens": 8000, "cached_tokens": 2000,
+                       "completion_tokens": 1000, "cost_usd": 0.0375, "cache_hit_rate": 0.25,
+                       "mean_latency_ms": 2100.0, "mean_first_token_ms": None}]
+    with pytest.raises(ValueError):
+        llm_usage_service.usage_report("colour")
+
+
+def test_usage_endpoint_is_admin_only(mocker):
+    from flask import Flask
+    from controllers.llm_usage_controller import llm_usage_bp
+
+    mocker.patch("controllers.debug_controller.ADMIN_TOKEN", "secret")
+    mocker.patch("controllers.llm_usage_controller.usage_report", return_value=[])
+    app = Flask(__name__)
+    app.register_blueprint(llm_usage_bp)
+    client = app.test_client()
+
+    assert client.get("/llm-usage?group_by=user").status_code == 403
+    assert client.get("/llm-usage?group_by=user", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get("/llm-usage?group_by=user", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.get_json() == {"group_by": "user", "rows": []}
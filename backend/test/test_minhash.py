@@ -0,0 +1,71 @@
+import sys
+import os
+import random
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from mappers import book_similarity_mapper
+from services import minhash
+from services.minhash import fingerprint, from_bytes, signature, similarity
+
+
+def make_text(seed, words=3000):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(["word%d" % i for i in range(500)]) for _ in range(words))
+
+
+def test_signature_identical_and_case_insensitive():
+    text = make_text(1)
+    assert similarity(signature(text), signature(text.upper())) == 1.0
+
+
+def test_signature_separates_near_duplicates_from_unrelated_texts():
+    original = make_text(1)
+    edition = original + " a preface added to this edition"
+    unrelated = make_text(2)
+    assert similarity(signature(original), signature(edition)) > 0.9
+    assert similarity(signature(original), signature(unrelated)) < 0.1
+
+
+def test_signature_does_not_depend_on_chunk_boundaries(mocker):
+    text = make_text(3, words=100)
+    expected = signature(text)
+    mocker.patch.object(minhash, "_CHUNK", 7)
+    assert (signature(text) == expected).all()
+
+
+def test_texts_without_shingles_get_no_fingerprint(mocker):
+    assert signature("") is None
+    assert signature("Call me Ishmael") is None
+    assert signature("Call me Ishmael, said he") is not None
+    assert fingerprint("Once..") == {"minhash": None, "lsh_bands": []}
+
+    books = mocker.patch.object(book_similarity_mapper, "books_collection")
+    assert book_similarity_mapper.find_similar(fingerprint("")) == []
+    books.find.assert_not_called()
+
+
+def test_fingerprint_round_trips():
+    fields = fingerprint(make_text(4))
+    assert len(fields["minhash"]) == minhash.NUM_PERM * 4
+    assert len(fields["lsh_bands"]) == minhash.BANDS
+    assert (from_bytes(fields["minhash"]) == signature(make_text(4))).all()
+
+
+def test_find_similar_ranks_band_candidates(mocker):
+    original = make_text(5)
+    candidates = [
+        {"book_serial": 2, "title": "Unrelated", "author": "B", **fingerprint(make_text(6))},
+        {"book_serial": 3, "title": "Edition", "author": "A", **fingerprint(original + " with notes")},
+        {"book_serial": 4, "title": "Legacy", "author": "C"},
+    ]
+    books = mocker.patch.object(book_similarity_mapper, "books_collection")
+    books.find.return_value.limit.return_value = candidates
+
+    book_fingerprint = fingerprint(original)
+    matches = book_similarity_mapper.find_similar(book_fingerprint, 0.5, exclude_serial=1)
+    assert [match["book_serial"] for match in matches] == [3]
+    assert matches[0]["similarity"] > 0.9
+    query = books.find.call_args.args[0]
+    assert query == {"lsh_bands": {"$in": book_fingerprint["lsh_bands"]}, "book_serial": {"$ne": 1}}
@@ -6,6 +6,7 @@ import pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
 
 import json
+from contextlib import nullcontext
 from flask import Flask
 from pymongo.errors import DuplicateKeyError
 
@@ -24,6 +25,25 @@ def client(app):
     return app.test_client()
 
 
+@pytest.fixture(autouse=True)
+def fake_change_stamp(mocker):
+    # Keep the change-feed counter out of these tests.
+    return mocker.patch("controllers.mongo_db_controller.book_change",
+                        return_value=nullcontext({"change_seq": 1, "updated_at": "2024-01-01T00:00:00Z"}))
+
+
+@pytest.fixture(autouse=True)
+def fake_facets(mocker):
+    # Keep the facet rollup out of these tests.
+    return mocker.patch("controllers.mongo_db_controller.record_added_books")
+
+
+@pytest.fixture(autouse=True)
+def fake_similar(mocker):
+    # No near-duplicates unless a test says otherwise.
+    return mocker.patch("controllers.mongo_db_controller.find_similar", return_value=[])
+
+
 def test_create_book_success(client, mocker):
     # Prepare valid book data.
     book_data = {
@@ -68,12 +88,18 @@ def test_get_books(client, mocker):
         {"_id": "1", "book_serial": 12345, "title": "Book One", "author": "John Doe"},
         {"_id": "2", "book_serial": 67890, "title": "Book Two", "author": "Jane Doe"}
     ]
-    mocker.patch.object(books_collection, "find", return_value=sample_books)
+    find = mocker.patch.object(books_collection, "find")
+    find.return_value.sort.return_value = sample_books
     response = client.get("/books")
     assert response.status_code == 200
     json_data = response.get_json()
     assert isinstance(json_data, list)
     assert len(json_data) == 2
+    # Listed in book_serial order unless asked otherwise, as the MySQL catalog is
+    find.return_value.sort.assert_called_once_with([("book_serial", 1)])
+
+    client.get("/books?sort=-title")
+    find.return_value.sort.assert_called_with([("title", -1), ("book_serial", 1)])
 
 
 def test_get_book_by_serial_success(client, mocker):
@@ -175,3 +201,234 @@ def test_create_book_unexpected_error(client, mocker):
     data = response.get_json()
     assert data["message"] == "Failure"
     assert "boom" in data["error"]
+
+
+def make_ndjson(*books):
+    return "\n".join(json.dumps(book) for book in books).encode()
+
+
+def test_bulk_create_books(client, mocker):
+    from pymongo.errors import BulkWriteError
+    from services import book_ingest_service
+
+    books = [
+        {"book_serial": 1, "title": "One", "author": "A", "publication_date": "2024-01-01",
+         "tags": "Drama", "rating": "PG", "total_chapters": 1, "text": "one two three"},
+        {"book_serial": 2, "title": "Two", "author": "B", "publication_date": "2024-01-01",
+         "tags": "Drama", "rating": "PG", "total_chapters": 1, "text": "four"},
+        {"book_serial": 3, "author": "C"},
+    ]
+    # The second book collides with an existing book_serial.
+    insert = mocker.patch.object(
+        book_ingest_service.book_mapper, "insert_books",
+        side_effect=BulkWriteError({"nInserted": 1, "writeErrors": [
+            {"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"}]})
+    )
+    response = client.post("/books/bulk", data=make_ndjson(*books) + b"\nnot json",
+                           content_type="application/x-ndjson")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["inserted"] == 1
+    assert data["duplicates"] == [{"line": 2, "book_serial": 2}]
+    assert [error["line"] for error in data["errors"]] == [3, 4]
+    # Word counts are computed server-side.
+    inserted = insert.call_args[0][0]
+    assert inserted[0]["total_word_count"] == 3
+
+
+def test_bulk_create_books_gzip(client, mocker):
+    import gzip
+    from services import book_ingest_service
+
+    book = {"book_serial": 7, "title": "Zip", "author": "A", "publication_date": "2024-01-01",
+            "tags": "Drama", "rating": "PG", "total_chapters": 1, "text": "compressed text"}
+    mocker.patch.object(book_ingest_service.book_mapper, "insert_books", return_value=1)
+    response = client.post("/books/bulk", data=gzip.compress(make_ndjson(book)),
+                           headers={"Content-Encoding": "gzip"}, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert response.get_json()["inserted"] == 1
+
+    response = client.post("/books/bulk", data=b"not gzip", headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+    # A cut-off upload ends the stream early (EOFError)
+    truncated = gzip.compress(make_ndjson(book) * 50)[:-20]
+    response = client.post("/books/bulk", data=truncated, headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+    # A damaged deflate stream (zlib.error)
+    damaged = bytearray(gzip.compress(make_ndjson(book) * 50))
+    damaged[12:40] = b"\xff" * 28
+    response = client.post("/books/bulk", data=bytes(damaged), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+
+def test_get_books_batch_preserves_request_order(client, mocker):
+    found = [
+        {"_id": "2", "book_serial": 67890, "title": "Book Two"},
+        {"_id": "1", "book_serial": 12345, "title": "Book One"},
+    ]
+    find = mocker.patch.object(books_collection, "find", return_value=found)
+
+    response = client.post("/books/batch", json={"serials": [12345, 99999, 67890], "fields": ["title"]})
+    assert response.status_code == 200
+    books = response.get_json()["books"]
+    assert [book["book_serial"] for book in books] == [12345, 99999, 67890]
+    assert books[1]["error"] == "Book not found"
+    assert books[2]["title"] == "Book Two"
+
+    # One $in query with the requested projection.
+    query, projection = find.call_args.args
+    assert sorted(query["book_serial"]["$in"]) == [12345, 67890, 99999]
+    assert projection == {"title": 1, "book_serial": 1}
+
+
+def test_get_books_batch_invalid_request(client):
+    assert client.post("/books/batch", json={}).status_code == 400
+    assert client.post("/books/batch", json={"serials": ["1"]}).status_code == 400
+    assert client.post("/books/batch", json={"serials": [1], "fields": ["$where"]}).status_code == 400
+    assert client.post("/books/batch", json={"serials": list(range(101))}).status_code == 400
+
+
+def test_create_book_stamps_change_seq(client, mocker):
+    book_data = {
+        "book_serial": 12345, "title": "Stamped", "author": "A", "publication_date": "2024-01-01",
+        "tags": "Drama", "rating": "PG", "total_chapters": 1, "total_word_count": 2, "text": "Two words"
+    }
+    insert = mocker.patch.object(books_collection, "insert_one")
+    client.post("/books", json=book_data)
+    assert insert.call_args.args[0]["change_seq"] == 1
+
+
+def test_get_book_changes_pages(client, mocker):
+    changes = [
+        {"book_serial": 1, "title": "One", "change_seq": 11, "deleted": False},
+        {"book_serial": 2, "change_seq": 12, "deleted": True},
+        {"book_serial": 3, "title": "Three", "change_seq": 13, "deleted": False},
+    ]
+    get_changes = mocker.patch("controllers.mongo_db_controller.get_changes_since", return_value=changes)
+
+    response = client.get("/books/changes?since=10&limit=2")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [change["book_serial"] for change in data["changes"]] == [1, 2]
+    assert data["next_token"] == "12"
+    assert data["has_more"] is True
+    # One extra row is fetched to detect another page.
+    get_changes.assert_called_once_with(10, 3)
+
+
+def test_get_book_changes_empty_keeps_token(client, mocker):
+    mocker.patch("controllers.mongo_db_controller.get_changes_since", return_value=[])
+    data = client.get("/books/changes?since=42").get_json()
+    assert data == {"changes": [], "next_token": "42", "has_more": False}
+    assert client.get("/books/changes?since=abc").status_code == 400
+
+
+def test_create_book_normalizes_tags(client, mocker, fake_facets):
+    book_data = {
+        "book_serial": 12345, "title": "Tagged", "author": "A", "publication_date": "2024-01-01",
+        "tags": "Fantasy,  Adventure , fantasy", "rating": "PG", "total_chapters": 1,
+        "total_word_count": 2, "text": "Two words"
+    }
+    insert = mocker.patch.object(books_collection, "insert_one")
+    client.post("/books", json=book_data)
+    stored = insert.call_args.args[0]
+    assert stored["tags"] == "Fantasy,  Adventure , fantasy"
+    assert stored["tag_list"] == ["fantasy", "adventure"]
+    fake_facets.assert_called_once()
+
+
+def test_get_books_filters_by_tag(client, mocker):
+    find = mocker.patch.object(books_collection, "find")
+    find.return_value.sort.return_value = []
+    client.get("/books?tag=Science%20Fiction&rating=PG")
+    assert find.call_args.args[0] == {"tag_list": "science fiction", "rating": "PG"}
+
+
+def test_get_book_facets(client, mocker):
+    facets = {"tags": {"fantasy": 2}, "ratings": {"PG": 2}}
+    mocker.patch("controllers.mongo_db_controller.get_facets", return_value=facets)
+    response = client.get("/books/facets")
+    assert response.status_code == 200
+    assert response.get_json() == facets
+
+
+def near_duplicate_book():
+    return {"book_serial": 777, "title": "Pride and Prejudice", "author": "Jane Austen",
+            "publication_date": "1813-01-28", "tags": "Classic", "rating": "PG",
+            "total_chapters": 61, "total_word_count": 5, "text": "It is a truth universally acknowledged"}
+
+
+def test_create_book_links_near_duplicate(client, mocker, fake_similar):
+    match = {"book_serial": 12, "title": "Pride and Prejudice", "author": "Jane Austen", "similarity": 0.95}
+    fake_similar.return_value = [match]
+    insert = mocker.patch.object(books_collection, "insert_one")
+
+    response = client.post("/books", json=near_duplicate_book())
+    assert response.status_code == 200
+    assert response.get_json()["near_duplicates"] == [match]
+    stored = insert.call_args.args[0]
+    assert stored["duplicate_of"] == 12
+    assert len(stored["minhash"]) == 512 and len(stored["lsh_bands"]) == 16
+    assert fake_similar.call_args.kwargs["exclude_serial"] == 777
+
+
+def test_create_book_rejects_near_duplicate(client, mocker, fake_similar):
+    fake_similar.return_value = [{"book_serial": 12, "title": "P", "author": "A", "similarity": 0.9}]
+    insert = mocker.patch.object(books_collection, "insert_one")
+
+    response = client.post("/books?duplicates=reject", json=near_duplicate_book())
+    assert response.status_code == 409
+    assert response.get_json()["near_duplicates"][0]["book_serial"] == 12
+    insert.assert_not_called()
+
+
+def test_create_book_duplicates_allow_skips_check(client, mocker, fake_similar):
+    insert = mocker.patch.object(books_collection, "insert_one")
+    response = client.post("/books?duplicates=allow", json=near_duplicate_book())
+    assert response.status_code == 200
+    fake_similar.assert_not_called()
+    assert "duplicate_of" not in insert.call_args.args[0]
+
+    assert client.post("/books?duplicates=maybe", json=near_duplicate_book()).status_code == 400
+
+
+def test_get_similar_books(client, mocker, fake_similar):
+    fingerprint = {"minhash": b"\x00" * 512, "lsh_bands": [1, 2]}
+    mocker.patch("controllers.mongo_db_controller.get_fingerprint", return_value=fingerprint)
+    fake_similar.return_value = [{"book_serial": 8, "title": "T", "author": "A", "similarity": 0.75}]
+
+    response = client.get("/books/7/similar?min_similarity=0.7&limit=500")
+    assert response.status_code == 200
+    assert response.get_json() == {"book_serial": 7, "similar": fake_similar.return_value}
+    fake_similar.assert_called_once_with(fingerprint, 0.7, 50, exclude_serial=7)
+
+
+def test_get_similar_books_errors(client, mocker):
+    mocker.patch("controllers.mongo_db_controller.get_fingerprint", return_value=None)
+    assert client.get("/books/7/similar").status_code == 404
+    assert client.get("/books/7/similar?min_similarity=2").status_code == 400
+    assert client.get("/books/7/similar?limit=x").status_code == 400
+
+
+def test_get_books_sorts_and_pages(client, mocker):
+    cursor = mocker.MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.skip.return_value = cursor
+    cursor.limit.return_value = iter([{"_id": "1", "book_serial": 1}])
+    find = mocker.patch.object(books_collection, "find", return_value=cursor)
+
+    response = client.get("/books?author=Jane%20Doe&sort=-publication_date&limit=10&offset=20")
+
+    assert response.status_code == 200
+    assert find.call_args.args[0] == {"author": "Jane Doe"}
+    cursor.sort.assert_called_once_with([("publication_date", -1), ("book_serial", 1)])
+    cursor.skip.assert_called_once_with(20)
+    cursor.limit.assert_called_once_with(10)
+
+
+def test_get_books_rejects_bad_sort_and_paging(client):
+    assert client.get("/books?sort=text").status_code == 400
+    assert client.get("/books?limit=ten").status_code == 400
+    assert client.get("/books?offset=-1").status_code == 400
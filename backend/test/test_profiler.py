@@ -0,0 +1,66 @@
+import sys
+import os
+import threading
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from flask import Flask
+from services import profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def client(mocker):
+    mocker.patch("controllers.debug_controller.ADMIN_TOKEN", "secret")
+    from controllers.debug_controller import debug_bp
+    app = Flask(__name__)
+    app.register_blueprint(debug_bp)
+    return app.test_client()
+
+
+def test_cpu_profile_samples_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        stacks = profiler.sample_stacks(0.2, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+    busy = [stack for stack in stacks if stack.startswith("busy;")]
+    assert busy and any("busy_loop (" in stack for stack in busy)
+    output = profiler.collapsed_output(stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in output.splitlines())
+
+
+def test_allocation_profile_finds_allocation_site():
+    kept = []
+
+    def allocate():
+        kept.append([bytearray(1024) for _ in range(200)])
+    timer = threading.Timer(0.05, allocate)
+    timer.start()
+    sizes = profiler.allocation_profile(0.3)
+    timer.join()
+    assert any(stack.endswith(f"{__file__}:{allocate.__code__.co_firstlineno + 1}") and size >= 200 * 1024
+               for stack, size in sizes.items())
+
+
+def test_profile_endpoint_requires_admin_token(client):
+    assert client.get('/debug/profile?seconds=0.05').status_code == 403
+    assert client.get('/debug/profile?seconds=0.05', headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get('/debug/profile?seconds=0.05', headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    assert client.get('/debug/profile?seconds=600', headers={"X-Admin-Token": "secret"}).status_code == 400
+
+
+def test_one_profile_at_a_time():
+    with profiler._profile_lock:
+        with pytest.raises(profiler.ProfilerBusy):
+            profiler.sample_stacks(0.01)
@@ -0,0 +1,83 @@
+import sys
+import os
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from flask import Flask, jsonify
+from services.rate_limiter import MemoryRateLimitStore, Rate, init_rate_limiter, parse_rate_limits, rate_limit
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    def ping():
+        return jsonify({"message": "pong"})
+
+    @app.route('/rewrite', methods=['PUT'])
+    @rate_limit("2 per minute")
+    def rewrite():
+        return jsonify({"message": "ok"})
+
+    init_rate_limiter(app, "5 per hour", MemoryRateLimitStore())
+    return app.test_client()
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("100 per hour") == [Rate(100, 3600)]
+    assert parse_rate_limits("10/minute; 1000 per 2 days") == [Rate(10, 60), Rate(1000, 172800)]
+    assert parse_rate_limits("") == []
+    with pytest.raises(ValueError):
+        parse_rate_limits("lots per hour")
+    with pytest.raises(ValueError):
+        parse_rate_limits("0 per second")
+
+
+def test_gcra_allows_burst_then_refills():
+    store = MemoryRateLimitStore()
+    rate = Rate(3, 60)
+    results = [store.hit("k", rate.interval, rate.period, 1000.0)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+    # One request's worth of capacity comes back every 20 seconds.
+    assert store.hit("k", rate.interval, rate.period, 1019.0)[0] is False
+    assert store.hit("k", rate.interval, rate.period, 1020.0)[0] is True
+
+
+def test_default_limit_headers_and_429(client):
+    remaining = []
+    for _ in range(5):
+        response = client.get('/ping')
+        assert response.status_code == 200
+        remaining.append(int(response.headers["RateLimit-Remaining"]))
+    assert remaining == [4, 3, 2, 1, 0]
+    assert response.headers["RateLimit-Limit"] == "5"
+    assert response.headers["RateLimit-Policy"] == "5;w=3600"
+
+    response = client.get('/ping')
+    assert response.status_code == 429
+    assert response.get_json()["message"] == "Rate limit exceeded"
+    assert 0 < int(response.headers["Retry-After"]) <= 720
+
+
+def test_route_limit_ignores_the_user_id_in_the_body(client):
+    assert client.put('/rewrite', json={"userId": "7"}).status_code == 200
+    response = client.put('/rewrite', json={"userId": "7"})
+    assert response.status_code == 200
+    # The tighter route limit is the one reported.
+    assert response.headers["RateLimit-Limit"] == "2"
+    # A new userId is no way around the limit
+    assert client.put('/rewrite', json={"userId": "8"}).status_code == 429
+
+
+def test_refused_requests_do_not_use_up_other_limits(client):
+    for _ in range(2):
+        assert client.put('/rewrite').status_code == 200
+    # Refused by the route limit, so these leave the default limit alone
+    for _ in range(5):
+        assert client.put('/rewrite').status_code == 429
+    response = client.get('/ping')
+    assert response.status_code == 200
+    assert response.headers["RateLimit-Remaining"] == "2"
@@ -0,0 +1,89 @@
+import sys
+import os
+from types import SimpleNamespace
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.recommendation_index import RecommendationIndex
+from services import recommendation_service
+
+BOOKS = [
+    {"book_serial": 1, "title": "Dune", "author": "Frank Herbert", "tags": "Science Fiction",
+     "text": "Spice desert sandworm Arrakis planet empire."},
+    {"book_serial": 2, "title": "Dune Messiah", "author": "Frank Herbert", "tags": "Science Fiction",
+     "text": "Emperor Paul spice desert prophecy."},
+    {"book_serial": 3, "title": "Emma", "author": "Jane Austen", "tags": "Romance, Fiction",
+     "text": "Matchmaking village society marriage."},
+    {"book_serial": 4, "title": "Persuasion", "author": "Jane Austen", "tags": "Romance, Fiction",
+     "text": "Navy captain marriage regret society."},
+]
+
+
+def test_similar_author_ranks_first():
+    index = RecommendationIndex.build(BOOKS)
+    assert index.matrix.shape == (4, index.dimensions)
+
+    vector = index.user_vector(fav_author="Jane Austen")
+    serials = [index.describe(row)["book_serial"] for _, row in index.top_k(vector, 2)]
+    assert sorted(serials) == [3, 4]
+
+
+def test_favorite_book_is_used_and_excluded():
+    index = RecommendationIndex.build(BOOKS)
+    vector = index.user_vector(fav_book="  dune ")
+    results = index.top_k(vector, 1, exclude_serials=[1])
+    assert index.describe(results[0][1])["book_serial"] == 2
+
+
+def test_empty_preferences_return_nothing():
+    index = RecommendationIndex.build(BOOKS)
+    assert index.top_k(index.user_vector(), 5) == []
+    assert RecommendationIndex.build([]).top_k(index.user_vector(fav_author="x"), 5) == []
+
+
+def test_recommend_books_excludes_favorite(mocker):
+    mocker.patch.object(recommendation_service, "get_index", return_value=RecommendationIndex.build(BOOKS))
+    user = SimpleNamespace(fav_book="Emma", fav_author="Jane Austen", preferred_genre="fiction")
+    results = recommendation_service.recommend_books(user, limit=1)
+    assert [result["book_serial"] for result in results] == [4]
+    assert results[0]["score"] > 0
+
+
+def test_history_shifts_ranking_and_is_excluded(mocker):
+    mocker.patch.object(recommendation_service, "get_index", return_value=RecommendationIndex.build(BOOKS))
+    user = SimpleNamespace(fav_book=None, fav_author="Jane Austen", preferred_genre=None)
+
+    without = recommendation_service.recommend_books(user, limit=4)
+    assert without[0]["book_serial"] in (3, 4)
+    with_history = recommendation_service.recommend_books(user, limit=4, history_serials=[1, 3])
+    serials = [result["book_serial"] for result in with_history]
+    assert 1 not in serials and 3 not in serials
+    # Having read Dune moves its sequel up
+    scores = {result["book_serial"]: result["score"] for result in without}
+    assert next(result["score"] for result in with_history if result["book_serial"] == 2) > scores[2]
+
+
+def test_concurrent_first_requests_build_the_index_once(mocker):
+    import threading
+    mocker.patch.object(recommendation_service, "_index", None)
+    started, release = threading.Event(), threading.Event()
+    built = RecommendationIndex.build(BOOKS)
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return built
+
+    build = mocker.patch.object(recommendation_service, "build_index", side_effect=slow_build)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(recommendation_service.get_index())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert build.call_count == 1
+    assert results == [built] * 4
@@ -0,0 +1,37 @@
+import sys
+import os
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from flask import Flask
+from controllers.search_controller import search_bp
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.register_blueprint(search_bp)
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def test_search_missing_query(client):
+    response = client.get("/search?q=%20")
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Missing search query"
+
+
+def test_search_success(client, mocker):
+    results = [{"book_serial": 1, "title": "Moby Dick", "author": "Herman Melville", "score": 3.2}]
+    search = mocker.patch("controllers.search_controller.search_books", return_value=results)
+    response = client.get("/search?q=white+whale&limit=500")
+    assert response.status_code == 200
+    assert response.get_json() == {"query": "white whale", "results": results}
+    search.assert_called_once_with("white whale", 50)
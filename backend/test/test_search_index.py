@@ -0,0 +1,120 @@
+import sys
+import os
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.search_index import SearchIndex, tokenize
+from services import search_service
+
+
+def make_index():
+    index = SearchIndex()
+    index.add({"book_serial": 1, "title": "Moby Dick", "author": "Herman Melville",
+               "tags": "Adventure", "text": "Call me Ishmael. The white whale swam on."})
+    index.add({"book_serial": 2, "title": "Pride and Prejudice", "author": "Jane Austen",
+               "tags": "Romance", "text": "It is a truth universally acknowledged."})
+    index.add({"book_serial": 3, "title": "Whale Tales", "author": "Anon",
+               "tags": "Nonfiction", "text": "Facts about every whale species. Whale songs."})
+    return index
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("The White Whale, and Ishmael!") == ["white", "whale", "ishmael"]
+
+
+def test_search_ranks_title_hits_first():
+    index = make_index()
+    results = [index.describe(doc)["book_serial"] for _, doc in index.search("whale")]
+    assert results == [3, 1]
+    assert index.search("the and") == []
+    assert index.search("zebra") == []
+
+
+def test_reindex_and_remove():
+    index = make_index()
+    index.add({"book_serial": 2, "title": "Pride and Prejudice", "author": "Jane Austen",
+               "tags": "Romance", "text": "A whale appears in this edition."})
+    assert {index.describe(doc)["book_serial"] for _, doc in index.search("whale")} == {1, 2, 3}
+    assert len(index) == 3
+
+    assert index.remove(3) is True
+    assert index.remove(3) is False
+    assert {index.describe(doc)["book_serial"] for _, doc in index.search("whale")} == {1, 2}
+
+
+def test_compact_preserves_results(tmp_path):
+    index = make_index()
+    index.remove(1)
+    before = {index.describe(doc)["book_serial"] for _, doc in index.search("whale austen")}
+    index.compact()
+    assert index.dead_ratio() == 0
+    assert len(index.serials) == 2
+    after = {index.describe(doc)["book_serial"] for _, doc in index.search("whale austen")}
+    assert before == after == {2, 3}
+
+    path = tmp_path / "index.pkl"
+    index.save(path)
+    loaded = SearchIndex.load(path)
+    assert [doc for _, doc in loaded.search("whale")] == [doc for _, doc in index.search("whale")]
+
+
+def test_refresh_index_applies_change_feed(mocker):
+    index = make_index()
+    index.last_change_seq = 10
+    changes = [
+        {"book_serial": 4, "change_seq": 11, "deleted": False},
+        {"book_serial": 1, "change_seq": 12, "deleted": True},
+    ]
+    mocker.patch.object(search_service, "get_changes_since", side_effect=[changes])
+    mocker.patch.object(search_service.book_mapper, "get_books_by_serials", return_value=[
+        {"book_serial": 4, "title": "The Whale Road", "author": "B", "tags": "", "text": "whale"}
+    ])
+
+    before = {index.describe(doc)["book_serial"] for _, doc in index.search("whale")}
+    refreshed = search_service.refresh_index(index)
+    assert refreshed.last_change_seq == 12
+    assert {refreshed.describe(doc)["book_serial"] for _, doc in refreshed.search("whale")} == {3, 4}
+    # The index being searched meanwhile is left as it was
+    assert index.last_change_seq == 10
+    assert {index.describe(doc)["book_serial"] for _, doc in index.search("whale")} == before
+
+
+def test_refresh_index_without_changes_keeps_the_index(mocker):
+    index = make_index()
+    mocker.patch.object(search_service, "get_changes_since", return_value=[])
+    assert search_service.refresh_index(index) is index
+
+
+def test_copies_do_not_write_to_shared_postings():
+    index = make_index()
+    copy = index.copy()
+    copy.add({"book_serial": 9, "title": "Whale Songs", "author": "C", "tags": "", "text": "whale whale"})
+    copy.remove(1)
+    assert 9 not in {index.describe(doc)["book_serial"] for _, doc in index.search("whale")}
+    assert 1 in {index.describe(doc)["book_serial"] for _, doc in index.search("whale")}
+    assert 9 in {copy.describe(doc)["book_serial"] for _, doc in copy.search("whale")}
+
+
+def test_searches_do_not_wait_for_a_refresh(mocker):
+    import threading
+    index = make_index()
+    mocker.patch.object(search_service, "_index", index)
+    mocker.patch.object(search_service, "_last_refresh", 0.0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_refresh(current):
+        started.set()
+        release.wait(5)
+        return current
+
+    mocker.patch.object(search_service, "refresh_index", side_effect=slow_refresh)
+    refresher = threading.Thread(target=search_service.search_books, args=("whale",))
+    refresher.start()
+    assert started.wait(5)
+    try:
+        # The refresh is still running; this search uses the current index
+        assert [result["book_serial"] for result in search_service.search_books("whale")] == [3, 1]
+    finally:
+        release.set()
+        refresher.join()
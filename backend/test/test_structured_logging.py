@@ -0,0 +1,145 @@
+import sys
+import os
+import io
+import json
+import logging
+import queue
+import threading
+from logging.handlers import QueueListener
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from flask import Flask, jsonify
+from services import structured_logging
+from services.structured_logging import JSONFormatter, NonBlockingQueueHandler, RequestContextFilter
+
+
+@pytest.fixture
+def log_output():
+    """A logger wired through the non-blocking handler to a JSON stream; yields (logger, read)."""
+    log_queue = queue.Queue(100)
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JSONFormatter())
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    listener = QueueListener(log_queue, output)
+    listener.start()
+    logger = logging.getLogger("test_structured_logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    def read():
+        listener.stop()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield logger, read
+    logger.removeHandler(handler)
+
+
+def test_records_are_json_lines_with_extra_fields(log_output):
+    logger, read = log_output
+    logger.info("Rewrite %s", "started", extra={"book_serial": 7})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Database Error")
+
+    info, error = read()
+    assert info["message"] == "Rewrite started"
+    assert info["level"] == "INFO"
+    assert info["logger"] == "test_structured_logging"
+    assert info["book_serial"] == 7
+    assert "request_id" not in info
+    assert error["level"] == "ERROR"
+    assert "ValueError: boom" in error["exception"]
+
+
+def test_arguments_are_merged_before_the_record_is_queued(log_output):
+    logger, read = log_output
+    fields = ["age"]
+    logger.info("Fields %s", fields)
+    fields.append("gender")
+    assert read()[0]["message"] == "Fields ['age']"
+
+
+def test_sampled_records_are_kept_at_their_rate(log_output, mocker):
+    logger, read = log_output
+    mocker.patch.object(structured_logging.random, "random", side_effect=[0.05, 0.5])
+    logger.info("request", extra={"sample_rate": 0.1})
+    logger.info("request", extra={"sample_rate": 0.1})
+    logger.info("request", extra={"sample_rate": 1.0})
+
+    lines = read()
+    assert len(lines) == 2
+    assert [line["sample_rate"] for line in lines] == [0.1, 1.0]
+
+
+def test_a_full_queue_drops_records_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    logger = logging.getLogger("test_structured_logging.full")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        logger.error("first")
+        finished = threading.Event()
+        threading.Thread(target=lambda: (logger.error("second"), finished.set())).start()
+        assert finished.wait(1)
+        assert handler.dropped == 1
+    finally:
+        logger.removeHandler(handler)
+
+
+@pytest.fixture
+def client(mocker, log_output):
+    logger, read = log_output
+    mocker.patch.object(structured_logging, "logger", logger)
+    mocker.patch.object(structured_logging, "configure_logging")
+    mocker.patch.object(structured_logging, "LOG_REQUEST_SAMPLE_RATE", 0)
+    app = Flask(__name__)
+
+    @app.route('/books/<int:book_serial>')
+    def get_book(book_serial):
+        logger.info("Fetching book")
+        return jsonify({"book_serial": book_serial})
+
+    @app.route('/fail')
+    def fail():
+        return jsonify({"message": "Internal Server Error"}), 500
+
+    structured_logging.init_logging(app)
+    return app.test_client(), read
+
+
+def test_requests_get_an_id_that_tags_their_records(client):
+    client, read = client
+    response = client.get('/books/7')
+    request_id = response.headers["X-Request-ID"]
+    assert len(request_id) == 32
+
+    # Successful requests are not logged at a sample rate of 0
+    lines = read()
+    assert [line["message"] for line in lines] == ["Fetching book"]
+    assert lines[0]["request_id"] == request_id
+    assert structured_logging.current_request_id() is None
+
+
+def test_incoming_request_ids_are_reused_if_usable(client):
+    client, _ = client
+    assert client.get('/books/7', headers={"X-Request-ID": "edge-42"}).headers["X-Request-ID"] == "edge-42"
+    for unusable in ("a b; c=<script>", "x" * 200):
+        replaced = client.get('/books/7', headers={"X-Request-ID": unusable}).headers["X-Request-ID"]
+        assert len(replaced) == 32 and replaced != unusable
+
+
+def test_failed_requests_are_always_logged(client):
+    client, read = client
+    response = client.get('/fail')
+    line, = read()
+    assert line["message"] == "request"
+    assert line["status"] == 500
+    assert line["route"] == "/fail"
+    assert line["request_id"] == response.headers["X-Request-ID"]
@@ -0,0 +1,30 @@
+import sys
+import os
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.style_presets import PRESETS_BY_ID, max_output_tokens, resolve_style
+
+
+def test_resolve_style_canonicalizes_free_text():
+    for option in ("Fantasy", "fantasy ", "fantasy style", "a more Fantasy-style version", "magical"):
+        assert resolve_style(option)["id"] == "fantasy"
+    assert resolve_style("more dramatic tone")["id"] == "dramatic"
+    assert resolve_style("mystery") is PRESETS_BY_ID["mystery"]
+
+
+def test_resolve_style_custom_and_invalid():
+    custom = resolve_style("Shakespearean  English")
+    assert custom["id"] == "custom:shakespearean english"
+    assert resolve_style(custom["id"])["id"] == custom["id"]
+    assert custom["instruction"] == "in a shakespearean english style."
+    assert resolve_style("style") is None
+    assert resolve_style(12345) is None
+
+
+def test_token_budget_follows_expansion():
+    simplified, romantic = PRESETS_BY_ID["simplified"], PRESETS_BY_ID["romantic"]
+    text = "word " * 2000
+    assert max_output_tokens(simplified, text) < max_output_tokens(romantic, text) <= 4096
+    assert max_output_tokens(romantic, "short") == 256
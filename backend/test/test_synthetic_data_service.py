@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Ensure `backend/app/` is in sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from werkzeug.security import check_password_hash
+from services import synthetic_data_service
+from services.book_import_service import detect_chapters
+from services.synthetic_data_service import (generate_book, generate_user, load_synthetic_books,
+                                             load_synthetic_users, synthetic_password)
+from models.book_schema import validate_bulk_book
+from models.user_model import Base, User
+
+SMALL = {"median_words": 3000, "min_words": 500, "max_words": 6000}
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database, so the parallel writers each get their own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def cheap_hashes(mocker):
+    # Real (verifiable) hashes with few iterations, so the tests stay fast
+    from werkzeug.security import generate_password_hash
+    mocker.patch.object(synthetic_data_service.UserService, "hash_password",
+                        side_effect=lambda password: generate_password_hash(password, method="pbkdf2:sha256:1000"))
+
+
+def test_books_are_deterministic_per_seed_and_ordinal():
+    assert generate_book(7, 3, **SMALL) == generate_book(7, 3, **SMALL)
+    assert generate_book(7, 3, **SMALL)["text"] != generate_book(8, 3, **SMALL)["text"]
+    assert generate_book(7, 3, **SMALL)["text"] != generate_book(7, 4, **SMALL)["text"]
+
+
+def test_books_are_valid_records_with_detectable_chapters():
+    book = generate_book(1, 0, **SMALL)
+    book["book_serial"] = 1
+    assert validate_bulk_book(book) == ([], [])
+    assert book["chapter_offsets"] == detect_chapters(book["text"])
+    assert book["total_chapters"] == len(book["chapter_offsets"])
+    assert SMALL["min_words"] <= book["total_word_count"] <= SMALL["max_words"] * 1.1
+    assert book["tags"] and book["rating"] in ("G", "PG", "PG-13", "R")
+
+
+def test_book_sizes_follow_the_configured_bounds():
+    counts = [generate_book(2, ordinal, median_words=2000, size_spread=1.5, min_words=800, max_words=4000)
+              ["total_word_count"] for ordinal in range(30)]
+    assert min(counts) >= 800
+    assert max(counts) <= 4000 * 1.1
+    assert len(set(counts)) > 10
+
+
+def test_load_synthetic_books_numbers_them_after_the_current_maximum(mocker):
+    mocker.patch.object(synthetic_data_service.book_mapper, "get_max_book_serial", return_value=40)
+    insert = mocker.patch("services.book_ingest_service.book_mapper.insert_books",
+                          side_effect=lambda books: len(books))
+
+    summary = load_synthetic_books(3, seed=5, workers=1, **SMALL)
+
+    assert summary == {"inserted": 3, "duplicates": [], "errors": []}
+    books = [book for call in insert.call_args_list for book in call.args[0]]
+    assert [book["book_serial"] for book in books] == [41, 42, 43]
+    assert books[0]["text"] == generate_book(5, 0, **SMALL)["text"]
+
+
+def test_users_share_hashed_passwords_that_verify(session_factory):
+    summary = load_synthetic_users(session_factory, 25, seed=3, passwords=4, batch_size=10, workers=1, writers=2)
+    assert summary == {"inserted": 25, "failed": 0}
+
+    db = session_factory()
+    # The writers commit batches in any order, so look users up by name
+    users = {user.username: user for user in db.query(User).all()}
+    assert set(users) == {generate_user(3, index)["username"] for index in range(25)}
+    for index in (0, 5, 24):
+        user = users[generate_user(3, index)["username"]]
+        assert check_password_hash(user.password_hash, synthetic_password(3, index, 4))
+    assert not check_password_hash(users[generate_user(3, 0)["username"]].password_hash,
+                                   synthetic_password(3, 1, 4))
+    db.close()
+
+
+def test_existing_users_fail_their_batch_only(session_factory):
+    load_synthetic_users(session_factory, 10, seed=3, batch_size=10, workers=1)
+    errors = []
+    summary = load_synthetic_users(session_factory, 20, seed=3, batch_size=10, workers=1,
+                                   on_error=lambda first_index, message: errors.append(first_index))
+    assert summary == {"inserted": 10, "failed": 10}
+    assert errors == [0]
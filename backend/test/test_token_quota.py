@@ -0,0 +1,111 @@
+import sys
+import os
+from datetime import datetime, timezone
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.token_quota import QuotaExceeded, QuotaTooSmall, TokenQuotas, current_windows
+
+NOW = datetime(2026, 10, 19, 15, 30, tzinfo=timezone.utc)
+
+
+class FakeStore:
+    """Stands in for token_quota_mapper, shared by several TokenQuotas like worker processes."""
+
+    def __init__(self):
+        self.used = {}
+        self.reads = 0
+
+    def get_usage(self, keys):
+        self.reads += 1
+        return {key: self.used.get(key, 0) for key in keys}
+
+    def add_usage(self, deltas):
+        for key, delta in deltas.items():
+            self.used[key] = self.used.get(key, 0) + delta
+
+
+def test_windows():
+    windows = current_windows(datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc))
+    assert windows["day"] == ("2026-12-31", datetime(2027, 1, 1, tzinfo=timezone.utc))
+    assert windows["month"] == ("2026-12", datetime(2027, 1, 1, tzinfo=timezone.utc))
+
+
+def test_reserve_refund_and_exceed():
+    store = FakeStore()
+    quotas = TokenQuotas({"day": 1000, "month": 5000}, store=store)
+    reservation = quotas.reserve(7, 800, NOW)
+    assert quotas.usage(7, NOW)["day"]["remaining"] == 200
+    with pytest.raises(QuotaExceeded) as exceeded:
+        quotas.reserve(7, 300, NOW)
+    assert exceeded.value.period == "day"
+    assert exceeded.value.reset_at == datetime(2026, 10, 20, tzinfo=timezone.utc)
+
+    # Only 250 of the 800 estimated tokens were used: the rest is refunded.
+    reservation.consume(250)
+    reservation.settle()
+    reservation.settle()
+    assert quotas.usage(7, NOW)["day"]["used"] == 250
+    assert quotas.usage(7, NOW)["month"]["used"] == 250
+    quotas.reserve(7, 300, NOW)
+    # Other users have their own quota, and checks after the first read stay in memory.
+    quotas.reserve(8, 1000, NOW)
+    assert store.reads == 2
+
+
+def test_an_estimate_beyond_the_limit_can_never_be_reserved():
+    quotas = TokenQuotas({"day": 1000, "month": 5000}, store=FakeStore())
+    with pytest.raises(QuotaTooSmall) as too_small:
+        quotas.reserve(7, 1200, NOW)
+    assert (too_small.value.period, too_small.value.limit, too_small.value.estimate) == ("day", 1000, 1200)
+    assert quotas.usage(7, NOW)["day"]["used"] == 0
+
+
+def test_a_client_is_limited_across_user_ids():
+    quotas = TokenQuotas({"day": 1000}, store=FakeStore(), client_limits={"day": 1500})
+    quotas.reserve(7, 800, NOW, client="ip:10.0.0.5")
+    # A fresh userId from the same client still draws on the client's quota
+    with pytest.raises(QuotaExceeded) as exceeded:
+        quotas.reserve(8, 800, NOW, client="ip:10.0.0.5")
+    assert (exceeded.value.user_id, exceeded.value.used) == ("ip:10.0.0.5", 800)
+    assert quotas.usage(8, NOW)["day"]["used"] == 0
+    quotas.reserve(8, 800, NOW, client="ip:10.0.0.6")
+    with pytest.raises(QuotaTooSmall):
+        quotas.reserve(9, 1200, NOW, client="ip:10.0.0.7")
+
+
+def test_flush_shares_usage_between_workers():
+    store = FakeStore()
+    worker_a = TokenQuotas({"day": 1000}, store=store)
+    worker_b = TokenQuotas({"day": 1000}, store=store)
+    for worker, tokens in ((worker_a, 600), (worker_b, 100)):
+        reservation = worker.reserve(7, 800)
+        reservation.consume(tokens)
+        reservation.settle()
+    assert worker_b.usage(7)["day"]["used"] == 100
+
+    worker_a.flush()
+    worker_b.flush()
+    assert worker_b.usage(7)["day"]["used"] == 700
+    worker_a.flush()
+    assert worker_a.usage(7)["day"]["used"] == 700
+    with pytest.raises(QuotaExceeded):
+        worker_a.reserve(7, 400)
+
+
+def test_unflushed_usage_survives_a_store_error():
+    store = FakeStore()
+    quotas = TokenQuotas({"day": 1000}, store=store)
+    quotas.reserve(7, 400)
+
+    def fail(deltas):
+        raise RuntimeError("store down")
+    store.add_usage, add_usage = fail, store.add_usage
+    with pytest.raises(RuntimeError):
+        quotas.flush()
+    assert quotas.usage(7)["day"]["used"] == 400
+    store.add_usage = add_usage
+    quotas.flush()
+    assert list(store.used.values()) == [400]
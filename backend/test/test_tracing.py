@@ -0,0 +1,73 @@
+import sys
+import os
+from types import SimpleNamespace
+import pytest
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+from config.instrumentation import MongoCommandTimer
+from services import tracing
+
+
+@pytest.fixture
+def client(mocker):
+    mocker.patch.object(tracing, "latency_stats", tracing.LatencyStats())
+    engine = create_engine("sqlite://")
+    app = Flask(__name__)
+
+    @app.route('/books/<int:book_serial>')
+    def get_book(book_serial):
+        with engine.connect() as connection:
+            connection.execute(text("select 1"))
+        MongoCommandTimer().succeeded(SimpleNamespace(duration_micros=2500))
+        with tracing.span("hash"):
+            pass
+        return jsonify({"book_serial": book_serial})
+
+    tracing.init_tracing(app)
+    return app.test_client()
+
+
+def parse_server_timing(header):
+    timings = {}
+    for entry in header.split(", "):
+        name, *params = entry.split(";")
+        timings[name] = dict(param.split("=", 1) for param in params)
+    return timings
+
+
+def test_sampled_request_reports_each_layer(client, mocker):
+    mocker.patch.object(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    response = client.get('/books/7')
+    assert response.get_json() == {"book_serial": 7}
+
+    timings = parse_server_timing(response.headers["Server-Timing"])
+    assert list(timings) == ["mongo", "mysql", "hash", "json", "app", "total"]
+    assert timings["mongo"] == {"dur": "2.5", "desc": '"1 calls"'}
+    assert float(timings["total"]["dur"]) >= float(timings["mysql"]["dur"])
+
+    metrics = tracing.latency_stats.metrics()
+    assert metrics["routes"]["GET /books/<int:book_serial>"]["count"] == 1
+    assert set(metrics["layers"]["GET /books/<int:book_serial>"]) == {"mongo", "mysql", "hash", "json"}
+
+
+def test_unsampled_request_is_only_counted(client, mocker):
+    mocker.patch.object(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    response = client.get('/books/7')
+    assert "Server-Timing" not in response.headers
+    metrics = tracing.latency_stats.metrics()
+    assert metrics["routes"]["GET /books/<int:book_serial>"]["count"] == 1
+    assert metrics["layers"] == {}
+    # Nothing is left behind for spans outside the request.
+    assert tracing.current_trace.get() is None
+
+
+def test_histogram_quantiles():
+    histogram = tracing.Histogram()
+    for value in [0.5] * 90 + [150] * 9 + [90000]:
+        histogram.observe(value)
+    assert (histogram.quantile(0.5), histogram.quantile(0.95), histogram.quantile(1.0)) == (1, 200, None)
+    assert histogram.summary()["buckets"]["inf"] == 1
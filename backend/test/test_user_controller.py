@@ -502,4 +502,44 @@ def test_login_missing_credentials(client, body):
     else:
         resp = client.post("/auth/login", json=body)
 
-    assert resp.status_code == 400
\ No newline at end of file
+    assert resp.status_code == 400
+
+def test_get_recommendations(client, mocker):
+    unique_username = generate_unique("recuser")
+    reg_data = {
+        "username": unique_username,
+        "email": f"{unique_username}@example.com",
+        "password": "password",
+        "age": 30,
+        "gender": "Female",
+        "favoriteBook": "Emma",
+        "favoriteAuthor": "Jane Austen",
+        "preferredGenre": "fiction"
+    }
+    user_id = client.post("/auth/register", json=reg_data).get_json()["userId"]
+    recommendations = [{"book_serial": 4, "title": "Persuasion", "author": "Jane Austen", "score": 0.9}]
+    recommend = mocker.patch("controllers.user_controller.recommend_books", return_value=recommendations)
+    history = mocker.patch("controllers.user_controller.get_user_book_serials", return_value=[3])
+
+    response = client.get(f"/users/{user_id}/recommendations?limit=5")
+    assert response.status_code == 200
+    assert response.get_json()["recommendations"] == recommendations
+    assert recommend.call_args.args[0].fav_author == "Jane Austen"
+    assert recommend.call_args.args[1] == 5
+    # The books the user has rewritten are their reading history
+    assert history.call_args.args == (int(user_id),)
+    assert recommend.call_args.args[2] == [3]
+
+    response = client.get("/users/999999/recommendations")
+    assert response.status_code == 404
+
+
+def test_quota_is_admin_only(client, mocker):
+    mocker.patch("controllers.debug_controller.ADMIN_TOKEN", "secret")
+    usage = {"day": {"limit": 1000, "used": 10, "remaining": 990, "resets_at": "2026-10-20T00:00:00+00:00"}}
+    mocker.patch("controllers.user_controller.token_quotas.usage", return_value=usage)
+
+    assert client.get("/users/7/quota").status_code == 403
+    response = client.get("/users/7/quota", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.get_json() == {"userId": 7, **usage}
@@ -0,0 +1,143 @@
+import sys
+import os
+import io
+import json
+
+# Ensure `backend/app/` is in sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from werkzeug.security import check_password_hash
+from models.user_model import Base, User
+from services.user_import_service import import_users, export_users, read_rows, validate_row
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    """
+    Creates a new in-memory database for each test.
+    """
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    TestingSessionLocal = sessionmaker(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def make_row(name, **overrides):
+    row = {
+        "username": name,
+        "email": f"{name}@example.com",
+        "password": "secret",
+        "age": 30,
+        "gender": "Female",
+        "favoriteBook": "Dune",
+        "favoriteAuthor": "Frank Herbert",
+        "preferredGenre": "fiction",
+    }
+    row.update(overrides)
+    return row
+
+
+def test_validate_row_rejects_bad_values():
+    with pytest.raises(ValueError, match="Missing field: email"):
+        validate_row(make_row("a", email=""))
+    with pytest.raises(ValueError, match="Invalid age"):
+        validate_row(make_row("a", age="-3"))
+    with pytest.raises(ValueError, match="Invalid gender"):
+        validate_row(make_row("a", gender="unknown"))
+    with pytest.raises(ValueError, match="favoriteBook is longer than 255 characters"):
+        validate_row(make_row("a", favoriteBook="x" * 256))
+    assert validate_row(make_row("a", favoriteBook="x" * 255))["fav_book"] == "x" * 255
+
+
+def test_read_rows_csv_and_ndjson():
+    csv_file = io.StringIO(
+        "username,email,password,age,gender,favoriteBook,favoriteAuthor,preferredGenre\n"
+        "alice,alice@example.com,pw,22,Female,Emma,Austen,fiction\n"
+    )
+    rows = list(read_rows(csv_file, "csv"))
+    assert rows[0][0] == 2
+    assert rows[0][1]["username"] == "alice"
+
+    ndjson_file = io.StringIO(json.dumps(make_row("bob")) + "\n\nnot json\n")
+    rows = list(read_rows(ndjson_file, "ndjson"))
+    assert rows[0][1]["username"] == "bob"
+    assert rows[1][0] == 3
+    assert isinstance(rows[1][1], ValueError)
+
+
+def test_import_users_reports_errors_without_aborting(db_session):
+    """
+    Bad rows, duplicates inside the file and users that already exist are
+    reported per line while the remaining rows are still inserted.
+    """
+    db_session.add(User(username="taken", email="taken@example.com", password_hash="x",
+                        age=40, gender="Male", preferred_genre="fiction"))
+    db_session.commit()
+
+    rows = [
+        (1, make_row("u1")),
+        (2, make_row("u2", age="abc")),
+        (3, make_row("u1", email="other@example.com")),
+        (4, make_row("taken")),
+        (5, ValueError("Invalid JSON")),
+        (6, make_row("u3")),
+    ]
+    errors = []
+    summary = import_users(db_session, rows, batch_size=2, workers=1,
+                           on_error=lambda line, msg: errors.append(line))
+
+    assert summary == {"inserted": 2, "failed": 4}
+    assert sorted(errors) == [2, 3, 4, 5]
+    user = db_session.query(User).filter(User.username == "u3").first()
+    assert check_password_hash(user.password_hash, "secret")
+
+
+def test_import_users_isolates_values_the_database_rejects(db_session, mocker):
+    """A value MySQL in strict mode cannot store fails its own row, not the batch."""
+    from sqlalchemy.exc import DataError
+    from mappers.user_mapper import UserMapper
+
+    bulk_insert = UserMapper.bulk_insert_users
+
+    def strict_insert(db, rows):
+        if any(len(row["fav_author"]) > 255 for row in rows):
+            raise DataError("INSERT INTO users", {}, Exception("Data too long for column 'fav_author'"))
+        return bulk_insert(db, rows)
+    mocker.patch.object(UserMapper, "bulk_insert_users", side_effect=strict_insert)
+
+    # Trailing spaces pass validation but are stored as sent
+    rows = [(1, make_row("u1")), (2, make_row("u2", favoriteAuthor="x" * 255 + "  ")), (3, make_row("u3"))]
+    errors = []
+    summary = import_users(db_session, rows, batch_size=3, workers=1,
+                           on_error=lambda line, msg: errors.append((line, msg)))
+
+    assert summary == {"inserted": 2, "failed": 1}
+    assert errors == [(2, "Data too long for column 'fav_author'")]
+
+
+def test_import_users_hashes_in_process_pool(db_session):
+    rows = [(i, make_row(f"pool{i}")) for i in range(4)]
+    summary = import_users(db_session, rows, batch_size=10, workers=2)
+    assert summary == {"inserted": 4, "failed": 0}
+    assert db_session.query(User).count() == 4
+
+
+def test_export_users_leaves_out_passwords(db_session):
+    import_users(db_session, [(1, make_row("exp1")), (2, make_row("exp2"))], workers=1)
+
+    out = io.StringIO()
+    count = export_users(db_session, out, "ndjson", batch_size=1)
+    assert count == 2
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["username"] for r in records] == ["exp1", "exp2"]
+    assert "password" not in records[0] and "password_hash" not in records[0]
+
+    out = io.StringIO()
+    export_users(db_session, out, "csv")
+    assert out.getvalue().splitlines()[0].startswith("userId,username,email")
@@ -0,0 +1,24 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure the "app" folder is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../app")))
+
+from services.windowed_pool import windowed_map
+
+
+def test_results_come_in_order_with_a_bounded_window():
+    submitted = []
+
+    def items():
+        for item in range(20):
+            submitted.append(item)
+            yield item
+
+    results = []
+    for item, future in windowed_map(lambda value: value * value, items(), 2, executor=ThreadPoolExecutor):
+        # Never more than 2 * workers items taken ahead of the consumer
+        assert len(submitted) - len(results) <= 4
+        results.append((item, future.result()))
+    assert results == [(item, item * item) for item in range(20)]